@@ -1,30 +1,39 @@
-import re
-import threading
-from collections import deque
+import sys
 
-class ASTNode:
-    """
-    This is the base class for an AST node. Each node represents a syntactical construct in the code.
-    """
+from ast_arena import ASTArena
+from ast_compiler import compile_ast
+from ast_hashcons import NodeFactory
+from ast_incremental import IncrementalParser
+from ast_nodes import ASTNode
+from ast_optimizer import PassManager
+from ast_parallel import parallel_parse
+from ast_parser import Parser
+from ast_scope import analyze_scope
+from ast_walk import write_ast
+from lexing_engine import DEFAULT_CHUNK_SIZE, compile_engine
+from token_table import TokenTable
 
-    def __init__(self, type_, value=None, children=None, metadata=None):
-        self.type = type_
-        self.value = value
-        self.children = children if children is not None else []
-        self.metadata = metadata if metadata is not None else {}
 
-    def add_child(self, child):
-        self.children.append(child)
-
-    def set_metadata(self, key, value):
-        self.metadata[key] = value
-
-    def __repr__(self, depth=0):
-        indent = " " * depth
-        repr_str = f"{indent}{self.type}: {self.value}\n"
-        for child in self.children:
-            repr_str += child.__repr__(depth + 2)
-        return repr_str
+# Pattern table shared by every instance (the first matching pattern wins)
+TOKEN_PATTERNS = {
+    'KEYWORDS': r'\b(def|if|else|for|while|return|try|except|import|from|continue|break|and|or|not|pass|lambda|yield|del|global|assert|with|is|None|True|False)\b',
+    'IDENTIFIER': r'[a-zA-Z_][a-zA-Z0-9_]*',
+    'NUMBER': r'\b\d+\b',
+    'FLOAT': r'\b\d+\.\d+\b',
+    'STRING': r'\".*?\"|\'[^\']*\'',
+    'CHARACTER': r'\'.\'',
+    'COMMENT_SINGLE': r'#.*',
+    'COMMENT_MULTI': r'"""(.*?)"""|\'\'\'(.*?)\'\'\'',
+    'OPERATOR': r'[+\-*/%=<>!&|^~]',
+    'ASSIGNMENT': r'=' ,
+    'PUNCTUATION': r'[.,;:()]',
+    'BRACKETS': r'[\[\]{}]',
+    'WHITESPACE': r'\s+',
+    'SPECIAL': r'[\@\$#\^&\*\(\)]',
+    'ESCAPE_SEQUENCE': r'\\[abfnrtv\\"\'0-9]',
+    'HEX_NUMBER': r'\b0x[0-9A-Fa-f]+\b',
+    'BINARY_NUMBER': r'\b0b[01]+\b',
+}
 
 
 class AstronomicalAST:
@@ -32,108 +41,202 @@ class AstronomicalAST:
         self.source_code = source_code
         self.tokens = []
         self.ast_root = None
-        self.token_patterns = {
-            'KEYWORDS': r'\b(def|if|else|for|while|return|try|except|import|from|continue|break|and|or|not|pass|lambda|yield|del|global|assert|with|is|None|True|False)\b',
-            'IDENTIFIER': r'[a-zA-Z_][a-zA-Z0-9_]*',
-            'NUMBER': r'\b\d+\b',
-            'FLOAT': r'\b\d+\.\d+\b',
-            'STRING': r'\".*?\"|\'[^\']*\'',
-            'CHARACTER': r'\'.\'',
-            'COMMENT_SINGLE': r'#.*',
-            'COMMENT_MULTI': r'"""(.*?)"""|\'\'\'(.*?)\'\'\'',
-            'OPERATOR': r'[+\-*/%=<>!&|^~]',
-            'ASSIGNMENT': r'=' ,
-            'PUNCTUATION': r'[.,;:()]',
-            'BRACKETS': r'[\[\]{}]',
-            'WHITESPACE': r'\s+',
-            'SPECIAL': r'[\@\$#\^&\*\(\)]',
-            'ESCAPE_SEQUENCE': r'\\[abfnrtv\\"\'0-9]',
-            'HEX_NUMBER': r'\b0x[0-9A-Fa-f]+\b',
-            'BINARY_NUMBER': r'\b0b[01]+\b',
-        }
-
-    def tokenize(self):
+        self.arena = None
+        self.incremental = None
+        self.node_count = 0
+        self.token_patterns = TOKEN_PATTERNS
+
+    def tokenize(self, cache=None):
         """
         Tokenizes the input code by matching it with the regex patterns for various token types.
+        With a TokenCache, an unchanged source is loaded from the cache instead of being lexed.
+        """
+        # Tokenize the input in a single pass with the shared master regex
+        if cache is not None:
+            table = cache.lex_table(self.source_code, self.token_patterns)
+        else:
+            table = compile_engine(self.token_patterns).lex_table(self.source_code)
+        if self.tokens:
+            self.tokens.extend(table)
+        else:
+            self.tokens = table
+
+    def token_location(self, index):
+        """
+        Returns the (line, column) where the token at index starts, resolved from its source offset.
+        """
+        return self.tokens.line_column(index)
+
+    def parse(self, tokens=None, arena=False, cache=None):
+        """
+        Parses the code into an Abstract Syntax Tree (AST) rooted at a 'Module' node and returns it.
+        Tokens default to a lexing of the source that keeps whitespace, which the parser needs for
+        indentation; any other iterator of such tokens can be passed instead.
+        With arena=True the tree is stored in a columnar ASTArena (see to_arena). With a ParseCache,
+        the AST of an unchanged source is loaded from the cache instead of being parsed.
+        """
+        if cache is not None and tokens is None:
+            cached = cache.get(self.source_code, self.token_patterns)
+            if cached is not None:
+                self.ast_root = cached.module()
+                self.arena = self.incremental = None
+                self.node_count = cached.node_count
+                if arena:
+                    self.to_arena()
+                return self.ast_root
+
+        locate = None
+        if tokens is None:
+            table = compile_engine(self.token_patterns, skip=()).lex_table(self.source_code)
+            tokens = table.located()
+            locate = table.line_index().line_column
+        parser = Parser(tokens, locate)
+        self.ast_root = parser.parse_module()
+        self.arena = self.incremental = None
+        self.node_count = parser.node_count
+        if cache is not None and locate is not None:
+            cache.put(self.source_code, self.token_patterns, self.ast_root)
+        if arena:
+            self.to_arena()
+        return self.ast_root
+
+    def parse_stream(self, fileobj, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Parses a text file object while it is being lexed chunk by chunk, without holding its tokens.
+        """
+        engine = compile_engine(self.token_patterns, skip=())
+        parser = Parser(engine.stream(fileobj, chunk_size))
+        self.ast_root = parser.parse_module()
+        self.arena = self.incremental = None
+        self.node_count = parser.node_count
+        return self.ast_root
+
+    def parse_parallel(self, workers=None):
         """
-        position = 0
-        code_length = len(self.source_code)
-        
-        # Tokenize the input
-        while position < code_length:
-            match = None
-            for token_type, pattern in self.token_patterns.items():
-                regex = re.compile(pattern)
-                match = regex.match(self.source_code, position)
-                if match:
-                    value = match.group(0)
-                    if token_type != 'WHITESPACE':  # Ignore whitespaces
-                        self.tokens.append((token_type, value))
-                    position = match.end()
-                    break
-            if not match:
-                self.tokens.append(('ERROR', f"Unexpected character at position {position}: {self.source_code[position]}"))
-                position += 1
-
-    def parse(self):
-        """
-        Parses the tokenized code into an Abstract Syntax Tree (AST).
-        """
-        stack = []
-        root_node = None
-        current_node = None
-        
-        for token_type, value in self.tokens:
-            # Here we implement a simple parser that converts tokens into an AST structure.
-            if token_type == 'KEYWORDS' and value == 'def':  # function definition example
-                function_node = ASTNode('FunctionDefinition', value)
-                if root_node is None:
-                    root_node = function_node
-                else:
-                    current_node.add_child(function_node)
-                current_node = function_node
-            elif token_type == 'IDENTIFIER':
-                identifier_node = ASTNode('Identifier', value)
-                current_node.add_child(identifier_node)
-            elif token_type == 'NUMBER':
-                number_node = ASTNode('Number', value)
-                current_node.add_child(number_node)
-            elif token_type == 'OPERATOR':
-                operator_node = ASTNode('Operator', value)
-                current_node.add_child(operator_node)
-            elif token_type == 'PUNCTUATION' and value == ')':  # function end, example
-                current_node = current_node.metadata.get('parent', None)
-            else:
-                # Handle other token types like strings, comments, etc.
-                pass
-            
-        self.ast_root = root_node
-
-    def print_ast(self):
-        """
-        Prints the structure of the generated AST.
+        Parses the code with its top-level definitions split among worker processes (see
+        parallel_parse); the AST is the same as parse() builds. Tokens from tokenize() are used to
+        find the definitions when present.
+        """
+        table = self.tokens if isinstance(self.tokens, TokenTable) else None
+        self.ast_root, self.node_count = parallel_parse(self.source_code, self.token_patterns, workers, table)
+        self.arena = self.incremental = None
+        return self.ast_root
+
+    def update(self, edit_offset, removed_len, inserted_text):
+        """
+        Applies a text edit to the source, where removed_len characters at edit_offset are replaced
+        by inserted_text, and reparses only the statements it touches (see IncrementalParser).
+        The first update parses the source from scratch. Tokens from tokenize() are relexed around
+        the edit as well.
+        """
+        if self.incremental is None:
+            self.incremental = IncrementalParser(self.source_code, self.token_patterns)
+        if isinstance(self.tokens, TokenTable):
+            source = self.source_code
+            source = source[:edit_offset] + inserted_text + source[edit_offset + removed_len:]
+            compile_engine(self.token_patterns).relex(self.tokens, source, edit_offset, removed_len, len(inserted_text))
+        self.arena = None
+        if self.ast_root is not None and self.ast_root.metadata.get('scopes') is not None:
+            self.ast_root.set_metadata('scopes', None)
+            self.ast_root.set_metadata('program', None)
+        try:
+            self.incremental.update(edit_offset, removed_len, inserted_text)
+        finally:
+            self.source_code = self.incremental.source
+            self.ast_root = self.incremental.tree
+            self.node_count = self.incremental.node_count
+
+    def to_arena(self):
+        """
+        Moves the parsed AST into a columnar ASTArena and returns it. The node objects are released;
+        get_ast() then returns a read-only ASTNode-compatible view of the arena's root.
+        """
+        if self.arena is None and self.ast_root is not None:
+            self.arena = ASTArena.from_tree(self.ast_root)
+            self.ast_root = self.arena.node()
+        return self.arena
+
+    def shared_ast(self, factory=None):
+        """
+        Returns a hash-consed copy of the AST in which equal subtrees are one shared node (see
+        NodeFactory). The AST itself is left as it is.
+        """
+        root = self.get_ast()
+        if root is None:
+            return None
+        return (factory if factory is not None else NodeFactory()).intern(root)
+
+    def print_ast(self, output=None):
+        """
+        Prints the structure of the generated AST, streaming it to output (stdout by default).
         """
         if self.ast_root:
-            print(self.ast_root)
+            if output is None:
+                output = sys.stdout
+            write_ast(self.ast_root, output)
+            output.write('\n')
 
     def analyze_scope(self):
         """
         Perform analysis on variable scope, context, and symbol resolution.
+        Returns the ScopeTable of the AST (parsing it first if needed), which is cached on the root
+        node's 'scopes' metadata until the tree changes.
         """
-        # Placeholder method for symbol table and scope analysis.
-        pass
+        root = self.get_ast()
+        if root is None:
+            root = self.parse()
+        table = root.metadata.get('scopes')
+        if table is None or table.root != root:
+            table = analyze_scope(root)
+            root.set_metadata('scopes', table)
+        return table
 
     def execute_ast(self):
         """
         Execute the AST (interpretation or transformation).
+        The AST is compiled once into closures (see compile_ast), cached on the root node's 'program'
+        metadata until the tree changes, and run; returns the module-level variables.
+        A module using constructs the closures do not cover (generators, star imports) is written
+        back as source from the tree and compiled by Python instead.
+        """
+        table = self.analyze_scope()
+        root = self.get_ast()
+        program = root.metadata.get('program')
+        if program is None or program.table is not table:
+            program = compile_ast(root, table)
+            root.set_metadata('program', program)
+        return program.run()
+
+    def optimize(self, passes=None):
+        """
+        Simplifies the AST in place (parsing it first if needed) with a PassManager: constant folding,
+        algebraic simplification, dead branch and unreachable code elimination unless other passes
+        are given. Returns the OptimizationReport. The tree no longer matches the source afterwards,
+        so the next update() parses the edited source from scratch.
         """
-        # Placeholder method for interpreting or transforming the AST into executable code or actions.
-        pass
+        root = self.get_ast()
+        if root is None:
+            root = self.parse()
+        if self.arena is not None:
+            root = self.arena.to_tree()
+            self.arena = None
+        self.incremental = None
+        table = root.metadata.get('scopes')
+        manager = PassManager(passes)
+        report = manager.run(root, table if table is not None and table.root is root else None)
+        self.ast_root = manager.root
+        self.node_count = report.nodes_after
+        if self.ast_root.metadata.get('scopes') is not None:
+            self.ast_root.set_metadata('scopes', None)
+            self.ast_root.set_metadata('program', None)
+        return report
 
     def get_ast(self):
         """
         Returns the root of the AST.
         """
+        if self.incremental is not None and self.arena is None:
+            self.ast_root = self.incremental.tree  # brings node spans after the last edits up to date
         return self.ast_root
 
 
@@ -149,7 +252,8 @@ y = 5.5
 result = add(x, y)
 """
 
-ast = AstronomicalAST(source_code)
-ast.tokenize()
-ast.parse()
-ast.print_ast()
+if __name__ == "__main__":
+    ast = AstronomicalAST(source_code)
+    ast.tokenize()
+    ast.parse()
+    ast.print_ast()
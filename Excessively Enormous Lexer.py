@@ -1,44 +1,58 @@
-import re
+from lexing_engine import compile_engine
+from token_table import TokenTable
+
+
+# Pattern table shared by every instance (the first matching pattern wins)
+TOKEN_PATTERNS = {
+    'KEYWORDS': r'\b(def|if|else|for|while|return|class|try|except|import|from|continue|break|and|or|not|pass|lambda|yield|del|global|assert|with|is|None|True|False)\b',
+    'IDENTIFIER': r'[a-zA-Z_][a-zA-Z0-9_]*',
+    'NUMBER': r'\b\d+\b',
+    'FLOAT': r'\b\d+\.\d+\b',
+    'STRING': r'\".*?\"|\'[^\']*\'',
+    'CHARACTER': r'\'.\'',
+    'COMMENT_SINGLE': r'#.*',
+    'COMMENT_MULTI': r'"""(.*?)"""|\'\'\'(.*?)\'\'\'',
+    'OPERATOR': r'[+\-*/%=<>!&|^~]',
+    'ASSIGNMENT': r'=' ,
+    'PUNCTUATION': r'[.,;:()]',
+    'BRACKETS': r'[\[\]{}]',
+    'WHITESPACE': r'\s+',
+}
+
 
 class EnormousLexer:
     def __init__(self, input_code):
         self.input_code = input_code
         self.tokens = []
-        self.token_patterns = {
-            'KEYWORDS': r'\b(def|if|else|for|while|return|class|try|except|import|from|continue|break|and|or|not|pass|lambda|yield|del|global|assert|with|is|None|True|False)\b',
-            'IDENTIFIER': r'[a-zA-Z_][a-zA-Z0-9_]*',
-            'NUMBER': r'\b\d+\b',
-            'FLOAT': r'\b\d+\.\d+\b',
-            'STRING': r'\".*?\"|\'[^\']*\'',
-            'CHARACTER': r'\'.\'',
-            'COMMENT_SINGLE': r'#.*',
-            'COMMENT_MULTI': r'"""(.*?)"""|\'\'\'(.*?)\'\'\'',
-            'OPERATOR': r'[+\-*/%=<>!&|^~]',
-            'ASSIGNMENT': r'=' ,
-            'PUNCTUATION': r'[.,;:()]',
-            'BRACKETS': r'[\[\]{}]',
-            'WHITESPACE': r'\s+',
-        }
-
-    def tokenize(self):
+        self.token_patterns = TOKEN_PATTERNS
+
+    def tokenize(self, cache=None):
         """
         Tokenizes the input code by matching it with the regex patterns for various token types.
+        With a TokenCache, an unchanged source is loaded from the cache instead of being lexed.
         """
-        position = 0
-        while position < len(self.input_code):
-            match = None
-            for token_type, pattern in self.token_patterns.items():
-                regex = re.compile(pattern)
-                match = regex.match(self.input_code, position)
-                if match:
-                    value = match.group(0)
-                    if token_type != 'WHITESPACE':  # Ignore whitespaces
-                        self.tokens.append((token_type, value))
-                    position = match.end()
-                    break
-            if not match:
-                raise ValueError(f"Unexpected character at position {position}: {self.input_code[position]}")
+        if cache is not None:
+            table = cache.lex_table(self.input_code, self.token_patterns)
+        else:
+            table = compile_engine(self.token_patterns).lex_table(self.input_code)
+        error_index = table.kinds.tobytes().find(bytes((table.error_id,)))
+        if error_index >= 0:
+            # Keep the tokens preceding the error, as a token-by-token lexer would have
+            position = table.starts[error_index]
+            table = table[:error_index]
+        if self.tokens:
+            self.tokens.extend(table)
+        else:
+            self.tokens = table
+        if error_index >= 0:
+            _raise_unexpected_character(self.input_code, position)
     
+    def token_location(self, index):
+        """
+        Returns the (line, column) where the token at index starts, resolved from its source offset.
+        """
+        return self.tokens.line_column(index)
+
     def get_tokens(self):
         """
         Returns the list of tokens after lexing.
@@ -56,6 +70,8 @@ class EnormousLexer:
         """
         Generates a summary of the token counts by type.
         """
+        if isinstance(self.tokens, TokenTable):
+            return self.tokens.summary()
         summary = {}
         for token_type, value in self.tokens:
             if token_type not in summary:
@@ -76,6 +92,10 @@ class EnormousLexer:
         self.display_tokens()
 
 
+def _raise_unexpected_character(text, position):
+    raise ValueError(f"Unexpected character at position {position}: {text[position]}")
+
+
 # Example Usage
 source_code = """
 def add(a, b):
@@ -95,12 +115,13 @@ while x > y:
 
 """  # Example source code
 
-# Instantiate and tokenize the source code
-lexer = EnormousLexer(source_code)
-lexer.tokenize()
+if __name__ == "__main__":
+    # Instantiate and tokenize the source code
+    lexer = EnormousLexer(source_code)
+    lexer.tokenize()
 
-# Display the tokenized result
-lexer.display_tokens()
+    # Display the tokenized result
+    lexer.display_tokens()
 
-# Generate and display a summary report
-lexer.generate_token_report()
+    # Generate and display a summary report
+    lexer.generate_token_report()
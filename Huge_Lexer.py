@@ -1,8 +1,30 @@
 import re
-import threading
 import time
-import sys
-from collections import deque
+
+from lexing_engine import DEFAULT_CHUNK_SIZE, compile_engine, map_source, parallel_lex
+from token_table import TokenTable
+
+
+# Pattern table shared by every instance (the first matching pattern wins)
+TOKEN_PATTERNS = {
+    'KEYWORDS': r'\b(def|if|else|for|while|return|class|try|except|import|from|continue|break|and|or|not|pass|lambda|yield|del|global|assert|with|is|None|True|False)\b',
+    'IDENTIFIER': r'[a-zA-Z_][a-zA-Z0-9_]*',
+    'NUMBER': r'\b\d+\b',
+    'FLOAT': r'\b\d+\.\d+\b',
+    'STRING': r'\".*?\"|\'[^\']*\'',
+    'CHARACTER': r'\'.\'',
+    'COMMENT_SINGLE': r'#.*',
+    'COMMENT_MULTI': r'"""(.*?)"""|\'\'\'(.*?)\'\'\'',
+    'OPERATOR': r'[+\-*/%=<>!&|^~]',
+    'ASSIGNMENT': r'=' ,
+    'PUNCTUATION': r'[.,;:()]',
+    'BRACKETS': r'[\[\]{}]',
+    'WHITESPACE': r'\s+',
+    'SPECIAL': r'[\@\$#\^&\*\(\)]',  # Additional symbols or special characters
+    'ESCAPE_SEQUENCE': r'\\[abfnrtv\\"\'0-9]',  # Escape sequences in strings
+    'HEX_NUMBER': r'\b0x[0-9A-Fa-f]+\b',  # Hexadecimal numbers
+    'BINARY_NUMBER': r'\b0b[01]+\b',  # Binary numbers
+}
 
 
 # **HIGHLY-DOMINANT AND OVER-POWERED LEXER WITH AMPLE FORTITUDE**
@@ -11,80 +33,73 @@ class OverpoweredLexer:
     def __init__(self, input_code):
         self.input_code = input_code
         self.tokens = []
-        self.token_patterns = {
-            'KEYWORDS': r'\b(def|if|else|for|while|return|class|try|except|import|from|continue|break|and|or|not|pass|lambda|yield|del|global|assert|with|is|None|True|False)\b',
-            'IDENTIFIER': r'[a-zA-Z_][a-zA-Z0-9_]*',
-            'NUMBER': r'\b\d+\b',
-            'FLOAT': r'\b\d+\.\d+\b',
-            'STRING': r'\".*?\"|\'[^\']*\'',
-            'CHARACTER': r'\'.\'',
-            'COMMENT_SINGLE': r'#.*',
-            'COMMENT_MULTI': r'"""(.*?)"""|\'\'\'(.*?)\'\'\'',
-            'OPERATOR': r'[+\-*/%=<>!&|^~]',
-            'ASSIGNMENT': r'=' ,
-            'PUNCTUATION': r'[.,;:()]',
-            'BRACKETS': r'[\[\]{}]',
-            'WHITESPACE': r'\s+',
-            'SPECIAL': r'[\@\$#\^&\*\(\)]',  # Additional symbols or special characters
-            'ESCAPE_SEQUENCE': r'\\[abfnrtv\\"\'0-9]',  # Escape sequences in strings
-            'HEX_NUMBER': r'\b0x[0-9A-Fa-f]+\b',  # Hexadecimal numbers
-            'BINARY_NUMBER': r'\b0b[01]+\b',  # Binary numbers
-        }
-
-    def tokenize(self):
+        self.token_patterns = TOKEN_PATTERNS
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Creates a lexer over a memory-mapped source file. The file is lexed byte-wise in place: it is
+        never decoded into a str, and token values are memoryview slices of the mapping.
+        """
+        return cls(map_source(path))
+
+    def tokenize(self, cache=None):
         """
         Tokenizes the input code by matching it with the regex patterns for various token types.
+        With a TokenCache, an unchanged source is loaded from the cache instead of being lexed.
         """
-        position = 0
-        code_length = len(self.input_code)
-        
-        # Optimized lexical analysis with context-sensitive matching
-        while position < code_length:
-            match = None
-            for token_type, pattern in self.token_patterns.items():
-                regex = re.compile(pattern)
-                match = regex.match(self.input_code, position)
-                if match:
-                    value = match.group(0)
-                    if token_type != 'WHITESPACE':  # Ignore whitespaces
-                        self.tokens.append((token_type, value))
-                    position = match.end()
-                    break
-            if not match:
-                # Handle unexpected characters or syntax errors
-                self.tokens.append(('ERROR', f"Unexpected character at position {position}: {self.input_code[position]}"))
-                position += 1
-
-    def parallel_tokenize(self):
-        """
-        Tokenize using multi-threading for faster processing, especially for larger input sizes.
-        """
-        def worker(start, end):
-            segment = self.input_code[start:end]
-            lexer_segment = OverpoweredLexer(segment)
-            lexer_segment.tokenize()
-            return lexer_segment.tokens
-
-        threads = []
-        num_threads = 4
-        segment_length = len(self.input_code) // num_threads
-
-        for i in range(num_threads):
-            start = i * segment_length
-            end = start + segment_length if i != num_threads - 1 else len(self.input_code)
-            thread = threading.Thread(target=lambda idx=i: threads.append(worker(start, end)))
-            threads.append(thread)
-            thread.start()
-
-        for thread in threads:
-            thread.join()
-
-        # Merge all tokens from different threads and sort by position
-        all_tokens = deque()
-        for thread_tokens in threads:
-            all_tokens.extend(thread_tokens)
-        
-        self.tokens = sorted(all_tokens, key=lambda x: self.input_code.index(x[1]))
+        # Single pass over the input with the shared master regex (first matching pattern wins,
+        # unexpected characters are recorded as ERROR tokens)
+        if cache is not None:
+            table = cache.lex_table(self.input_code, self.token_patterns)
+        else:
+            binary = not isinstance(self.input_code, str)
+            table = compile_engine(self.token_patterns, binary=binary).lex_table(self.input_code)
+        if self.tokens:
+            self.tokens.extend(table)
+        else:
+            self.tokens = table
+
+    def update(self, edit_offset, removed_len, inserted_text):
+        """
+        Applies an edit to the input code (removed_len characters at edit_offset replaced by
+        inserted_text) and re-lexes only the tokens around it; the tokens after the edit are
+        reused and shifted instead of being scanned again.
+        For a memory-mapped or bytes source (from_file), offsets are in bytes and inserted_text is
+        encoded as UTF-8; the edited source is then a bytes copy, the file itself is left alone.
+        """
+        binary = not isinstance(self.input_code, str)
+        if binary and isinstance(inserted_text, str):
+            inserted_text = inserted_text.encode('utf-8')
+        self.input_code = (self.input_code[:edit_offset] + inserted_text
+                           + self.input_code[edit_offset + removed_len:])
+        if not isinstance(self.tokens, TokenTable) or self.tokens.source is None:
+            self.tokens = []
+            self.tokenize()
+            return self.tokens
+        engine = compile_engine(self.token_patterns, binary=binary)
+        engine.relex(self.tokens, self.input_code, edit_offset, removed_len, len(inserted_text))
+        return self.tokens
+
+    def tokenize_stream(self, fileobj, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Lazily tokenizes a text file object chunk by chunk, yielding (token_type, value) tuples.
+        Tokens spanning chunk boundaries are handled, and neither the whole source nor the token
+        list is kept in memory, so sources larger than memory can be lexed.
+        """
+        engine = compile_engine(self.token_patterns)
+        for token_type, value, position in engine.stream(fileobj, chunk_size):
+            if token_type == 'ERROR':
+                value = f"Unexpected character at position {position}: {value}"
+            yield (token_type, value)
+
+    def parallel_tokenize(self, workers=None):
+        """
+        Tokenize using multiple processes for faster processing, especially for larger input sizes.
+        The input is split at line starts, segments are lexed in a process pool and merged in source
+        order; the result is identical to tokenize() on the whole input.
+        """
+        self.tokens = parallel_lex(self.input_code, self.token_patterns, workers)
 
     def optimize(self):
         """
@@ -97,12 +112,16 @@ class OverpoweredLexer:
         Displays all tokens along with their types.
         """
         for token_type, value in self.tokens:
+            if isinstance(value, memoryview):
+                value = str(value, 'utf-8', 'replace')
             print(f"{token_type}: {value}")
 
     def generate_token_summary(self):
         """
         Generates a summary of the token counts by type.
         """
+        if isinstance(self.tokens, TokenTable):
+            return self.tokens.summary()
         summary = {}
         for token_type, value in self.tokens:
             if token_type not in summary:
@@ -122,9 +141,15 @@ class OverpoweredLexer:
         print("\nFull Token List:")
         self.display_tokens()
 
+    def token_location(self, index):
+        """
+        Returns the (line, column) where the token at index starts, resolved from its source offset.
+        """
+        return self.tokens.line_column(index)
+
     def get_tokens(self):
         """
-        Returns the list of tokens after lexing.
+        Returns the tokens after lexing (a TokenTable once tokenized).
         """
         return self.tokens
 
@@ -147,14 +172,15 @@ while x > y:
 
 """
 
-lexer = OverpoweredLexer(source_code)
+if __name__ == "__main__":
+    lexer = OverpoweredLexer(source_code)
 
-start_time = time.time()
-lexer.tokenize()  # Standard tokenization
-lexer.parallel_tokenize()  # Optimized multi-threaded tokenization
-lexer.optimize()  # Apply further optimizations
-end_time = time.time()
+    start_time = time.time()
+    lexer.tokenize()  # Standard tokenization
+    lexer.parallel_tokenize()  # Optimized multi-process tokenization
+    lexer.optimize()  # Apply further optimizations
+    end_time = time.time()
 
-lexer.generate_token_report()
+    lexer.generate_token_report()
 
-print("\nProcessing time:", end_time - start_time)
+    print("\nProcessing time:", end_time - start_time)
@@ -1,8 +1,138 @@
 # Imperial Superior Evaluation System (ISES) - Full Implementation
 
+import re
+from itertools import chain
+
+from AST import TOKEN_PATTERNS, AstronomicalAST
+from ast_nodes import NodeType
+from ast_parser import Parser
+from ast_scope import LAMBDA_SCOPE, MODULE_SCOPE, analyze_scope
+from ast_walk import SKIP_CHILDREN, NodeVisitor
+from lexing_engine import compile_engine
+from token_table import TokenTable
+
+# Nodes that can contain statements; the walk does not go into any other subtree
+_STATEMENT_CONTAINERS = frozenset((
+    NodeType.MODULE, NodeType.BLOCK, NodeType.FUNCTION_DEFINITION, NodeType.CLASS_DEFINITION,
+    NodeType.DECORATED, NodeType.IF, NodeType.WHILE, NodeType.FOR, NodeType.TRY, NodeType.EXCEPT_HANDLER,
+    NodeType.ELSE, NodeType.FINALLY, NodeType.WITH,
+))
+# Definitions whose names are listed as functions (or not at all, for classes) rather than as variables
+_DEFINITIONS = frozenset((NodeType.FUNCTION_DEFINITION, NodeType.CLASS_DEFINITION))
+# Names of the scopes without a name of their own, as Python calls them
+_ANONYMOUS_SCOPES = {
+    NodeType.LIST_COMPREHENSION: '<listcomp>', NodeType.SET_COMPREHENSION: '<setcomp>',
+    NodeType.DICT_COMPREHENSION: '<dictcomp>', NodeType.GENERATOR_EXPRESSION: '<genexpr>',
+}
+
+# Line patterns for code the parser rejects
+_FUNCTION_LINE = re.compile(r'\s*(?:async\s+)?def\s+(\w+)')
+_ASSIGNMENT_LINE = re.compile(r'\s*(\w+)\s*(?:[-+*/%&|^@]|//|\*\*|<<|>>)?=(?!=)')
+_CONTROL_LINE = re.compile(r'\s*(if|while|for)\b')
+
+
+def _scope_prefixes(table):
+    # Qualified name prefix of every scope ('Point.move.'), the module's being empty
+    prefixes = {}
+    for scope in table.scopes:
+        if scope.kind == MODULE_SCOPE:
+            prefixes[scope] = ''
+        elif scope.kind == LAMBDA_SCOPE:
+            prefixes[scope] = prefixes[scope.parent] + '<lambda>.'
+        else:
+            name = _ANONYMOUS_SCOPES.get(scope.node.type, scope.node.value)
+            prefixes[scope] = prefixes[scope.parent] + name + '.'
+    return prefixes
+
+
+class _ProgramOutline(NodeVisitor):
+    """
+    Collects the functions and control flow statements of a tree in one walk, which only enters the
+    nodes that can hold statements, and the variables from its ScopeTable. Names are qualified by
+    the scopes they belong to ('Point.move', 'move.step'); a name declared global is a module one.
+    """
+
+    def __init__(self, table, source=None):
+        self.table = table
+        self.source = source
+        self.functions = []
+        self.control_flow = []  # (kind, source line)
+        self._prefixes = _scope_prefixes(table)
+
+    @property
+    def variables(self):
+        """
+        (qualified name, slot) for every variable, scope by scope in source order, the slot being the
+        symbol's index among its scope's own symbols. Parameters, loop targets, with and except
+        names, imports and walrus targets are variables; names bound only by def and class are not.
+        """
+        prefixes = self._prefixes
+        return [
+            (prefixes[scope] + symbol.name, symbol.index)
+            for scope in self.table.scopes
+            for symbol in scope.locals
+            if any(node.type not in _DEFINITIONS for node in symbol.definitions)
+        ]
+
+    def generic_visit(self, node):
+        if node.type not in _STATEMENT_CONTAINERS:
+            return SKIP_CHILDREN
+
+    def _line(self, node, kind):
+        # The source line a statement starts on, or its kind when the source is not known
+        if self.source is None or node.start is None:
+            return kind
+        start = self.source.rfind('\n', 0, node.start) + 1
+        end = self.source.find('\n', node.start)
+        return self.source[start:end if end >= 0 else len(self.source)].strip()
+
+    def visit_FunctionDefinition(self, node):
+        symbol = self.table.symbol(node)
+        self.functions.append(self._prefixes[symbol.scope] + node.value)
+
+    def visit_If(self, node):
+        self.control_flow.append(('if', self._line(node, 'if')))
+
+    def visit_While(self, node):
+        self.control_flow.append(('while', self._line(node, 'while')))
+
+    def visit_For(self, node):
+        self.control_flow.append(('for', self._line(node, 'for')))
+
+
+def _outline_lines(source):
+    # Functions, variables and control flow of code the parser rejects, found line by line: names
+    # are not qualified and variables have no slot
+    functions, variables, control_flow = [], {}, []
+    for line in source.splitlines():
+        match = _FUNCTION_LINE.match(line)
+        if match:
+            functions.append(match.group(1))
+            continue
+        match = _CONTROL_LINE.match(line)
+        if match:
+            control_flow.append((match.group(1), line.strip()))
+            continue
+        match = _ASSIGNMENT_LINE.match(line)
+        if match:
+            variables.setdefault(match.group(1))
+    return functions, [(name, None) for name in variables], control_flow
+
+
 class ISES:
-    def __init__(self, input_code):
+    def __init__(self, input_code=None, tokens=None, tree=None):
+        """
+        input_code is the source text or an AstronomicalAST. Instead of parsing the text, ISES can
+        take the tokens of a lexer that keeps whitespace (as AstronomicalAST.parse does) or an
+        already parsed tree, whose source lines then come from input_code if it is given.
+        The parser needs the whitespace tokens for the layout, which most lexers drop (tokenize(),
+        tokenize_stream(), ...): tokens without any are replaced by a lexing of the source, which is
+        input_code or the TokenTable's own source.
+        """
         self.input_code = input_code
+        self.tokens = tokens
+        self.tree = tree
+        self.parse_error = None  # the SyntaxError of code only the line scan could read
         self.machine_code = []
         self.comments = []
         self.optimizations = []
@@ -11,42 +141,81 @@ class ISES:
         """
         Parse the human-readable input code and identify key elements such as functions,
         variables, and control structures. Break them down into logical blocks.
+        The code is parsed once (or the given tokens or tree are used), the tree walked once and its
+        variables taken from the scope analysis. Source the parser rejects is scanned line by line
+        instead, which only finds unqualified names and no slots; the SyntaxError is then kept in
+        parse_error and noted in the comments. Without a source, it is raised.
         """
-        self.functions = self._identify_functions(self.input_code)
-        self.variables = self._identify_variables(self.input_code)
-        self.control_flow = self._identify_control_flow(self.input_code)
-    
-    def _identify_functions(self, code):
-        """
-        Identifies function definitions and breaks them down into components.
-        """
-        functions = []
-        for line in code.split('\n'):
-            if line.strip().startswith('def'):
-                function_name = line.split('(')[0].replace('def ', '').strip()
-                functions.append(function_name)
-        return functions
+        source = self._source()
+        self.parse_error = None
+        try:
+            tree, table = self._analysis()
+        except SyntaxError as error:
+            if source is None:
+                raise
+            self.parse_error = error
+            self.comments.append(f"The code does not parse ({error}); functions, variables and control "
+                                 f"flow were found line by line.")
+            self.functions, self.variables, self.control_flow = _outline_lines(source)
+            return
+        outline = _ProgramOutline(table, source)
+        outline.visit(tree)
+        self.functions = outline.functions
+        self.variables = outline.variables
+        self.control_flow = outline.control_flow
 
-    def _identify_variables(self, code):
-        """
-        Identifies variables within the code.
-        """
-        variables = []
-        for line in code.split('\n'):
-            if '=' in line:
-                var_name = line.split('=')[0].strip()
-                variables.append(var_name)
-        return variables
+    def _analysis(self):
+        # The tree and its ScopeTable, reusing the ones an AstronomicalAST already has
+        if self.tree is not None:
+            return self.tree, analyze_scope(self.tree)
+        if isinstance(self.input_code, AstronomicalAST):
+            return self.input_code.get_ast() or self.input_code.parse(), self.input_code.analyze_scope()
+        if self.tokens is not None:
+            tokens, relexed = self._parser_tokens()
+            try:
+                tree = Parser(tokens).parse_module()
+            except SyntaxError as error:
+                if relexed is None:
+                    raise ValueError("The tokens have no whitespace, which the parser needs for the layout, "
+                                     "and no source to lex again was given") from error
+                raise
+            return tree, analyze_scope(tree)
+        ast = AstronomicalAST(self.input_code)
+        ast.parse()
+        return ast.ast_root, ast.analyze_scope()
 
-    def _identify_control_flow(self, code):
-        """
-        Identifies control flow structures (e.g., loops, conditionals).
-        """
-        control_flow = []
-        for line in code.split('\n'):
-            if 'if' in line or 'while' in line or 'for' in line:
-                control_flow.append(line.strip())
-        return control_flow
+    def _parser_tokens(self):
+        # (tokens, relexed): the given tokens if they keep whitespace (relexed False), else a lexing
+        # of the source (True), else the tokens as they are (None), which only parse as one line
+        tokens = self.tokens
+        if isinstance(tokens, TokenTable):
+            whitespace = tokens.type_names.index('WHITESPACE') if 'WHITESPACE' in tokens.type_names else -1
+            if whitespace >= 0 and tokens.find_kind(whitespace) >= 0:
+                return tokens.located(), False
+            tokens = tokens.located()
+        else:
+            # Reads ahead up to the first whitespace token, so streams are not consumed
+            tokens = iter(tokens)
+            seen = []
+            for token in tokens:
+                seen.append(token)
+                if token[0] == 'WHITESPACE':
+                    return chain(seen, tokens), False
+            tokens = seen
+        source = self._source()
+        if source is None:
+            return tokens, None
+        return compile_engine(TOKEN_PATTERNS, skip=()).lex_table(source).located(), True
+
+    def _source(self):
+        if isinstance(self.input_code, AstronomicalAST):
+            return self.input_code.source_code
+        if isinstance(self.input_code, str):
+            return self.input_code
+        if isinstance(self.tokens, TokenTable) and self.tokens.source is not None:
+            source = self.tokens.source
+            return source if isinstance(source, str) else str(source, 'utf-8')  # bytes or a memory map
+        return None
     
     def scrutinize_code(self):
         """
@@ -74,23 +243,28 @@ class ISES:
     def _process_variable(self, var):
         """
         Processes variables and generates corresponding machine code.
+        var is a (qualified name, slot) pair from parse_input; the slot is None for code that only
+        the line scan could read.
         """
-        self.machine_code.append(f"; Variable: {var}")
-        self.comments.append(f"Variable {var} is initialized or assigned a value.")
-        self.machine_code.append(f"ALLOCATE {var}_mem 64")  # Placeholder allocation size
-        self.optimizations.append(f"Variable {var} allocated with optimized memory management.")
+        name, slot = var
+        self.machine_code.append(f"; Variable: {name}" if slot is None else f"; Variable: {name} (slot {slot})")
+        self.comments.append(f"Variable {name} is initialized or assigned a value.")
+        self.machine_code.append(f"ALLOCATE {name}_mem 64")  # Placeholder allocation size
+        self.optimizations.append(f"Variable {name} allocated with optimized memory management.")
     
     def _process_control_flow(self, control):
         """
         Processes control flow structures (if, while, for) and generates machine instructions.
+        control is a (kind, source line) pair from parse_input.
         """
-        self.machine_code.append(f"; Control Flow: {control}")
-        if 'if' in control:
-            self._handle_if_statement(control)
-        elif 'while' in control:
-            self._handle_while_loop(control)
-        elif 'for' in control:
-            self._handle_for_loop(control)
+        kind, statement = control
+        self.machine_code.append(f"; Control Flow: {statement}")
+        if kind == 'if':
+            self._handle_if_statement(statement)
+        elif kind == 'while':
+            self._handle_while_loop(statement)
+        elif kind == 'for':
+            self._handle_for_loop(statement)
     
     def _handle_if_statement(self, statement):
         """
@@ -1,3 +1,5 @@
+from lexer_implementation import Lexer
+
 source_code = 'int x = 42'
 lexer = Lexer(source_code)
 tokens = lexer.tokenize()
@@ -0,0 +1,400 @@
+import struct
+import sys
+from array import array
+
+from ast_nodes import NO_CHILDREN, NO_METADATA, NODE_TYPES, ASTNode, NodeType
+from ast_walk import format_ast
+
+
+# **COLUMNAR AST ARENA**
+
+ARENA_MAGIC = b'PYSYSAST'
+ARENA_VERSION = 1
+NO_NODE = -1
+NO_POSITION = 0xFFFFFFFF  # span of a node parsed from tokens without offsets
+
+# magic, version, number of type names, size of the type name block, number of nodes,
+# number of strings, size of the string block
+_HEADER = struct.Struct('<8sHHIIII')
+_COMPARISON = NodeType.COMPARISON.value
+_OPERATOR_SEPARATOR = '\0'  # joins the operators of a Comparison value in the string table
+
+
+class ASTArena:
+    """
+    Struct-of-arrays storage for a whole AST. Nodes are integer handles into parallel columns: a type
+    id byte, an index into a deduplicated string table for the value, the first child, next sibling
+    and parent handles, and the source span. Handles are numbered in pre-order from the root (0), so
+    every subtree is the contiguous handle range subtree(handle), and whole-tree passes are plain
+    loops over the columns instead of walks over millions of node objects.
+    The columns are arrays, or read-only memoryviews over a buffer passed to load(), so a tree is
+    dumped and loaded as a few contiguous blocks. ASTNode-like views (ArenaNode) are available for
+    code written against the object tree.
+    """
+
+    def __init__(self, type_names=None):
+        self.type_names = list(type_names) if type_names is not None else [node_type.value for node_type in NodeType]
+        self._type_ids = {name: index for index, name in enumerate(self.type_names)}
+        self.kinds = array('B')
+        self.values = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.parents = array('i')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.strings = []
+        self._string_ids = {}
+        self.metadata = {}  # handle -> dict, for views that set metadata
+
+    @classmethod
+    def from_tree(cls, root):
+        """
+        Copies an ASTNode tree (or any tree of objects with type, value and children) into a new arena.
+        The tree is walked with an explicit stack, so its depth does not matter.
+        """
+        arena = cls()
+        kinds, values = arena.kinds, arena.values
+        first_child, next_sibling, parents = arena.first_child, arena.next_sibling, arena.parents
+        starts, ends = arena.starts, arena.ends
+        type_ids, string_ids = arena._type_ids, arena._string_ids
+        last_child = []  # per handle, the last child appended so far
+
+        stack = [(root, NO_NODE)]
+        pop, push = stack.pop, stack.append
+        handle = -1
+        while stack:
+            node, parent = pop()
+            handle += 1
+            type_id = type_ids.get(node.type)
+            kinds.append(type_id if type_id is not None else arena._type_id(node.type))
+            value = node.value
+            if value is None:
+                values.append(NO_NODE)
+            else:
+                string_id = string_ids.get(value)
+                values.append(string_id if string_id is not None else arena._string_id(value))
+            first_child.append(NO_NODE)
+            next_sibling.append(NO_NODE)
+            parents.append(parent)
+            start = node.start
+            if start is None:
+                starts.append(NO_POSITION)
+                ends.append(NO_POSITION)
+            else:
+                starts.append(start)
+                ends.append(node.end)
+            last_child.append(NO_NODE)
+            if parent != NO_NODE:
+                previous = last_child[parent]
+                if previous == NO_NODE:
+                    first_child[parent] = handle
+                else:
+                    next_sibling[previous] = handle
+                last_child[parent] = handle
+            children = node.children
+            if children:
+                for child in reversed(children):
+                    push((child, handle))
+        return arena
+
+    def _type_id(self, type_):
+        type_id = self._type_ids.get(type_)
+        if type_id is None:
+            if len(self.type_names) > 255:
+                raise ValueError("Too many node types for one arena (at most 256)")
+            type_id = self._type_ids[type_] = len(self.type_names)
+            self.type_names.append(str(type_))
+        return type_id
+
+    def _string_id(self, value):
+        key = value
+        if isinstance(value, tuple):
+            value = _OPERATOR_SEPARATOR.join(value)
+        elif not isinstance(value, str):
+            raise TypeError(f"Node values must be strings, got {type(value).__name__}")
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        self._string_ids[key] = string_id  # comparison operator tuples are looked up as they are
+        return string_id
+
+    # Node access
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def root(self):
+        """
+        The root handle, or NO_NODE for an empty arena.
+        """
+        return 0 if len(self.kinds) else NO_NODE
+
+    def type(self, handle):
+        """
+        Returns the node type: a NodeType member, or the plain name for types NodeType does not know.
+        """
+        name = self.type_names[self.kinds[handle]]
+        return NODE_TYPES.get(name, name)
+
+    def type_id(self, type_):
+        """
+        Returns the type id the arena uses in its kinds column for a node type, or -1 if it has none.
+        """
+        return self._type_ids.get(type_, -1)
+
+    def value(self, handle):
+        string_id = self.values[handle]
+        if string_id == NO_NODE:
+            return None
+        value = self.strings[string_id]
+        if self.type_names[self.kinds[handle]] == _COMPARISON:
+            return tuple(value.split(_OPERATOR_SEPARATOR))
+        return value
+
+    def parent(self, handle):
+        return self.parents[handle]
+
+    def span(self, handle):
+        """
+        Returns the (start, end) source offsets of a node, or None when they are unknown.
+        """
+        start = self.starts[handle]
+        if start == NO_POSITION:
+            return None
+        return start, self.ends[handle]
+
+    def children(self, handle):
+        """
+        Returns the handles of a node's children, in order.
+        """
+        next_sibling = self.next_sibling
+        children = []
+        child = self.first_child[handle]
+        while child != NO_NODE:
+            children.append(child)
+            child = next_sibling[child]
+        return children
+
+    def subtree(self, handle=0):
+        """
+        Returns the range of handles of a node and all its descendants.
+        """
+        next_sibling, parents = self.next_sibling, self.parents
+        node = handle
+        while node != NO_NODE:
+            following = next_sibling[node]
+            if following != NO_NODE:
+                return range(handle, following)
+            node = parents[node]
+        return range(handle, len(self.kinds))
+
+    def find_all(self, type_, handle=0):
+        """
+        Returns the handles of all nodes of a type within the subtree of handle, in pre-order.
+        """
+        type_id = self._type_ids.get(type_)
+        if type_id is None:
+            return []
+        nodes = self.subtree(handle)
+        kinds = bytes(self.kinds[nodes.start:nodes.stop])
+        found = []
+        position = kinds.find(type_id)
+        while position >= 0:
+            found.append(nodes.start + position)
+            position = kinds.find(type_id, position + 1)
+        return found
+
+    def count_by_type(self):
+        """
+        Returns a {node type: count} dict for the whole arena.
+        """
+        kinds = bytes(self.kinds)
+        return {NODE_TYPES.get(self.type_names[type_id], self.type_names[type_id]): kinds.count(type_id)
+                for type_id in sorted(set(kinds))}
+
+    def node(self, handle=0):
+        """
+        Returns an ASTNode-like view of a node.
+        """
+        return ArenaNode(self, handle)
+
+    def to_tree(self, handle=0):
+        """
+        Builds an ASTNode tree from the subtree of handle (pre-order handles make this one loop).
+        """
+        children = {}  # handle -> its children built so far, last child first
+        node = None
+        for current in reversed(self.subtree(handle)):
+            built = children.pop(current, None)
+            if built:
+                built.reverse()
+            node = ASTNode(self.type(current), self.value(current), built)
+            span = self.span(current)
+            if span is not None:
+                node.start, node.end = span
+            for child in node.children:
+                child.parent = node
+            if current in self.metadata:
+                for key, value in self.metadata[current].items():
+                    node.set_metadata(key, value)
+            if current != handle:
+                children.setdefault(self.parents[current], []).append(node)
+        return node
+
+    def nbytes(self):
+        """
+        Returns the memory taken by the node columns, in bytes (the string table not included).
+        """
+        return sum(column.itemsize * len(column) for column in self._columns())
+
+    def _columns(self):
+        return (self.kinds, self.values, self.first_child, self.next_sibling, self.parents, self.starts, self.ends)
+
+    # Contiguous dump and load
+
+    def dump(self, output):
+        """
+        Writes the arena to a binary file object: a header, the type names, the seven node columns
+        and the string table, each one contiguous block.
+        """
+        names = '\0'.join(self.type_names).encode('utf-8')
+        encoded = [string.encode('utf-8', 'surrogatepass') for string in self.strings]
+        offsets = array('I', [0])
+        total = 0
+        for data in encoded:
+            total += len(data)
+            offsets.append(total)
+        count = len(self.kinds)
+        columns = list(self._columns()[1:]) + [offsets]
+        if sys.byteorder == 'big':
+            columns = [array('I' if column is offsets else column.typecode, column) for column in columns]
+            for column in columns:
+                column.byteswap()
+        output.write(_HEADER.pack(ARENA_MAGIC, ARENA_VERSION, len(self.type_names), len(names), count,
+                                  len(encoded), total))
+        output.write(names + _padding(_HEADER.size + len(names)))
+        output.write(bytes(self.kinds) + _padding(count))
+        for column in columns:
+            output.write(bytes(column))
+        output.write(b''.join(encoded))
+
+    def dumps(self):
+        """
+        Returns the binary form written by dump() as bytes.
+        """
+        import io
+
+        output = io.BytesIO()
+        self.dump(output)
+        return output.getvalue()
+
+    @classmethod
+    def load(cls, data):
+        """
+        Loads an arena from a buffer written by dump() (bytes, or an mmap for a file). The node
+        columns are memoryviews over the buffer itself, nothing is copied but the string table.
+        """
+        magic, version, type_count, names_size, count, string_count, strings_size = _HEADER.unpack_from(data)
+        if magic != ARENA_MAGIC or version != ARENA_VERSION:
+            raise ValueError("Not an AST arena dump")
+        view = memoryview(data)
+        offset = _HEADER.size
+        type_names = bytes(view[offset:offset + names_size]).decode('utf-8').split('\0')
+        if len(type_names) != type_count:
+            raise ValueError("Corrupt AST arena dump")
+        arena = cls(type_names)
+        offset += names_size + len(_padding(offset + names_size))
+        arena.kinds = view[offset:offset + count]
+        offset += count + len(_padding(count))
+        columns = []
+        for typecode in ('i', 'i', 'i', 'i', 'I', 'I'):
+            columns.append(view[offset:offset + 4 * count].cast(typecode))
+            offset += 4 * count
+        offsets = view[offset:offset + 4 * (string_count + 1)].cast('I')
+        offset += 4 * (string_count + 1)
+        if offset + strings_size > len(view):
+            raise ValueError("Truncated AST arena dump")
+        if sys.byteorder == 'big':
+            columns = [array(column.format, column) for column in columns]
+            offsets = array('I', offsets)
+            for column in columns + [offsets]:
+                column.byteswap()
+        arena.values, arena.first_child, arena.next_sibling, arena.parents, arena.starts, arena.ends = columns
+        block = bytes(view[offset:offset + strings_size])
+        arena.strings = [block[offsets[index]:offsets[index + 1]].decode('utf-8', 'surrogatepass')
+                         for index in range(string_count)]
+        arena._string_ids = {string: index for index, string in enumerate(arena.strings)}
+        return arena
+
+    def __repr__(self):
+        return f"<ASTArena: {len(self.kinds)} nodes, {len(self.strings)} strings>"
+
+
+def _padding(size):
+    return b'\0' * (-size % 4)
+
+
+# **ASTNODE-COMPATIBLE VIEWS**
+
+class ArenaNode:
+    """
+    A read-only ASTNode look-alike over one arena handle: type, value, children, parent, start, end
+    and metadata behave as on ASTNode, so code consuming AstronomicalAST.get_ast() works on arena
+    trees too. Views are created on access and compare equal when they denote the same node.
+    """
+
+    __slots__ = ('arena', 'handle')
+
+    def __init__(self, arena, handle):
+        self.arena = arena
+        self.handle = handle
+
+    @property
+    def type(self):
+        return self.arena.type(self.handle)
+
+    @property
+    def value(self):
+        return self.arena.value(self.handle)
+
+    @property
+    def children(self):
+        arena = self.arena
+        children = arena.children(self.handle)
+        return tuple(ArenaNode(arena, child) for child in children) if children else NO_CHILDREN
+
+    @property
+    def parent(self):
+        parent = self.arena.parents[self.handle]
+        return None if parent == NO_NODE else ArenaNode(self.arena, parent)
+
+    @property
+    def start(self):
+        span = self.arena.span(self.handle)
+        return None if span is None else span[0]
+
+    @property
+    def end(self):
+        span = self.arena.span(self.handle)
+        return None if span is None else span[1]
+
+    @property
+    def metadata(self):
+        return self.arena.metadata.get(self.handle, NO_METADATA)
+
+    def set_metadata(self, key, value):
+        self.arena.metadata.setdefault(self.handle, {})[key] = value
+
+    def add_child(self, child):
+        raise TypeError("Arena trees are read-only; use ASTArena.to_tree() for an editable tree")
+
+    def __eq__(self, other):
+        return isinstance(other, ArenaNode) and other.arena is self.arena and other.handle == self.handle
+
+    def __hash__(self):
+        return hash((id(self.arena), self.handle))
+
+    def __repr__(self, depth=0):
+        return format_ast(self, depth)
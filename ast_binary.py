@@ -0,0 +1,341 @@
+import gc
+import io
+import mmap
+import re
+import struct
+import sys
+from array import array
+
+from ast_nodes import NODE_TYPES, ASTNode, NodeType
+from token_cache import TokenCache
+
+
+# **COMPACT BINARY AST FORMAT**
+#
+# A file holds a header, the node type names, a deduplicated string table (an offset array, then
+# the UTF-8 data), an index of where each top-level statement starts, and the nodes in pre-order.
+# A node is five unsigned LEB128 varints: type id, value (string index + 1, 0 for None), number of
+# children, start (zigzag-encoded distance from the parent's start, + 1, 0 for no span) and length.
+# Most fit in one byte, so a node takes 5-8 bytes. Bump AST_FORMAT_VERSION whenever the layout or
+# the trees the parser builds change: cached files of other versions are not read.
+
+AST_MAGIC = b'PYSYSAFB'
+AST_FORMAT_VERSION = 1
+
+# magic, version, number of type names, size of the type name block, number of strings, size of the
+# string block, number of top-level statements, number of nodes, size of the node stream
+_HEADER = struct.Struct('<8sHHIIIIII')
+_OPERATOR_SEPARATOR = '\0'  # joins the operators of a Comparison value, as in ASTArena
+_VARINT = re.compile(rb'[\x80-\xff]*[\x00-\x7f]')
+
+
+def dump_ast(root, output):
+    """
+    Writes the tree under root (a 'Module' node, or any node) to a binary file object.
+    """
+    type_names = [node_type.value for node_type in NodeType]
+    type_ids = {name: index for index, name in enumerate(type_names)}
+    strings = []
+    string_ids = {}
+    statements = array('I')
+    stream = bytearray()
+    append = stream.append
+
+    def varint(value):
+        while value >= 0x80:
+            append(value & 0x7F | 0x80)
+            value >>= 7
+        append(value)
+
+    stack = [(root, None, False)]
+    pop, push = stack.pop, stack.append
+    while stack:
+        node, parent_start, top_level = pop()
+        if top_level:
+            statements.append(len(stream))
+        type_id = type_ids.get(node.type)
+        if type_id is None:
+            if len(type_names) > 0xFFFF:
+                raise ValueError("Too many node types")
+            type_id = type_ids[node.type] = len(type_names)
+            type_names.append(str(node.type))
+        value = node.value
+        if value is None:
+            value_id = 0
+        else:
+            value_id = string_ids.get(value)
+            if value_id is None:
+                text = _OPERATOR_SEPARATOR.join(value) if isinstance(value, tuple) else value
+                if not isinstance(text, str):
+                    raise TypeError(f"Node values must be strings, got {type(value).__name__}")
+                strings.append(text)
+                value_id = string_ids[value] = len(strings)
+        children = node.children
+        start = node.start
+        if start is None:
+            span = 0
+        else:
+            distance = start - (parent_start or 0)
+            span = (distance << 1 if distance >= 0 else (-distance << 1) - 1) + 1
+
+        for number in (type_id, value_id, len(children)):
+            if number < 0x80:
+                append(number)
+            else:
+                varint(number)
+        varint(span)
+        varint(0 if start is None else node.end - start)
+        top_level = node is root
+        for child in reversed(children):
+            push((child, start, top_level))
+
+    names = '\0'.join(type_names).encode('utf-8')
+    encoded = [string.encode('utf-8', 'surrogatepass') for string in strings]
+    offsets = array('I', [0])
+    total = 0
+    for data in encoded:
+        total += len(data)
+        offsets.append(total)
+    statements.append(len(stream))
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+        statements.byteswap()
+    output.write(_HEADER.pack(AST_MAGIC, AST_FORMAT_VERSION, len(type_names), len(names), len(strings), total,
+                              len(statements) - 1, _node_count(root), len(stream)))
+    output.write(names + _padding(len(names)))
+    output.write(bytes(offsets))
+    output.write(b''.join(encoded) + _padding(total))
+    output.write(bytes(statements))
+    output.write(stream)
+
+
+def dumps_ast(root):
+    """
+    Returns the binary form of the tree under root as bytes.
+    """
+    output = io.BytesIO()
+    dump_ast(root, output)
+    return output.getvalue()
+
+
+def _node_count(root):
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def _padding(size):
+    return b'\0' * (-size % 4)
+
+
+class ASTFile:
+    """
+    Reader over a binary AST held in a buffer (bytes, or an mmap of the file). Nothing is decoded
+    up front: strings are decoded when a node first needs them, and each top-level statement is
+    decoded into ASTNodes the first time it is asked for, so a consumer that only looks at a few
+    definitions does not pay for the whole module.
+    """
+
+    def __init__(self, data):
+        (magic, version, type_count, names_size, string_count, strings_size, statement_count, node_count,
+         stream_size) = _HEADER.unpack_from(data)
+        if magic != AST_MAGIC:
+            raise ValueError("Not a binary AST")
+        if version != AST_FORMAT_VERSION:
+            raise ValueError(f"Binary AST version {version}, expected {AST_FORMAT_VERSION}")
+        self.data = data
+        self.node_count = node_count
+        view = memoryview(data)
+        offset = _HEADER.size
+        names = bytes(view[offset:offset + names_size]).decode('utf-8').split('\0')
+        if len(names) != type_count:
+            raise ValueError("Corrupt binary AST")
+        self.types = [NODE_TYPES.get(name) or sys.intern(name) for name in names]
+        offset += names_size + len(_padding(names_size))
+        self._string_offsets = _column(view, offset, string_count + 1)
+        offset += 4 * (string_count + 1)
+        self._strings_at = offset
+        self._strings = [None] * (string_count + 1)
+        offset += strings_size + len(_padding(strings_size))
+        self._statement_offsets = _column(view, offset, statement_count + 1)
+        offset += 4 * (statement_count + 1)
+        self._stream_at = offset
+        if offset + stream_size > len(view):
+            raise ValueError("Truncated binary AST")
+        self._statements = [None] * statement_count
+        self._root = None
+
+    def __len__(self):
+        """
+        The number of top-level statements.
+        """
+        return len(self._statements)
+
+    def statement(self, index):
+        """
+        Returns the top-level statement at index as an ASTNode tree, decoding it on first use.
+        Its parent is the root returned by module().
+        """
+        statement = self._statements[index]
+        if statement is None:
+            offsets = self._statement_offsets
+            statement = self._decode(offsets[index], offsets[index + 1], self._root_node().start)
+            statement.parent = self._root
+            self._statements[index] = statement
+        return statement
+
+    def module(self):
+        """
+        Decodes every top-level statement not decoded yet and returns the root with its children.
+        """
+        # As in Parser.parse_module: the decoded nodes all stay reachable, so collecting is wasted
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            root = self._root_node()
+            root.children = tuple(self.statement(index) for index in range(len(self._statements)))
+            return root
+        finally:
+            if collecting:
+                gc.enable()
+
+    def _root_node(self):
+        if self._root is None:
+            self._root = self._decode(0, self._statement_offsets[0], None, children=False)
+        return self._root
+
+    def _string(self, value_id):
+        string = self._strings[value_id]
+        if string is None:
+            offsets = self._string_offsets
+            at = self._strings_at
+            string = self._strings[value_id] = bytes(self.data[at + offsets[value_id - 1]:at + offsets[value_id]]).decode(
+                'utf-8', 'surrogatepass')
+        return string
+
+    def _decode(self, first, last, parent_start, children=True):
+        # Decodes the subtree stored in stream bytes first..last; with children=False only its root
+        fields = _varints(self.data[self._stream_at + first:self._stream_at + last])
+        types = self.types
+        strings = self._strings
+        string = self._string
+        frames = []  # [type, value, start, end, children left, children] of the nodes being built
+        index = 0
+        while True:
+            type_id, value_id, child_count, span, length = fields[index:index + 5]
+            index += 5
+            type_ = types[type_id]
+            if value_id:
+                value = strings[value_id] or string(value_id)
+                if type_ is NodeType.COMPARISON:
+                    value = tuple(value.split(_OPERATOR_SEPARATOR))
+            else:
+                value = None
+            if span:
+                start = (parent_start or 0) + (-(span >> 1) if span & 1 == 0 else (span - 1) >> 1)
+                end = start + length
+            else:
+                start = end = None
+
+            if child_count and children:
+                frames.append([type_, value, start, end, child_count, []])
+                parent_start = start
+                continue
+            node = ASTNode(type_, value, None, None, start, end)
+
+            # Close every frame this node completes
+            while frames:
+                frame = frames[-1]
+                frame[5].append(node)
+                frame[4] -= 1
+                if frame[4]:
+                    break
+                frames.pop()
+                node = ASTNode(frame[0], frame[1], frame[5], None, frame[2], frame[3])
+                for child in node.children:
+                    child.parent = node
+            if not frames:
+                return node
+            parent_start = frames[-1][2]
+
+
+def _varints(data):
+    # All the varints of a byte string: one per byte in the common case where each fits in a byte
+    data = bytes(data)
+    if data.isascii():
+        return list(data)
+    return [item[0] if len(item) == 1 else _leb128(item) for item in _VARINT.findall(data)]
+
+
+def _leb128(item):
+    value = 0
+    for shift, byte in enumerate(item):
+        value |= (byte & 0x7F) << (7 * shift)
+    return value
+
+
+def _column(view, offset, count):
+    column = view[offset:offset + 4 * count].cast('I')
+    if sys.byteorder == 'big':
+        column = array('I', column)
+        column.byteswap()
+    return column
+
+
+def load_ast(data):
+    """
+    Decodes a whole binary AST from a bytes-like object and returns its root.
+    """
+    return ASTFile(data).module()
+
+
+def open_ast(path):
+    """
+    Memory-maps a binary AST file and returns an ASTFile over it.
+    """
+    with open(path, 'rb') as source:
+        return ASTFile(mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+# **PARSE CACHE**
+
+class ParseCache(TokenCache):
+    """
+    Caches parsed ASTs on disk in the binary format, keyed by a hash of the source, of the pattern
+    table it is lexed with and of the format version, and bounded in size like TokenCache (least
+    recently used entries go first). Hits are memory-mapped and decoded lazily (see ASTFile), so a
+    warm build starts from the AST of an unchanged source without lexing or parsing it.
+    """
+
+    SUFFIX = f'.v{AST_FORMAT_VERSION}.ast'
+
+    def get(self, source, token_patterns):
+        """
+        Returns an ASTFile over the cached AST of the source, or None.
+        """
+        return self._lookup(self.key(source, token_patterns, ()), open_ast)
+
+    def put(self, source, token_patterns, root):
+        """
+        Stores the AST of the source, evicting old entries if the cache grows too large.
+        """
+        self._store(self.key(source, token_patterns, ()), lambda output: dump_ast(root, output))
+
+    def parse(self, source, token_patterns):
+        """
+        Returns the 'Module' node of the source, parsing and storing it only on a cache miss.
+        """
+        cached = self.get(source, token_patterns)
+        if cached is not None:
+            return cached.module()
+        from ast_parser import parse
+        from lexing_engine import compile_engine
+
+        table = compile_engine(token_patterns, skip=()).lex_table(source)
+        root = parse(table.located(), table.line_index().line_column)
+        self.put(source, token_patterns, root)
+        return root
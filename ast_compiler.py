@@ -0,0 +1,1153 @@
+import builtins
+import importlib
+import operator
+import types
+from ast import literal_eval
+
+from ast_nodes import NodeType
+from ast_scope import BUILTIN_SCOPE, COMPREHENSION_SCOPE, FUNCTION_SCOPE, LAMBDA_SCOPE, analyze_scope
+from ast_unparse import unparse
+
+
+# **CLOSURE COMPILER**
+#
+# compile_ast translates a tree once into nested Python closures, one specialized callable per node,
+# so running it never dispatches on node types again. Expressions compile to f(frame) -> value and
+# statements to f(frame) -> signal, where the signal is None when the statement completes normally,
+# BREAK or CONTINUE, or a (value,) tuple for return. Constants and builtins are bound into the
+# closures at compile time.
+# Variables live in frames: a list per activation of a scope (module, function, lambda, class body,
+# comprehension) with one slot per symbol of the scope, numbered by scope analysis (Symbol.index),
+# followed by the frame of the enclosing scope, so a variable of an enclosing function is reached by
+# following frame[-1] a fixed number of times. Module variables are reached directly, since there
+# is one module frame per compiled program.
+# Not compiled to closures: yield (generator functions), star imports, relative imports, the builtins
+# that look at the running frame or module (super, globals, locals, vars, dir, eval, exec) and the
+# module dunder names (__name__, __class__ in a method, ...), and targets Python rejects (such as
+# augmented assignment to a tuple). A module using any of them is written back as source from its
+# tree (see unparse) and compiled by Python, so it runs the tree as it is, after any transformation.
+
+_UNBOUND = object()  # value of a slot whose variable is not assigned
+BREAK = object()
+CONTINUE = object()
+_RETURN_NONE = (None,)
+_EXEC_NAMES = frozenset(('__builtins__', '__name__'))  # put in a SourceModule's namespace by exec
+# Builtins whose result depends on the frame or module they are called from
+_FRAME_BUILTINS = frozenset(('super', 'globals', 'locals', 'vars', 'dir', 'eval', 'exec', 'breakpoint'))
+# Dunder builtins that behave the same from any module; other dunder names (__name__, __doc__, the
+# __class__ cell of methods) belong to the module or class and resolve to builtins only by accident
+_PLAIN_DUNDERS = frozenset(('__import__', '__build_class__', '__debug__'))
+
+_SIGNAL_TYPES = frozenset((NodeType.RETURN, NodeType.BREAK, NodeType.CONTINUE))
+_FUNCTION_SCOPES = frozenset((FUNCTION_SCOPE, LAMBDA_SCOPE, COMPREHENSION_SCOPE))
+_DEFINITION_TYPES = frozenset((NodeType.FUNCTION_DEFINITION, NodeType.CLASS_DEFINITION, NodeType.LAMBDA))
+
+_BINARY_OPERATORS = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv,
+    '//': operator.floordiv, '%': operator.mod, '**': operator.pow, '<<': operator.lshift,
+    '>>': operator.rshift, '|': operator.or_, '^': operator.xor, '&': operator.and_, '@': operator.matmul,
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt,
+    '>=': operator.ge, 'is': operator.is_, 'is not': operator.is_not,
+    'in': lambda left, right: left in right, 'not in': lambda left, right: left not in right,
+}
+_AUGMENTED_OPERATORS = {
+    '+=': operator.iadd, '-=': operator.isub, '*=': operator.imul, '/=': operator.itruediv,
+    '//=': operator.ifloordiv, '%=': operator.imod, '**=': operator.ipow, '<<=': operator.ilshift,
+    '>>=': operator.irshift, '|=': operator.ior, '^=': operator.ixor, '&=': operator.iand,
+    '@=': operator.imatmul,
+}
+_UNARY_OPERATORS = {'-': operator.neg, '+': operator.pos, '~': operator.invert, 'not': operator.not_}
+
+# The most frequent operators get closures with the operation inlined: (both operands computed,
+# right operand constant)
+_INLINE_BINARY = {
+    '+': (lambda left, right: lambda frame: left(frame) + right(frame), lambda left, right: lambda frame: left(frame) + right),
+    '-': (lambda left, right: lambda frame: left(frame) - right(frame), lambda left, right: lambda frame: left(frame) - right),
+    '*': (lambda left, right: lambda frame: left(frame) * right(frame), lambda left, right: lambda frame: left(frame) * right),
+    '/': (lambda left, right: lambda frame: left(frame) / right(frame), lambda left, right: lambda frame: left(frame) / right),
+    '//': (lambda left, right: lambda frame: left(frame) // right(frame), lambda left, right: lambda frame: left(frame) // right),
+    '%': (lambda left, right: lambda frame: left(frame) % right(frame), lambda left, right: lambda frame: left(frame) % right),
+    '==': (lambda left, right: lambda frame: left(frame) == right(frame), lambda left, right: lambda frame: left(frame) == right),
+    '!=': (lambda left, right: lambda frame: left(frame) != right(frame), lambda left, right: lambda frame: left(frame) != right),
+    '<': (lambda left, right: lambda frame: left(frame) < right(frame), lambda left, right: lambda frame: left(frame) < right),
+    '<=': (lambda left, right: lambda frame: left(frame) <= right(frame), lambda left, right: lambda frame: left(frame) <= right),
+    '>': (lambda left, right: lambda frame: left(frame) > right(frame), lambda left, right: lambda frame: left(frame) > right),
+    '>=': (lambda left, right: lambda frame: left(frame) >= right(frame), lambda left, right: lambda frame: left(frame) >= right),
+}
+
+
+class CompiledModule:
+    """
+    A tree compiled into closures. run() executes it in a fresh module frame and returns the module
+    namespace (the module-level variables that are assigned at the end).
+    """
+
+    def __init__(self, root, table, body, frame):
+        self.root = root
+        self.table = table
+        self._body = body
+        self._frame = frame
+
+    def run(self):
+        frame = self._frame
+        symbols = self.table.module.locals
+        frame[:len(symbols)] = [_UNBOUND] * len(symbols)
+        self._body(frame)
+        return {symbol.name: frame[symbol.index] for symbol in symbols if frame[symbol.index] is not _UNBOUND}
+
+
+class SourceModule:
+    """
+    The fallback of compile_ast for trees using constructs the closures do not cover: the tree written
+    back as source and compiled by Python. run() executes it in a fresh namespace and returns the
+    module namespace, like CompiledModule.run().
+    """
+
+    def __init__(self, root, table, reason=None):
+        self.root = root
+        self.table = table
+        self.reason = reason  # what the closure compiler could not handle
+        self.source = unparse(root)
+        self._code = compile(self.source, '<ast>', 'exec')
+
+    def run(self):
+        namespace = {'__name__': '__main__'}
+        exec(self._code, namespace)
+        return {name: value for name, value in namespace.items() if name not in _EXEC_NAMES}
+
+
+def compile_ast(root, table=None):
+    """
+    Compiles the tree under a 'Module' node into a CompiledModule, using its ScopeTable if given.
+    If the tree uses a construct the closures do not cover, a SourceModule is returned instead.
+    Raises SyntaxError for trees Python rejects.
+    """
+    if table is None:
+        table = analyze_scope(root)
+    try:
+        return _ClosureCompiler(table).compile_module(root)
+    except _Unsupported as error:
+        return SourceModule(root, table, str(error))
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _unsupported(node, what=None):
+    where = f" at offset {node.start}" if node.start is not None else ''
+    return _Unsupported(f"{what or node.type} is not supported by the closure compiler{where}")
+
+
+class _ClosureCompiler:
+
+    def __init__(self, table):
+        self.table = table
+        self.scope = table.module
+        self.module_frame = [_UNBOUND] * len(table.module.locals) + [None]
+
+    def compile_module(self, root):
+        body = self._block(root.children)
+        return CompiledModule(root, self.table, body, self.module_frame)
+
+    # Statements
+
+    def _block(self, statements):
+        compiled = [self._statement(statement) for statement in statements]
+        if not compiled:
+            return _pass
+        if len(compiled) == 1:
+            return compiled[0]
+        if len(compiled) == 2:
+            first, second = compiled
+
+            def block(frame):
+                signal = first(frame)
+                if signal is not None:
+                    return signal
+                return second(frame)
+            return block
+        compiled = tuple(compiled)
+
+        def block(frame):
+            for statement in compiled:
+                signal = statement(frame)
+                if signal is not None:
+                    return signal
+        return block
+
+    def _body(self, block):
+        # A Block node, which may also hold simple statements on the header's line
+        return self._block(block.children)
+
+    def _statement(self, node):
+        method = getattr(self, f'_statement_{node.type}', None)
+        if method is None:
+            raise _unsupported(node)
+        return method(node)
+
+    def _statement_ExpressionStatement(self, node):
+        expression = self._expression(node.children[0])
+
+        def statement(frame):
+            expression(frame)
+        return statement
+
+    def _statement_Assignment(self, node):
+        return self._assignment(node.children[:-1], node.children[-1])
+
+    def _assignment(self, targets, value_node):
+        if len(targets) == 1 and targets[0].type is NodeType.TUPLE and value_node.type is NodeType.TUPLE:
+            swap = self._parallel_assignment(targets[0].children, value_node.children)
+            if swap is not None:
+                return swap
+        value = self._expression(value_node)
+        if len(targets) == 1:
+            target = targets[0]
+            slot = self._local_slot(target)
+            if slot is not None:
+                def assign(frame):
+                    frame[slot] = value(frame)
+                return assign
+            store = self._store(target)
+
+            def assign(frame):
+                store(frame, value(frame))
+            return assign
+        stores = tuple(self._store(target) for target in targets)
+
+        def assign(frame):
+            result = value(frame)
+            for store in stores:
+                store(frame, result)
+        return assign
+
+    def _parallel_assignment(self, targets, values):
+        # a, b = b, a + b between locals: the values are computed, then stored, with no tuple built
+        slots = tuple(self._local_slot(target) for target in targets)
+        if len(targets) != len(values) or None in slots or any(
+                value.type is NodeType.STARRED for value in values):
+            return None
+        values = tuple(self._expression(value) for value in values)
+        if len(slots) == 2:
+            first_slot, second_slot = slots
+            first, second = values
+
+            def assign(frame):
+                first_value = first(frame)
+                second_value = second(frame)
+                frame[first_slot] = first_value
+                frame[second_slot] = second_value
+            return assign
+
+        def assign(frame):
+            results = [value(frame) for value in values]
+            for slot, result in zip(slots, results):
+                frame[slot] = result
+        return assign
+
+    def _statement_AugmentedAssignment(self, node):
+        target, value = node.children
+        value = self._expression(value)
+        operation = _AUGMENTED_OPERATORS[node.value]
+        if target.type is NodeType.IDENTIFIER:
+            slot = self._local_slot(target)
+            if slot is not None:
+                name = target.value
+
+                def update(frame):
+                    current = frame[slot]
+                    if current is _UNBOUND:
+                        raise UnboundLocalError(f"local variable {name!r} referenced before assignment")
+                    frame[slot] = operation(current, value(frame))
+                return update
+            load = self._load(target)
+            store = self._store(target)
+
+            def update(frame):
+                store(frame, operation(load(frame), value(frame)))
+            return update
+        if target.type is NodeType.ATTRIBUTE:
+            owner = self._expression(target.children[0])
+            attribute = target.value
+
+            def update(frame):
+                instance = owner(frame)
+                setattr(instance, attribute, operation(getattr(instance, attribute), value(frame)))
+            return update
+        if target.type is NodeType.SUBSCRIPT:
+            container, key = self._expression(target.children[0]), self._index(target.children[1])
+
+            def update(frame):
+                instance = container(frame)
+                index = key(frame)
+                instance[index] = operation(instance[index], value(frame))
+            return update
+        raise _unsupported(target, f"Augmented assignment to {target.type}")
+
+    def _statement_AnnotatedAssignment(self, node):
+        if len(node.children) < 3:
+            return _pass
+        return self._assignment(node.children[:1], node.children[2])
+
+    def _statement_Return(self, node):
+        if not node.children:
+            return lambda frame: _RETURN_NONE
+        value = self._expression(node.children[0])
+        return lambda frame: (value(frame),)
+
+    def _statement_Pass(self, node):
+        return _pass
+
+    def _statement_Break(self, node):
+        return lambda frame: BREAK
+
+    def _statement_Continue(self, node):
+        return lambda frame: CONTINUE
+
+    def _statement_Global(self, node):
+        return _pass
+
+    def _statement_If(self, node):
+        test = self._expression(node.children[0])
+        body = self._body(node.children[1])
+        if len(node.children) < 3:
+            def branch(frame):
+                if test(frame):
+                    return body(frame)
+            return branch
+        orelse = node.children[2]
+        orelse = self._statement(orelse) if orelse.type is NodeType.IF else self._body(orelse)
+
+        def branch(frame):
+            if test(frame):
+                return body(frame)
+            return orelse(frame)
+        return branch
+
+    def _statement_While(self, node):
+        test = self._expression(node.children[0])
+        body = self._body(node.children[1])
+        orelse = self._body(node.children[2]) if len(node.children) > 2 else None
+        if orelse is None and not _signals(node.children[1]):
+            def loop(frame):
+                while test(frame):
+                    body(frame)
+            return loop
+
+        def loop(frame):
+            while test(frame):
+                signal = body(frame)
+                if signal is not None:
+                    if signal is BREAK:
+                        return None
+                    if signal is not CONTINUE:
+                        return signal
+            if orelse is not None:
+                return orelse(frame)
+        return loop
+
+    def _statement_For(self, node):
+        target, iterable, block = node.children[:3]
+        iterable = self._expression(iterable)
+        body = self._body(block)
+        orelse = self._body(node.children[3]) if len(node.children) > 3 else None
+        slot = self._local_slot(target)
+        store = self._store(target) if slot is None else None
+        if orelse is None and not _signals(block):
+            if slot is not None:
+                def loop(frame):
+                    for item in iterable(frame):
+                        frame[slot] = item
+                        body(frame)
+                return loop
+
+            def loop(frame):
+                for item in iterable(frame):
+                    store(frame, item)
+                    body(frame)
+            return loop
+
+        def loop(frame):
+            for item in iterable(frame):
+                if slot is not None:
+                    frame[slot] = item
+                else:
+                    store(frame, item)
+                signal = body(frame)
+                if signal is not None:
+                    if signal is BREAK:
+                        return None
+                    if signal is not CONTINUE:
+                        return signal
+            if orelse is not None:
+                return orelse(frame)
+        return loop
+
+    def _statement_Try(self, node):
+        body = self._body(node.children[0])
+        handlers = []
+        orelse = final = None
+        for clause in node.children[1:]:
+            if clause.type is NodeType.EXCEPT_HANDLER:
+                match = self._expression(clause.children[0]) if len(clause.children) > 1 else None
+                store = self._symbol_store(self.table.symbol(clause), clause.value) if clause.value else None
+                handlers.append((match, store, self._body(clause.children[-1])))
+            elif clause.type is NodeType.ELSE:
+                orelse = self._body(clause.children[0])
+            else:
+                final = self._body(clause.children[0])
+        handlers = tuple(handlers)
+
+        def attempt(frame):
+            try:
+                try:
+                    signal = body(frame)
+                except BaseException as error:
+                    for match, store, handler in handlers:
+                        if match is None or isinstance(error, match(frame)):
+                            if store is None:
+                                signal = handler(frame)
+                                break
+                            store(frame, error)
+                            try:
+                                signal = handler(frame)
+                            finally:
+                                store(frame, _UNBOUND)  # as Python does, so the traceback is released
+                            break
+                    else:
+                        raise
+                else:
+                    if orelse is not None:
+                        signal = orelse(frame)
+            finally:
+                if final is not None:
+                    final_signal = final(frame)
+                    if final_signal is not None:
+                        return final_signal
+            return signal
+        return attempt
+
+    def _statement_With(self, node):
+        statement = self._body(node.children[-1])
+        for item in reversed(node.children[:-1]):
+            statement = self._with_item(item, statement)
+        return statement
+
+    def _with_item(self, item, body):
+        context = self._expression(item.children[0])
+        store = self._store(item.children[1]) if len(item.children) > 1 else None
+
+        def statement(frame):
+            with context(frame) as value:
+                if store is not None:
+                    store(frame, value)
+                return body(frame)
+        return statement
+
+    def _statement_Raise(self, node):
+        if not node.children:
+            def statement(frame):
+                raise
+            return statement
+        exception = self._expression(node.children[0])
+        if len(node.children) == 1:
+            def statement(frame):
+                raise exception(frame)
+            return statement
+        cause = self._expression(node.children[1])
+
+        def statement(frame):
+            raise exception(frame) from cause(frame)
+        return statement
+
+    def _statement_Assert(self, node):
+        test = self._expression(node.children[0])
+        message = self._expression(node.children[1]) if len(node.children) > 1 else None
+
+        def statement(frame):
+            if not test(frame):
+                raise AssertionError(message(frame)) if message is not None else AssertionError()
+        return statement
+
+    def _statement_Delete(self, node):
+        deletes = tuple(self._delete(target) for target in _unpacked(node.children[0]))
+
+        def statement(frame):
+            for delete in deletes:
+                delete(frame)
+        return statement
+
+    def _delete(self, target):
+        if target.type is NodeType.IDENTIFIER:
+            load = self._load(target)
+            store = self._store(target)
+
+            def delete(frame):
+                load(frame)  # raises if unbound
+                store(frame, _UNBOUND)
+            return delete
+        if target.type is NodeType.ATTRIBUTE:
+            owner = self._expression(target.children[0])
+            attribute = target.value
+            return lambda frame: delattr(owner(frame), attribute)
+        if target.type is NodeType.SUBSCRIPT:
+            container, key = self._expression(target.children[0]), self._index(target.children[1])
+
+            def delete(frame):
+                del container(frame)[key(frame)]
+            return delete
+        if target.type in (NodeType.TUPLE, NodeType.LIST):
+            deletes = tuple(self._delete(element) for element in target.children)
+
+            def delete(frame):
+                for element in deletes:
+                    element(frame)
+            return delete
+        raise _unsupported(target, f"Deleting {target.type}")
+
+    def _statement_Import(self, node):
+        imports = []
+        for alias in node.children:
+            if alias.children:
+                module = alias.value
+                load = lambda module=module: importlib.import_module(module)
+                store = self._store(alias.children[0])
+            else:
+                module = alias.value
+                load = lambda module=module: __import__(module)
+                store = self._symbol_store(self.table.symbol(alias), module.split('.')[0])
+            imports.append((load, store))
+        imports = tuple(imports)
+
+        def statement(frame):
+            for load, store in imports:
+                store(frame, load())
+        return statement
+
+    def _statement_ImportFrom(self, node):
+        module = node.value
+        if module.startswith('.'):
+            raise _unsupported(node, "Relative import")
+        names = []
+        for alias in node.children:
+            if alias.value == '*':
+                raise _unsupported(node, "Star import")
+            if alias.children:
+                store = self._store(alias.children[0])
+            else:
+                store = self._symbol_store(self.table.symbol(alias), alias.value)
+            names.append((alias.value, store))
+        names = tuple(names)
+
+        def statement(frame):
+            imported = importlib.import_module(module)
+            for name, store in names:
+                try:
+                    value = getattr(imported, name)
+                except AttributeError:
+                    value = importlib.import_module(f'{module}.{name}')
+                store(frame, value)
+        return statement
+
+    def _statement_Decorated(self, node):
+        *decorators, definition = node.children
+        decorators = tuple(self._expression(decorator) for decorator in reversed(decorators))
+        if definition.type is NodeType.FUNCTION_DEFINITION:
+            return self._statement_FunctionDefinition(definition, decorators)
+        return self._statement_ClassDefinition(definition, decorators)
+
+    def _statement_FunctionDefinition(self, node, decorators=()):
+        parameters = node.children[0]
+        signature = _Signature(node.value, parameters.children)
+        defaults = tuple(self._expression(default) for default in signature.default_nodes)
+        scope = self.table.scope(node)
+        outer = self.scope
+        self.scope = scope
+        body = self._body(node.children[-1])
+        self.scope = outer
+        size = len(scope.locals)
+        store = self._symbol_store(self.table.symbol(node), node.value)
+
+        def define(frame):
+            applied = [decorator(frame) for decorator in decorators]
+            function = _make_function(signature, tuple(default(frame) for default in defaults), body, size, frame)
+            for decorator in applied:
+                function = decorator(function)
+            store(frame, function)
+        return define
+
+    def _statement_ClassDefinition(self, node, decorators=()):
+        bases_node, block = node.children
+        bases = []
+        keywords = []
+        for argument in bases_node.children:
+            if argument.type is NodeType.KEYWORD_ARGUMENT:
+                keywords.append((argument.value, self._expression(argument.children[0])))
+            else:
+                bases.append(self._expression(argument))
+        bases, keywords = tuple(bases), tuple(keywords)
+        scope = self.table.scope(node)
+        outer = self.scope
+        self.scope = scope
+        body = self._body(block)
+        self.scope = outer
+        symbols = tuple(scope.locals)
+        size = len(symbols)
+        name = node.value
+        store = self._symbol_store(self.table.symbol(node), name)
+
+        def define(frame):
+            applied = [decorator(frame) for decorator in decorators]
+            base_values = tuple(base(frame) for base in bases)
+            keyword_values = {key: value(frame) for key, value in keywords}
+            class_frame = [_UNBOUND] * size + [frame]
+            body(class_frame)
+            namespace = {symbol.name: class_frame[symbol.index] for symbol in symbols
+                         if class_frame[symbol.index] is not _UNBOUND}
+            namespace.setdefault('__qualname__', name)
+            cls = types.new_class(name, base_values, keyword_values, lambda ns: ns.update(namespace))
+            for decorator in applied:
+                cls = decorator(cls)
+            store(frame, cls)
+        return define
+
+    # Expressions
+
+    def _expression(self, node):
+        method = getattr(self, f'_expression_{node.type}', None)
+        if method is None:
+            raise _unsupported(node)
+        return method(node)
+
+    def _constant(self, node):
+        # The value of a literal node, or _UNBOUND for anything else
+        if node.type in (NodeType.NUMBER, NodeType.FLOAT, NodeType.STRING, NodeType.CONSTANT):
+            return literal_eval(node.value)
+        return _UNBOUND
+
+    def _literal(self, node):
+        value = literal_eval(node.value)
+        return lambda frame: value
+
+    _expression_Number = _literal
+    _expression_Float = _literal
+    _expression_String = _literal
+    _expression_Constant = _literal
+
+    def _expression_Identifier(self, node):
+        return self._load(node)
+
+    def _expression_BinaryOperation(self, node):
+        left, right = node.children
+        return self._binary(node.value, self._expression(left), right)
+
+    def _binary(self, operator_, left, right_node):
+        inline = _INLINE_BINARY.get(operator_)
+        constant = self._constant(right_node)
+        if inline is not None:
+            if constant is not _UNBOUND:
+                return inline[1](left, constant)
+            return inline[0](left, self._expression(right_node))
+        operation = _BINARY_OPERATORS[operator_]
+        right = self._expression(right_node)
+        return lambda frame: operation(left(frame), right(frame))
+
+    def _expression_Comparison(self, node):
+        operators = node.value
+        if len(operators) == 1:
+            return self._binary(operators[0], self._expression(node.children[0]), node.children[1])
+        operands = tuple(self._expression(operand) for operand in node.children)
+        operations = tuple(_BINARY_OPERATORS[operator_] for operator_ in operators)
+
+        def compare(frame):
+            left = operands[0](frame)
+            for operation, operand in zip(operations, operands[1:]):
+                right = operand(frame)
+                if not operation(left, right):
+                    return False
+                left = right
+            return True
+        return compare
+
+    def _expression_BooleanOperation(self, node):
+        left, right = (self._expression(child) for child in node.children)
+        if node.value == 'and':
+            return lambda frame: left(frame) and right(frame)
+        return lambda frame: left(frame) or right(frame)
+
+    def _expression_UnaryOperation(self, node):
+        operand = self._expression(node.children[0])
+        if node.value == 'not':
+            return lambda frame: not operand(frame)
+        if node.value == '-':
+            return lambda frame: -operand(frame)
+        operation = _UNARY_OPERATORS[node.value]
+        return lambda frame: operation(operand(frame))
+
+    def _expression_Conditional(self, node):
+        body, test, orelse = (self._expression(child) for child in node.children)
+        return lambda frame: body(frame) if test(frame) else orelse(frame)
+
+    def _expression_NamedExpression(self, node):
+        target, value = node.children
+        value = self._expression(value)
+        store = self._store(target)
+
+        def assign(frame):
+            result = value(frame)
+            store(frame, result)
+            return result
+        return assign
+
+    def _expression_Attribute(self, node):
+        owner = self._expression(node.children[0])
+        attribute = node.value
+        return lambda frame: getattr(owner(frame), attribute)
+
+    def _expression_Subscript(self, node):
+        container = self._expression(node.children[0])
+        key = self._index(node.children[1])
+        return lambda frame: container(frame)[key(frame)]
+
+    def _index(self, node):
+        if node.type is NodeType.SLICE:
+            parts = tuple(None if part.type is NodeType.EMPTY else self._expression(part) for part in node.children)
+            return lambda frame: slice(*[None if part is None else part(frame) for part in parts])
+        if node.type is NodeType.TUPLE and any(child.type is NodeType.SLICE for child in node.children):
+            items = tuple(self._index(child) for child in node.children)
+            return lambda frame: tuple(item(frame) for item in items)
+        return self._expression(node)
+
+    def _expression_Call(self, node):
+        function = self._expression(node.children[0])
+        arguments = node.children[1:]
+        if all(argument.type not in (NodeType.KEYWORD_ARGUMENT, NodeType.STARRED) for argument in arguments):
+            compiled = tuple(self._expression(argument) for argument in arguments)
+            if not compiled:
+                return lambda frame: function(frame)()
+            if len(compiled) == 1:
+                first, = compiled
+                return lambda frame: function(frame)(first(frame))
+            if len(compiled) == 2:
+                first, second = compiled
+                return lambda frame: function(frame)(first(frame), second(frame))
+            if len(compiled) == 3:
+                first, second, third = compiled
+                return lambda frame: function(frame)(first(frame), second(frame), third(frame))
+            return lambda frame: function(frame)(*[argument(frame) for argument in compiled])
+
+        positional = []
+        keywords = []
+        for argument in arguments:
+            if argument.type is NodeType.KEYWORD_ARGUMENT:
+                keywords.append((argument.value, self._expression(argument.children[0])))
+            elif argument.type is NodeType.STARRED and argument.value == '**':
+                keywords.append((None, self._expression(argument.children[0])))
+            elif argument.type is NodeType.STARRED:
+                positional.append((True, self._expression(argument.children[0])))
+            else:
+                positional.append((False, self._expression(argument)))
+        positional, keywords = tuple(positional), tuple(keywords)
+
+        def call(frame):
+            callee = function(frame)
+            args = []
+            for starred, argument in positional:
+                if starred:
+                    args.extend(argument(frame))
+                else:
+                    args.append(argument(frame))
+            kwargs = {}
+            for name, argument in keywords:
+                if name is None:
+                    kwargs.update(argument(frame))
+                else:
+                    kwargs[name] = argument(frame)
+            return callee(*args, **kwargs)
+        return call
+
+    def _elements(self, nodes):
+        # Compiles display elements; returns (compiled, has_starred) where starred ones are marked
+        compiled = tuple((node.type is NodeType.STARRED, self._expression(node.children[0] if node.type is NodeType.STARRED
+                                                                          else node)) for node in nodes)
+        return compiled, any(starred for starred, _ in compiled)
+
+    def _sequence(self, node, build):
+        elements, starred = self._elements(node.children)
+        if not starred:
+            items = tuple(element for _, element in elements)
+            return lambda frame: build([item(frame) for item in items])
+
+        def display(frame):
+            values = []
+            for is_starred, element in elements:
+                if is_starred:
+                    values.extend(element(frame))
+                else:
+                    values.append(element(frame))
+            return build(values)
+        return display
+
+    def _expression_Tuple(self, node):
+        return self._sequence(node, tuple)
+
+    def _expression_List(self, node):
+        return self._sequence(node, list)
+
+    def _expression_Set(self, node):
+        return self._sequence(node, set)
+
+    def _expression_Dict(self, node):
+        entries = tuple((None, self._expression(entry.children[0])) if entry.type is NodeType.DICT_UNPACK else
+                        (self._expression(entry.children[0]), self._expression(entry.children[1]))
+                        for entry in node.children)
+
+        def display(frame):
+            result = {}
+            for key, value in entries:
+                if key is None:
+                    result.update(value(frame))
+                else:
+                    result[key(frame)] = value(frame)
+            return result
+        return display
+
+    def _expression_Lambda(self, node):
+        parameters, body = node.children
+        signature = _Signature('<lambda>', parameters.children)
+        defaults = tuple(self._expression(default) for default in signature.default_nodes)
+        scope = self.table.scope(node)
+        outer = self.scope
+        self.scope = scope
+        expression = self._expression(body)
+        self.scope = outer
+        size = len(scope.locals)
+        body = lambda frame: (expression(frame),)
+        return lambda frame: _make_function(signature, tuple(default(frame) for default in defaults), body, size, frame)
+
+    def _expression_Starred(self, node):
+        raise _unsupported(node, "A starred expression here")
+
+    def _expression_Yield(self, node):
+        raise _unsupported(node, "yield")
+
+    _expression_YieldFrom = _expression_Yield
+
+    def _comprehension(self, node, build):
+        children = node.children
+        clauses = [child for child in children if child.type is NodeType.COMPREHENSION_CLAUSE]
+        elements = children[:len(children) - len(clauses)]
+        first_iterable = self._expression(clauses[0].children[1])
+        scope = self.table.scope(node)
+        outer = self.scope
+        self.scope = scope
+        loops = []
+        for index, clause in enumerate(clauses):
+            target, iterable = clause.children[:2]
+            conditions = tuple(self._expression(condition.children[0]) for condition in clause.children[2:])
+            loops.append((None if index == 0 else self._expression(iterable), self._store(target), conditions))
+        if node.type is NodeType.DICT_COMPREHENSION:
+            key, value = (self._expression(child) for child in elements[0].children)
+            element = lambda frame: (key(frame), value(frame))
+        else:
+            element = self._expression(elements[0])
+        self.scope = outer
+        size = len(scope.locals)
+        loops = tuple(loops)
+        depth = len(loops)
+
+        def generate(inner, level, items):
+            _, store, conditions = loops[level]
+            last = level + 1 == depth
+            for item in items:
+                store(inner, item)
+                if conditions and not all(condition(inner) for condition in conditions):
+                    continue
+                if last:
+                    yield element(inner)
+                else:
+                    yield from generate(inner, level + 1, loops[level + 1][0](inner))
+
+        if depth == 1 and not loops[0][2] and build is not None:
+            store = loops[0][1]
+
+            def comprehension(frame):
+                inner = [_UNBOUND] * size + [frame]
+                result = []
+                append = result.append
+                for item in first_iterable(frame):
+                    store(inner, item)
+                    append(element(inner))
+                return build(result)
+            return comprehension
+
+        def comprehension(frame):
+            values = generate([_UNBOUND] * size + [frame], 0, first_iterable(frame))
+            return values if build is None else build(values)
+        return comprehension
+
+    def _expression_ListComprehension(self, node):
+        return self._comprehension(node, list)
+
+    def _expression_SetComprehension(self, node):
+        return self._comprehension(node, set)
+
+    def _expression_DictComprehension(self, node):
+        return self._comprehension(node, dict)
+
+    def _expression_GeneratorExpression(self, node):
+        return self._comprehension(node, None)
+
+    # Variables
+
+    def _hops(self, scope):
+        # How many frame[-1] links lead from the current scope's frame to the frame of scope
+        hops = 0
+        current = self.scope
+        while current is not scope:
+            current = current.parent
+            hops += 1
+        return hops
+
+    def _local_slot(self, target):
+        # The slot of an Identifier target in the current frame, or None
+        if target.type is not NodeType.IDENTIFIER:
+            return None
+        symbol = self.table.symbol(target)
+        if symbol is None or symbol.scope is not self.scope:
+            return None
+        return symbol.index
+
+    def _load(self, node):
+        name = node.value
+        symbol = self.table.symbol(node)
+        scope = symbol.scope
+        if scope.kind == BUILTIN_SCOPE:
+            if name in _FRAME_BUILTINS or (name.startswith('__') and name not in _PLAIN_DUNDERS):
+                raise _unsupported(node, name)
+            if hasattr(builtins, name):
+                value = getattr(builtins, name)
+                return lambda frame: value
+
+            def load(frame):
+                raise NameError(f"name {name!r} is not defined")
+            return load
+        index = symbol.index
+        if scope is self.table.module and scope is not self.scope:
+            module = self.module_frame
+
+            def load(frame):
+                value = module[index]
+                if value is _UNBOUND:
+                    raise NameError(f"name {name!r} is not defined")
+                return value
+            return load
+        hops = self._hops(scope)
+        if hops == 0:
+            if symbol.parameter and all(definition.type is NodeType.PARAMETER for definition in symbol.definitions):
+                return lambda frame: frame[index]  # parameters are always bound
+            error = UnboundLocalError if scope.kind in _FUNCTION_SCOPES else NameError
+
+            def load(frame):
+                value = frame[index]
+                if value is _UNBOUND:
+                    raise error(f"local variable {name!r} referenced before assignment")
+                return value
+            return load
+
+        def load(frame):
+            for _ in range(hops):
+                frame = frame[-1]
+            value = frame[index]
+            if value is _UNBOUND:
+                raise NameError(f"free variable {name!r} referenced before assignment in enclosing scope")
+            return value
+        return load
+
+    def _store(self, target):
+        if target.type is NodeType.IDENTIFIER:
+            return self._symbol_store(self.table.symbol(target), target.value)
+        if target.type is NodeType.ATTRIBUTE:
+            owner = self._expression(target.children[0])
+            attribute = target.value
+            return lambda frame, value: setattr(owner(frame), attribute, value)
+        if target.type is NodeType.SUBSCRIPT:
+            container, key = self._expression(target.children[0]), self._index(target.children[1])
+
+            def store(frame, value):
+                container(frame)[key(frame)] = value
+            return store
+        if target.type in (NodeType.TUPLE, NodeType.LIST):
+            return self._unpacking_store(target)
+        raise _unsupported(target, f"Assignment to {target.type}")
+
+    def _unpacking_store(self, target):
+        stores = []
+        starred = None
+        for index, element in enumerate(target.children):
+            if element.type is NodeType.STARRED:
+                starred = index
+                element = element.children[0]
+            stores.append(self._store(element))
+        stores = tuple(stores)
+        count = len(stores)
+        if starred is None:
+            def store(frame, value):
+                values = tuple(value)
+                if len(values) != count:
+                    raise ValueError(f"expected {count} values to unpack, got {len(values)}")
+                for element_store, item in zip(stores, values):
+                    element_store(frame, item)
+            return store
+        after = count - starred - 1
+
+        def store(frame, value):
+            values = list(value)
+            if len(values) < count - 1:
+                raise ValueError(f"expected at least {count - 1} values to unpack, got {len(values)}")
+            middle = len(values) - after
+            values[starred:middle] = [values[starred:middle]]
+            for element_store, item in zip(stores, values):
+                element_store(frame, item)
+        return store
+
+    def _symbol_store(self, symbol, name):
+        index = symbol.index
+        scope = symbol.scope
+        if scope is self.table.module and scope is not self.scope:
+            module = self.module_frame
+
+            def store(frame, value):
+                module[index] = value
+            return store
+        hops = self._hops(scope)
+        if hops == 0:
+            def store(frame, value):
+                frame[index] = value
+            return store
+
+        def store(frame, value):
+            for _ in range(hops):
+                frame = frame[-1]
+            frame[index] = value
+        return store
+
+
+def _pass(frame):
+    return None
+
+
+def _signals(block):
+    # Whether a block may end with return, break or continue (nested definitions do not count)
+    stack = list(block.children)
+    while stack:
+        node = stack.pop()
+        if node.type in _SIGNAL_TYPES:
+            return True
+        if node.type not in _DEFINITION_TYPES:
+            stack.extend(node.children)
+    return False
+
+
+def _unpacked(target):
+    return target.children if target.type is NodeType.TUPLE else (target,)
+
+
+# **FUNCTIONS**
+
+class _Signature:
+    """
+    The parameters of a compiled function, in the order of their frame slots, with Python's rules
+    for binding call arguments to them.
+    """
+
+    def __init__(self, name, parameters):
+        self.name = name
+        self.names = []
+        self.positional = 0  # parameters that take positional arguments
+        self.positional_only = 0
+        self.variadic = None  # slot of *args
+        self.keywords = None  # slot of **kwargs
+        self.default_nodes = []
+        self.default_slots = []
+        keyword_only = False
+        for parameter in parameters:
+            value = parameter.value
+            if value == '/':
+                self.positional_only = len(self.names)
+                continue
+            if value == '*':
+                keyword_only = True
+                continue
+            if value.startswith('**'):
+                self.keywords = len(self.names)
+                self.names.append(value[2:])
+                continue
+            if value.startswith('*'):
+                self.variadic = len(self.names)
+                self.names.append(value[1:])
+                keyword_only = True
+                continue
+            if not keyword_only:
+                self.positional += 1
+            defaults = [child for child in parameter.children if child.type is not NodeType.ANNOTATION]
+            if defaults:
+                self.default_slots.append(len(self.names))
+                self.default_nodes.append(defaults[0])
+            self.names.append(value)
+        self.count = len(self.names)
+        self.simple = self.variadic is None and self.keywords is None and self.positional == self.count
+        self.slots = {name: index for index, name in enumerate(self.names) if index >= self.positional_only}
+
+    def bind(self, args, kwargs, defaults):
+        """
+        Returns the values of the parameter slots for a call, or raises TypeError as Python does.
+        """
+        name = self.name
+        values = [_UNBOUND] * self.count
+        positional = self.positional
+        if len(args) > positional and self.variadic is None:
+            raise TypeError(f"{name}() takes {positional} positional arguments but {len(args)} were given")
+        values[:min(len(args), positional)] = args[:positional]
+        if self.variadic is not None:
+            values[self.variadic] = tuple(args[positional:])
+        extra = {} if self.keywords is not None else None
+        for keyword, value in kwargs.items():
+            slot = self.slots.get(keyword)
+            if slot is None or slot == self.variadic or slot == self.keywords:
+                if extra is None:
+                    raise TypeError(f"{name}() got an unexpected keyword argument {keyword!r}")
+                extra[keyword] = value
+                continue
+            if values[slot] is not _UNBOUND:
+                raise TypeError(f"{name}() got multiple values for argument {keyword!r}")
+            values[slot] = value
+        if extra is not None:
+            values[self.keywords] = extra
+        for slot, default in zip(self.default_slots, defaults):
+            if values[slot] is _UNBOUND:
+                values[slot] = default
+        missing = [self.names[slot] for slot in range(self.count) if values[slot] is _UNBOUND]
+        if missing:
+            raise TypeError(f"{name}() missing required arguments: {', '.join(map(repr, missing))}")
+        return values
+
+
+def _make_function(signature, defaults, body, size, outer):
+    # A Python function running body in a new frame whose enclosing frame is outer
+    count = signature.count
+    tail = [_UNBOUND] * (size - count) + [outer]
+    bind = signature.bind
+    if signature.simple:
+        def function(*args, **kwargs):
+            if kwargs or len(args) != count:
+                args = bind(args, kwargs, defaults)
+            signal = body([*args, *tail])
+            return signal[0] if signal is not None else None
+    else:
+        def function(*args, **kwargs):
+            signal = body([*bind(args, kwargs, defaults), *tail])
+            return signal[0] if signal is not None else None
+    function.__name__ = function.__qualname__ = signature.name
+    return function
@@ -0,0 +1,171 @@
+import gc
+import sys
+
+from ast_nodes import NO_CHILDREN, NO_METADATA, NODE_TYPES, NodeType
+from ast_walk import POST_ORDER, format_ast, walk
+
+
+# **HASH-CONSED AST NODES**
+#
+# A NodeFactory hands out at most one SharedNode per structure (type, value and children), so equal
+# subtrees become one object however often they occur: repetitive code takes the memory of its
+# distinct subtrees only, two subtrees of one factory are equal exactly when they are the same object,
+# and a repeated subtree (a common subexpression) is a node reached from more than one place.
+# Sharing a subtree means it has no single parent or source position, so shared nodes have neither,
+# carry no metadata and cannot be changed. Analyses that need occurrences (spans, parents, scopes)
+# run on the ordinary tree.
+
+
+class SharedNode:
+    """
+    An immutable, ASTNode-compatible node made by a NodeFactory. Its structural hash and subtree
+    size are computed once at creation, from those of its children.
+    """
+
+    __slots__ = ('type', 'value', 'children', 'size', '_hash')
+
+    parent = None
+    start = None
+    end = None
+    metadata = NO_METADATA
+
+    def __init__(self, type_, value, children):
+        setattr_ = object.__setattr__
+        setattr_(self, 'type', type_)
+        setattr_(self, 'value', value)
+        setattr_(self, 'children', children)
+        setattr_(self, 'size', 1 + sum(child.size for child in children))
+        setattr_(self, '_hash', hash((type_, value, tuple(child._hash for child in children))))
+
+    def __setattr__(self, name, value):
+        raise TypeError("Shared nodes are immutable")
+
+    def add_child(self, child):
+        raise TypeError("Shared nodes are immutable; build a new node with NodeFactory.node()")
+
+    def set_metadata(self, key, value):
+        raise TypeError("Shared nodes carry no metadata")
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        # Nodes of one factory are equal only if identical; nodes of different factories are compared
+        # structurally, once their hashes agree
+        if self is other:
+            return True
+        if other.__class__ is not SharedNode or other._hash != self._hash:
+            return False
+        stack = [(self, other)]
+        while stack:
+            left, right = stack.pop()
+            if left is right:
+                continue
+            if (left._hash != right._hash or left.type != right.type or left.value != right.value
+                    or len(left.children) != len(right.children)):
+                return False
+            stack.extend(zip(left.children, right.children))
+        return True
+
+    def __repr__(self, depth=0):
+        return format_ast(self, depth)
+
+
+class NodeFactory:
+    """
+    Makes hash-consed nodes: node() returns the existing SharedNode of that structure if there is
+    one, and intern() converts a whole tree. The factory keeps every node it made alive until clear().
+    """
+
+    def __init__(self):
+        self._nodes = {}  # (type, value, ids of the children) -> SharedNode
+        self.requests = 0  # nodes asked for, reused or not
+
+    def __len__(self):
+        """
+        The number of distinct nodes made.
+        """
+        return len(self._nodes)
+
+    def node(self, type_, value=None, children=None):
+        """
+        Returns the shared node with this type, value and children, creating it the first time.
+        Children that are not shared nodes of this factory are interned first.
+        """
+        if type_.__class__ is not NodeType:
+            type_ = NODE_TYPES.get(type_) or sys.intern(type_)
+        if children:
+            children = tuple(child if child.__class__ is SharedNode and self._owns(child) else self.intern(child)
+                             for child in children)
+        else:
+            children = NO_CHILDREN
+        return self._get(type_, value, children)
+
+    def intern(self, root):
+        """
+        Returns the shared version of the tree under root (ASTNodes, arena views or shared nodes).
+        """
+        if root.__class__ is SharedNode and self._owns(root):
+            return root
+        # As in Parser.parse_module: the nodes made here stay alive in the factory
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            built = []  # shared children of the nodes whose subtrees are not finished, in post-order
+            for node in walk(root, POST_ORDER):
+                count = len(node.children)
+                if count:
+                    children = tuple(built[-count:])
+                    del built[-count:]
+                else:
+                    children = NO_CHILDREN
+                type_ = node.type
+                if type_.__class__ is not NodeType:
+                    type_ = NODE_TYPES.get(type_) or sys.intern(type_)
+                built.append(self._get(type_, node.value, children))
+            return built[0]
+        finally:
+            if collecting:
+                gc.enable()
+
+    def _get(self, type_, value, children):
+        self.requests += 1
+        key = (type_, value, tuple(map(id, children)))
+        node = self._nodes.get(key)
+        if node is None:
+            node = self._nodes[key] = SharedNode(type_, value, children)
+        return node
+
+    def _owns(self, node):
+        return self._nodes.get((node.type, node.value, tuple(map(id, node.children)))) is node
+
+    def clear(self):
+        """
+        Forgets every node made so far; nodes still in use stay valid but are no longer shared.
+        """
+        self._nodes.clear()
+        self.requests = 0
+
+
+def common_subtrees(root, min_size=2):
+    """
+    Returns [(node, count)] for the subtrees of a shared tree that occur in more than one place and
+    have at least min_size nodes, largest first. A subtree that only repeats as part of a larger
+    repeated one is counted once per occurrence of the larger one's shared node, not per copy.
+    """
+    counts = {}
+    nodes = {}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        key = id(node)
+        if key in counts:
+            counts[key] += 1
+            continue
+        counts[key] = 1
+        nodes[key] = node
+        stack.extend(node.children)
+    repeated = [(nodes[key], count) for key, count in counts.items()
+                if count > 1 and nodes[key].size >= min_size]
+    repeated.sort(key=lambda item: item[0].size, reverse=True)
+    return repeated
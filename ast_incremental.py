@@ -0,0 +1,246 @@
+from bisect import bisect_left, bisect_right
+
+from ast_nodes import NodeType
+from ast_parser import Parser
+from ast_walk import walk
+from lexing_engine import compile_engine
+from token_table import TokenTable
+
+
+# Nodes an edit may be followed through on its way down to the innermost enclosing block
+_CONTAINERS = frozenset((
+    NodeType.FUNCTION_DEFINITION, NodeType.CLASS_DEFINITION, NodeType.DECORATED, NodeType.IF, NodeType.WHILE,
+    NodeType.FOR, NodeType.TRY, NodeType.EXCEPT_HANDLER, NodeType.ELSE, NodeType.FINALLY, NodeType.WITH,
+))
+
+
+# **INCREMENTAL REPARSING WITH SUBTREE REUSE**
+
+class IncrementalParser:
+    """
+    Keeps the AST of a source up to date under text edits. Every node records the source span it
+    covers (node.start, node.end; the tokens it covers are table.index_at(start) onwards), and an
+    edit only reparses the statements whose spans it touches, in the innermost indented block that
+    contains it: those lines are lexed and parsed on their own and spliced into the block, and every
+    other subtree is kept as it is, by reference.
+    If the reparsed lines do not parse on their own (the edit changed the indentation, opened a
+    bracket, ...), the region grows one statement on each side at a time, then moves out to the
+    enclosing block, and at worst the whole source is parsed again, which also reports real syntax
+    errors. A failed update leaves no tree; the next update parses from scratch.
+    Statements after the edit move by the length difference. Within the top-level statement that
+    holds the edit they are shifted right away; later top-level statements get a pending shift that
+    is folded into their nodes when the tree is read, so an edit costs time in proportion to the
+    statement it touches, not to the file.
+    """
+
+    def __init__(self, source, token_patterns):
+        self.source = source
+        self.engine = compile_engine(token_patterns, skip=())
+        self.node_count = 0
+        self.reparsed_nodes = 0  # nodes built by the last parse or update
+        self._module = None
+        self._starts = []  # current span of each top-level statement
+        self._ends = []
+        self._deltas = []  # shift not yet applied to the nodes of each top-level statement
+        self.parse()
+
+    @property
+    def tree(self):
+        """
+        The 'Module' node, with every pending shift applied.
+        """
+        if self._module is not None:
+            for index, delta in enumerate(self._deltas):
+                if delta:
+                    self._fold(index)
+        return self._module
+
+    def parse(self):
+        """
+        Parses the whole source from scratch.
+        """
+        self._module = None
+        table = self.engine.lex_table(self.source)
+        parser = Parser(table.located(), table.line_index().line_column)
+        module = parser.parse_module()
+        self._module = module
+        self._starts = [statement.start for statement in module.children]
+        self._ends = [statement.end for statement in module.children]
+        self._deltas = [0] * len(module.children)
+        self.node_count = self.reparsed_nodes = parser.node_count
+        return module
+
+    def update(self, edit_offset, removed_len, inserted_text):
+        """
+        Replaces removed_len characters at edit_offset by inserted_text and updates the tree, which
+        is then read from tree. Raises SyntaxError if the edited source does not parse.
+        """
+        old = self.source
+        edit_end = edit_offset + removed_len
+        self.source = old[:edit_offset] + inserted_text + old[edit_end:]
+        if self._module is None or not self._reparse(old, edit_offset, edit_end, len(inserted_text) - removed_len):
+            self.parse()
+
+    # Reparsing
+
+    def _reparse(self, old, edit_start, edit_end, delta):
+        statements = self._module.children
+        lo = bisect_left(self._ends, edit_start)
+        hi = bisect_right(self._starts, edit_end) - 1
+        if lo == hi:
+            self._fold(lo)
+            path = _block_path(statements[lo], edit_start, edit_end)
+            for depth in range(len(path) - 1, 0, -1):
+                if path[depth].type is NodeType.BLOCK and self._reparse_block(old, path[:depth + 1], edit_start,
+                                                                               edit_end, delta):
+                    top = statements[lo]
+                    self._starts[lo] = top.start
+                    self._ends[lo] = top.end
+                    self._shift_top_level(lo + 1, delta)
+                    self._update_module_span()
+                    return True
+        return self._reparse_module(old, lo, hi, edit_start, edit_end, delta)
+
+    def _reparse_block(self, old, path, edit_start, edit_end, delta):
+        block = path[-1]
+        children = block.children
+        first = children[0]
+        line_start = old.rfind('\n', 0, first.start) + 1
+        margin = old[line_start:first.start]
+        if line_start <= path[-2].start or (margin and not margin.isspace()):
+            return False  # the block shares its header's line
+        indent = len(margin.expandtabs(8))
+
+        starts = [statement.start for statement in children]
+        ends = [statement.end for statement in children]
+        lo = bisect_left(ends, edit_start)
+        hi = bisect_right(starts, edit_end) - 1
+        for lo, hi, region_start, region_end in _regions(old, starts, ends, lo, hi, edit_start, edit_end):
+            parsed = self._parse_region(region_start, region_end + delta, indent)
+            if parsed is None or (not parsed and lo == 0 and hi == len(children) - 1):
+                continue
+            self._splice(block, lo, hi, parsed, delta)
+            for statement in block.children[lo + len(parsed):]:
+                _shift(statement, delta)
+            block.start = block.children[0].start
+            block.end = block.children[-1].end
+
+            # Enclosing nodes up to the top-level statement end later, and so do their later children
+            child = block
+            for ancestor in reversed(path[:-1]):
+                siblings = ancestor.children
+                index = next(index for index, sibling in enumerate(siblings) if sibling is child)
+                for sibling in siblings[index + 1:]:
+                    _shift(sibling, delta)
+                ancestor.end = siblings[-1].end
+                child = ancestor
+            return True
+        return False
+
+    def _reparse_module(self, old, lo, hi, edit_start, edit_end, delta):
+        module = self._module
+        starts, ends = self._starts, self._ends
+        for lo, hi, region_start, region_end in _regions(old, starts, ends, lo, hi, edit_start, edit_end):
+            parsed = self._parse_region(region_start, region_end + delta, 0)
+            if parsed is None:
+                continue
+            self._splice(module, lo, hi, parsed, delta)
+            tail = slice(hi + 1, len(starts))
+            self._starts = starts[:lo] + [statement.start for statement in parsed] + [start + delta for start in starts[tail]]
+            self._ends = ends[:lo] + [statement.end for statement in parsed] + [end + delta for end in ends[tail]]
+            self._deltas = self._deltas[:lo] + [0] * len(parsed) + [shift + delta for shift in self._deltas[tail]]
+            self._update_module_span()
+            return True
+        return False
+
+    def _parse_region(self, start, end, indent):
+        # Lexes and parses the new source between start and end on its own; None if that fails or if
+        # a token other than whitespace runs past end, in which case the region is not self-contained
+        source = self.source
+        kinds, token_starts, token_ends, reached = self.engine.lex_range(source, start, end)
+        if reached != end and not source[end:reached].isspace():
+            return None
+        tokens = TokenTable(source, self.engine.type_names, kinds, token_starts, token_ends).located()
+        try:
+            parser = Parser(tokens, None, indent)
+            module = parser.parse_module()
+        except SyntaxError:
+            return None
+        self.reparsed_nodes = parser.node_count - 1
+        return module.children
+
+    def _splice(self, owner, lo, hi, parsed, delta):
+        removed = owner.children[lo:hi + 1]
+        self.node_count += self.reparsed_nodes - sum(1 for statement in removed for _ in walk(statement))
+        for statement in parsed:
+            statement.parent = owner
+        owner.children = owner.children[:lo] + tuple(parsed) + owner.children[hi + 1:]
+
+    def _shift_top_level(self, first, delta):
+        starts, ends, deltas = self._starts, self._ends, self._deltas
+        for index in range(first, len(starts)):
+            starts[index] += delta
+            ends[index] += delta
+            deltas[index] += delta
+
+    def _fold(self, index):
+        delta = self._deltas[index]
+        if delta:
+            _shift(self._module.children[index], delta)
+            self._deltas[index] = 0
+
+    def _update_module_span(self):
+        module = self._module
+        module.start = self._starts[0] if self._starts else None
+        module.end = self._ends[-1] if self._ends else None
+
+
+def _block_path(statement, edit_start, edit_end):
+    # The statement and the nodes under it down to the innermost block that contains the edit
+    path = [statement]
+    node = statement
+    while True:
+        for child in node.children:
+            if child.start <= edit_start and edit_end <= child.end and (
+                    child.type is NodeType.BLOCK or child.type in _CONTAINERS):
+                path.append(child)
+                node = child
+                break
+        else:
+            return path
+
+
+def _regions(source, starts, ends, lo, hi, edit_start, edit_end):
+    """
+    Yields growing (lo, hi, region_start, region_end) candidates for reparsing statements lo..hi
+    (an empty range when the edit touches none) of a statement list: whole lines covering the edit
+    and those statements, grown until no statement straddles their edges, then by 1, 2, 4, ...
+    more statements on each side, so that a hopeless edit costs a few parses of the list at most.
+    """
+    count = len(starts)
+    grow = 0
+    while True:
+        lo, hi = max(lo - grow, 0), min(hi + grow, count - 1)
+        region_start = min(edit_start, starts[lo]) if lo <= hi else edit_start
+        region_end = max(edit_end, ends[hi]) if lo <= hi else edit_end
+        region_start = source.rfind('\n', 0, region_start) + 1
+        newline = source.find('\n', region_end)
+        region_end = len(source) if newline < 0 else newline + 1
+        while lo > 0 and ends[lo - 1] > region_start:
+            lo -= 1
+            region_start = source.rfind('\n', 0, min(region_start, starts[lo])) + 1
+        while hi + 1 < count and starts[hi + 1] < region_end:
+            hi += 1
+            newline = source.find('\n', max(region_end, ends[hi]))
+            region_end = len(source) if newline < 0 else newline + 1
+        yield lo, hi, region_start, region_end
+        if lo == 0 and hi == count - 1:
+            return
+        grow = grow * 2 or 1
+
+
+def _shift(root, delta):
+    for node in walk(root):
+        if node.start is not None:
+            node.start += delta
+            node.end += delta
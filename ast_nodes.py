@@ -0,0 +1,137 @@
+import sys
+from enum import Enum
+from types import MappingProxyType
+
+from ast_walk import format_ast
+
+
+# **NODE TYPES**
+
+class NodeType(str, Enum):
+    """
+    The kinds of AST nodes. Members are interned singletons that still compare equal to their names
+    as plain strings, so node.type == 'Identifier' keeps working.
+    """
+
+    MODULE = 'Module'
+    BLOCK = 'Block'
+    FUNCTION_DEFINITION = 'FunctionDefinition'
+    PARAMETERS = 'Parameters'
+    PARAMETER = 'Parameter'
+    ANNOTATION = 'Annotation'
+    RETURNS = 'Returns'
+    CLASS_DEFINITION = 'ClassDefinition'
+    BASES = 'Bases'
+    DECORATED = 'Decorated'
+    IF = 'If'
+    WHILE = 'While'
+    FOR = 'For'
+    TRY = 'Try'
+    EXCEPT_HANDLER = 'ExceptHandler'
+    ELSE = 'Else'
+    FINALLY = 'Finally'
+    WITH = 'With'
+    WITH_ITEM = 'WithItem'
+    RETURN = 'Return'
+    RAISE = 'Raise'
+    PASS = 'Pass'
+    BREAK = 'Break'
+    CONTINUE = 'Continue'
+    GLOBAL = 'Global'
+    DELETE = 'Delete'
+    ASSERT = 'Assert'
+    IMPORT = 'Import'
+    IMPORT_FROM = 'ImportFrom'
+    ALIAS = 'Alias'
+    ASSIGNMENT = 'Assignment'
+    AUGMENTED_ASSIGNMENT = 'AugmentedAssignment'
+    ANNOTATED_ASSIGNMENT = 'AnnotatedAssignment'
+    EXPRESSION_STATEMENT = 'ExpressionStatement'
+    TUPLE = 'Tuple'
+    LIST = 'List'
+    DICT = 'Dict'
+    SET = 'Set'
+    KEY_VALUE = 'KeyValue'
+    DICT_UNPACK = 'DictUnpack'
+    LIST_COMPREHENSION = 'ListComprehension'
+    SET_COMPREHENSION = 'SetComprehension'
+    DICT_COMPREHENSION = 'DictComprehension'
+    GENERATOR_EXPRESSION = 'GeneratorExpression'
+    COMPREHENSION_CLAUSE = 'ComprehensionClause'
+    CONDITION = 'Condition'
+    LAMBDA = 'Lambda'
+    NAMED_EXPRESSION = 'NamedExpression'
+    CONDITIONAL = 'Conditional'
+    BOOLEAN_OPERATION = 'BooleanOperation'
+    COMPARISON = 'Comparison'
+    BINARY_OPERATION = 'BinaryOperation'
+    UNARY_OPERATION = 'UnaryOperation'
+    STARRED = 'Starred'
+    YIELD = 'Yield'
+    YIELD_FROM = 'YieldFrom'
+    CALL = 'Call'
+    KEYWORD_ARGUMENT = 'KeywordArgument'
+    SUBSCRIPT = 'Subscript'
+    SLICE = 'Slice'
+    EMPTY = 'Empty'
+    ATTRIBUTE = 'Attribute'
+    IDENTIFIER = 'Identifier'
+    NUMBER = 'Number'
+    FLOAT = 'Float'
+    STRING = 'String'
+    CONSTANT = 'Constant'
+    OPERATOR = 'Operator'
+
+    __str__ = str.__str__
+    __format__ = str.__format__
+    __hash__ = str.__hash__  # so members and plain names find each other in dicts and sets
+
+
+# Lookup by name, for nodes created from plain strings
+NODE_TYPES = {node_type.value: node_type for node_type in NodeType}
+
+NO_CHILDREN = ()
+NO_METADATA = MappingProxyType({})
+
+
+# **COMPACT AST NODES**
+
+class ASTNode:
+    """
+    This is the base class for an AST node. Each node represents a syntactical construct in the code.
+    Nodes are slotted: no instance dict, children in a tuple (one shared empty tuple for leaves),
+    the type as a NodeType member, and a metadata dict only once set_metadata is first called.
+    start and end are the source offsets the node spans, when the parser was given positioned tokens.
+    """
+
+    __slots__ = ('type', 'value', 'children', 'parent', 'start', 'end', '_metadata')
+
+    def __init__(self, type_, value=None, children=None, metadata=None, start=None, end=None):
+        if type_.__class__ is not NodeType:
+            type_ = NODE_TYPES.get(type_) or sys.intern(type_)
+        self.type = type_
+        self.value = value
+        self.children = tuple(children) if children else NO_CHILDREN
+        self.parent = None
+        self.start = start
+        self.end = end
+        self._metadata = dict(metadata) if metadata else None
+
+    @property
+    def metadata(self):
+        """
+        The node's metadata; a shared read-only empty mapping until set_metadata is first called.
+        """
+        return self._metadata if self._metadata is not None else NO_METADATA
+
+    def add_child(self, child):
+        self.children = self.children + (child,)
+        child.parent = self
+
+    def set_metadata(self, key, value):
+        if self._metadata is None:
+            self._metadata = {}
+        self._metadata[key] = value
+
+    def __repr__(self, depth=0):
+        return format_ast(self, depth)
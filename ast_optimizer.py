@@ -0,0 +1,599 @@
+import math
+import operator
+import time
+from ast import literal_eval
+
+from ast_nodes import ASTNode, NodeType
+from ast_scope import COMPREHENSION_SCOPE, FUNCTION_SCOPE, LAMBDA_SCOPE, analyze_scope
+from ast_walk import walk
+
+
+# **AST OPTIMIZATION PASSES**
+#
+# A PassManager runs an ordered list of rewriting passes over a tree until none of them changes it.
+# A pass rewrites one node at a time, after its children: rewrite_<Type>(node) returns None to leave
+# the node alone, a new node to replace it, or the node itself after changing its children in place
+# (statement lists). The first round visits the whole tree; every later round only descends into the
+# nodes on a path from the root to something that changed in the round before, since a rewrite only
+# looks at a node and its children, so nothing else can have become rewritable.
+# Rewrites keep the behavior of any Python values: identities are only applied to operands known to
+# be ints, literals are folded only when the result is a literal again and stays small, and code is
+# only deleted when that leaves every name resolving to the same variable and every generator
+# function with a yield (see Bindings).
+
+_LITERAL_TYPES = frozenset((NodeType.NUMBER, NodeType.FLOAT, NodeType.STRING, NodeType.CONSTANT))
+_TERMINATORS = frozenset((NodeType.RETURN, NodeType.RAISE, NodeType.BREAK, NodeType.CONTINUE))
+_NOT_LITERAL = object()
+_CONSTANTS = {'True': True, 'False': False, 'None': None, '...': Ellipsis}
+_MAX_FOLDED_SIZE = 4096  # characters of a folded string, bits of a folded integer
+_FUNCTION_SCOPES = frozenset((FUNCTION_SCOPE, LAMBDA_SCOPE, COMPREHENSION_SCOPE))
+_YIELDS = frozenset((NodeType.YIELD, NodeType.YIELD_FROM))
+_FUNCTION_NODES = frozenset((NodeType.FUNCTION_DEFINITION, NodeType.LAMBDA))
+# Operators that give an int (or raise) on two ints
+_INTEGER_OPERATORS = frozenset(('+', '-', '*', '//', '%', '<<', '>>', '&', '|', '^'))
+
+_BINARY_OPERATORS = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv,
+    '//': operator.floordiv, '%': operator.mod, '**': operator.pow, '<<': operator.lshift,
+    '>>': operator.rshift, '|': operator.or_, '^': operator.xor, '&': operator.and_,
+}
+_COMPARISON_OPERATORS = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt,
+    '>=': operator.ge, 'in': lambda left, right: left in right, 'not in': lambda left, right: left not in right,
+}
+_UNARY_OPERATORS = {'-': operator.neg, '+': operator.pos, '~': operator.invert, 'not': operator.not_}
+
+
+def literal_value(node):
+    """
+    The value of a literal node (number, string, True, False, None, ...), or _NOT_LITERAL.
+    """
+    type_ = node.type
+    if type_ not in _LITERAL_TYPES:
+        return _NOT_LITERAL
+    text = node.value
+    if type_ is NodeType.CONSTANT:
+        return _CONSTANTS.get(text, _NOT_LITERAL)
+    if type_ is NodeType.NUMBER and text.isdigit() and (text[0] != '0' or text.strip('0') == ''):
+        return int(text)
+    try:
+        return literal_eval(text)
+    except (ValueError, SyntaxError):
+        return _NOT_LITERAL
+
+
+def make_literal(value, like):
+    """
+    A literal node for value spanning the source of the node like, or None if value has no literal
+    form (a float that is not finite, a container) or is too large to be worth writing out.
+    """
+    kind = value.__class__
+    if value is None or kind is bool:
+        type_, text = NodeType.CONSTANT, str(value)
+    elif kind is int:
+        if value.bit_length() > _MAX_FOLDED_SIZE:
+            return None
+        type_, text = NodeType.NUMBER, str(value)
+    elif kind is float:
+        if not math.isfinite(value):
+            return None
+        type_, text = NodeType.FLOAT, repr(value)
+    elif kind is str:
+        if len(value) > _MAX_FOLDED_SIZE:
+            return None
+        type_, text = NodeType.STRING, repr(value)
+    elif value is Ellipsis:
+        type_, text = NodeType.CONSTANT, '...'
+    else:
+        return None
+    return ASTNode(type_, text, start=like.start, end=like.end)
+
+
+def _too_large(symbol, left, right):
+    # Whether computing left <symbol> right could build a huge value before it can be checked
+    if symbol == '**':
+        return (left.__class__ is int and right.__class__ is int and right > 0
+                and max(left.bit_length(), 1) * right > _MAX_FOLDED_SIZE)
+    if symbol == '<<':
+        return right.__class__ is int and right > _MAX_FOLDED_SIZE
+    if symbol == '*':
+        if left.__class__ is str and right.__class__ is int:
+            return len(left) * right > _MAX_FOLDED_SIZE
+        if right.__class__ is str and left.__class__ is int:
+            return len(right) * left > _MAX_FOLDED_SIZE
+    return False
+
+
+def _size(node):
+    return sum(1 for _ in walk(node))
+
+
+def _is_int(value, number):
+    return value.__class__ is int and value == number
+
+
+def _is_integer(node):
+    # Whether node evaluates to an int (not a bool) or raises: int literals and integer
+    # operations on them
+    type_ = node.type
+    if type_ is NodeType.NUMBER:
+        return literal_value(node).__class__ is int
+    if type_ is NodeType.BINARY_OPERATION:
+        return node.value in _INTEGER_OPERATORS and _is_integer(node.children[0]) and _is_integer(node.children[1])
+    if type_ is NodeType.UNARY_OPERATION:
+        return node.value != 'not' and _is_integer(node.children[0])
+    return False
+
+
+def _own_yield(node, subtree):
+    # Whether a yield under subtree makes the function around subtree a generator, rather than a
+    # function defined inside subtree
+    while node is not subtree:
+        node = node.parent
+        if node.type in _FUNCTION_NODES:
+            return False
+    return True
+
+
+class Bindings:
+    """
+    The name bindings of a tree, from its ScopeTable (analyzed when first needed), to tell whether
+    code can be deleted without changing how names resolve. In a function, deleting the last binding
+    of a name that is read makes the name refer to a global instead of raising UnboundLocalError, and
+    deleting a global declaration does the opposite; module and class bodies look names up at run
+    time, so their bindings can go. A yield is never deleted either, even where it cannot run: it
+    is what makes its function a generator.
+    """
+
+    def __init__(self, root, table=None):
+        self.root = root
+        self.table = table
+        self._symbols = None  # definition node -> Symbol, for the symbols that matter
+        self._remaining = None  # Symbol -> number of its definitions not deleted yet
+
+    def _load(self):
+        if self.table is None:
+            self.table = analyze_scope(self.root)
+        self._symbols = {}
+        self._remaining = {}
+        for scope in self.table.scopes:
+            if scope.kind not in _FUNCTION_SCOPES:
+                continue
+            for symbol in scope.locals:
+                if symbol.uses:
+                    self._remaining[symbol] = len(symbol.definitions)
+                    for definition in symbol.definitions:
+                        self._symbols[definition] = symbol
+
+    def can_delete(self, subtrees):
+        """
+        Whether the subtrees can be deleted from the tree; if so, they are counted as deleted.
+        """
+        if self._symbols is None:
+            self._load()
+        symbols = self._symbols
+        inside = set()
+        deleted = {}  # Symbol -> its definitions among the subtrees
+        for subtree in subtrees:
+            for node in walk(subtree):
+                if node.type is NodeType.GLOBAL or (node.type in _YIELDS and _own_yield(node, subtree)):
+                    return False
+                inside.add(node)
+                symbol = symbols.get(node)
+                if symbol is not None:
+                    deleted[symbol] = deleted.get(symbol, 0) + 1
+        remaining = self._remaining
+        for symbol, count in deleted.items():
+            # Bindings of a scope deleted as a whole do not matter
+            if remaining[symbol] <= count and symbol.scope.node not in inside:
+                return False
+        for symbol, count in deleted.items():
+            remaining[symbol] -= count
+        return True
+
+
+# **PASSES**
+
+class OptimizationPass:
+    """
+    Base class for passes: rewrite(node) calls rewrite_<Type>(node) for the node's type, if the pass
+    has one. The method lookups are resolved once per pass class and node type, and then cached.
+    A pass counts its rewrites and the nodes they removed from the tree. A pass that deletes code
+    asks can_delete first, which the PassManager answers from the Bindings of the tree.
+    """
+
+    name = 'pass'
+    bindings = None
+    _rewrite_handlers = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._rewrite_handlers = {}
+
+    def __init__(self):
+        self.rewrites = 0
+        self.nodes_removed = 0
+
+    def rewrite(self, node):
+        """
+        Returns None, a replacement for node, or node itself if its children were changed.
+        """
+        handlers = self._rewrite_handlers
+        type_ = node.type
+        try:
+            handler = handlers[type_]
+        except KeyError:
+            handler = handlers[type_] = getattr(self.__class__, f'rewrite_{type_}', None)
+        if handler is None:
+            return None
+        result = handler(self, node)
+        if result is not None:
+            self.rewrites += 1
+        return result
+
+    def can_delete(self, *subtrees):
+        """
+        Whether deleting the subtrees keeps every name resolving to the same variable.
+        """
+        if self.bindings is None:
+            raise RuntimeError(f"{self.name} deletes code and needs the Bindings of the tree from a PassManager")
+        return self.bindings.can_delete(subtrees)
+
+    def replace(self, node, replacement):
+        """
+        Returns replacement after counting the nodes it saves over node.
+        """
+        self.nodes_removed += _size(node) - _size(replacement)
+        return replacement
+
+
+class ConstantFolding(OptimizationPass):
+    """
+    Computes operations on literals at compile time: 2 * 3 + 1 becomes 7, 'a' + 'b' becomes 'ab',
+    not True becomes False and 1 < 2 < 3 becomes True. Operations that raise (1 / 0) are left to
+    fail at run time. A literal left operand of and / or decides which operand is the result.
+    """
+
+    name = 'constant-folding'
+
+    def rewrite_BinaryOperation(self, node):
+        symbol = node.value
+        function = _BINARY_OPERATORS.get(symbol)
+        if function is None:
+            return None
+        left = literal_value(node.children[0])
+        right = literal_value(node.children[1])
+        if left is _NOT_LITERAL or right is _NOT_LITERAL or _too_large(symbol, left, right):
+            return None
+        return self._fold(node, function, left, right)
+
+    def rewrite_UnaryOperation(self, node):
+        operand = literal_value(node.children[0])
+        if operand is _NOT_LITERAL:
+            return None
+        return self._fold(node, _UNARY_OPERATORS[node.value], operand)
+
+    def rewrite_Comparison(self, node):
+        functions = [_COMPARISON_OPERATORS.get(symbol) for symbol in node.value]
+        if None in functions:  # identity tests depend on how values are cached
+            return None
+        operands = [literal_value(child) for child in node.children]
+        if _NOT_LITERAL in operands:
+            return None
+        try:
+            result = all(function(left, right) for function, left, right in zip(functions, operands, operands[1:]))
+        except Exception:
+            return None
+        return self.replace(node, make_literal(result, node))
+
+    def rewrite_BooleanOperation(self, node):
+        left, right = node.children
+        value = literal_value(left)
+        if value is _NOT_LITERAL:
+            return None
+        decided = not value if node.value == 'and' else bool(value)
+        if decided and not self.can_delete(right):
+            return None
+        return self.replace(node, left if decided else right)
+
+    def _fold(self, node, function, *operands):
+        try:
+            result = function(*operands)
+        except Exception:
+            return None
+        literal = make_literal(result, node)
+        return self.replace(node, literal) if literal is not None else None
+
+
+class AlgebraicSimplification(OptimizationPass):
+    """
+    Applies identities of integer arithmetic where x is known to be an int (an integer expression
+    that constant folding left alone, such as a result too large to write out): x + 0, x - 0, x * 1,
+    x ** 1, x | 0, x ^ 0, x << 0 and x >> 0 become x (and 0 + x, 1 * x, 0 | x, 0 ^ x too), and
+    -(-x) and ~(~x) become x. For other values they do not hold: x * 1 copies a list, x - 0
+    raises for a set, -0.0 + 0 is 0.0.
+    """
+
+    name = 'algebraic-simplification'
+
+    _RIGHT_IDENTITIES = {'+': 0, '-': 0, '*': 1, '**': 1, '|': 0, '^': 0, '<<': 0, '>>': 0}
+    _LEFT_IDENTITIES = {'+': 0, '*': 1, '|': 0, '^': 0}
+
+    def rewrite_BinaryOperation(self, node):
+        symbol = node.value
+        left, right = node.children
+        identity = self._RIGHT_IDENTITIES.get(symbol)
+        if identity is not None and _is_int(literal_value(right), identity) and _is_integer(left):
+            return self.replace(node, left)
+        identity = self._LEFT_IDENTITIES.get(symbol)
+        if identity is not None and _is_int(literal_value(left), identity) and _is_integer(right):
+            return self.replace(node, right)
+        return None
+
+    def rewrite_UnaryOperation(self, node):
+        operand = node.children[0]
+        if (node.value in ('-', '~') and operand.type is NodeType.UNARY_OPERATION and operand.value == node.value
+                and _is_integer(operand.children[0])):
+            return self.replace(node, operand.children[0])
+        return None
+
+
+class DeadBranchElimination(OptimizationPass):
+    """
+    Removes the branches a literal condition never takes: an if statement (or elif) with a literal
+    test becomes the statements of the branch it takes, a while loop with a false literal test becomes
+    its else block, and a conditional expression with a literal test becomes the chosen operand.
+    A branch that holds the only binding of a function's variable is kept (see Bindings).
+    """
+
+    name = 'dead-branch-elimination'
+
+    def rewrite_Conditional(self, node):
+        body, test, orelse = node.children
+        value = literal_value(test)
+        if value is _NOT_LITERAL or not self.can_delete(orelse if value else body):
+            return None
+        return self.replace(node, body if value else orelse)
+
+    def rewrite_If(self, node):
+        # An elif with a literal test is decided from its parent If, which is not in a statement list
+        children = node.children
+        if len(children) < 3 or children[2].type is not NodeType.IF:
+            return None
+        orelse = children[2]
+        value = literal_value(orelse.children[0])
+        if value is _NOT_LITERAL:
+            return None
+        if value:
+            taken = orelse.children[1]
+            untaken = orelse.children[2:]
+        else:
+            taken = orelse.children[2] if len(orelse.children) > 2 else None
+            untaken = orelse.children[1:2]
+        if not self.can_delete(*untaken):
+            return None
+        self.nodes_removed += _size(orelse) - (_size(taken) if taken is not None else 0)
+        if taken is None:
+            node.children = children[:2]
+        else:
+            node.children = children[:2] + (taken,)
+            taken.parent = node
+        return node
+
+    def rewrite_Module(self, node):
+        return _rewrite_statements(self, node, self._branch)
+
+    rewrite_Block = rewrite_Module
+
+    def _branch(self, statement):
+        # The statements a statement with a literal test stands for, or None if it is kept
+        if statement.type is NodeType.IF:
+            value = literal_value(statement.children[0])
+            if value is _NOT_LITERAL:
+                return None
+            if value:
+                if not self.can_delete(*statement.children[2:]):
+                    return None
+                return list(statement.children[1].children)
+            if not self.can_delete(statement.children[1]):
+                return None
+            if len(statement.children) < 3:
+                return []
+            orelse = statement.children[2]
+            return [orelse] if orelse.type is NodeType.IF else list(orelse.children)
+        if statement.type is NodeType.WHILE:
+            value = literal_value(statement.children[0])
+            if value is _NOT_LITERAL or value or not self.can_delete(statement.children[1]):
+                return None
+            return list(statement.children[2].children) if len(statement.children) > 2 else []
+        return None
+
+
+class UnreachableCodeElimination(OptimizationPass):
+    """
+    Drops the statements that follow a return, raise, break or continue in the same block, except
+    those holding the only binding of a function's variable (see Bindings).
+    """
+
+    name = 'unreachable-code-elimination'
+
+    def rewrite_Module(self, node):
+        children = node.children
+        for index, statement in enumerate(children):
+            if statement.type in _TERMINATORS and index + 1 < len(children):
+                kept = [child for child in children[index + 1:] if not self.can_delete(child)]
+                if len(kept) == len(children) - index - 1:
+                    return None
+                self.nodes_removed += sum(_size(child) for child in children[index + 1:]) - sum(map(_size, kept))
+                node.children = children[:index + 1] + tuple(kept)
+                return node
+        return None
+
+    rewrite_Block = rewrite_Module
+
+
+def _rewrite_statements(optimization_pass, node, expand):
+    # Replaces each statement s of a statement list with expand(s), when that is not None, then
+    # expands the statements that came in; a Block left empty gets a Pass
+    pending = list(reversed(node.children))
+    statements = []
+    changed = False
+    removed = 0
+    while pending:
+        statement = pending.pop()
+        replacement = expand(statement)
+        if replacement is None:
+            statements.append(statement)
+            continue
+        changed = True
+        removed += _size(statement) - sum(_size(child) for child in replacement)
+        pending.extend(reversed(replacement))
+    if not changed:
+        return None
+    if not statements and node.type is NodeType.BLOCK:
+        statements.append(ASTNode(NodeType.PASS, start=node.start, end=node.start))
+        removed -= 1
+    optimization_pass.nodes_removed += removed
+    for statement in statements:
+        statement.parent = node
+    node.children = tuple(statements)
+    return node
+
+
+# The passes PassManager runs by default, in order
+DEFAULT_PASSES = (ConstantFolding, AlgebraicSimplification, DeadBranchElimination, UnreachableCodeElimination)
+
+
+# **PASS MANAGER**
+
+class PassStatistics:
+    """
+    What one pass did over a whole optimization: time spent, rewrites made and nodes removed.
+    """
+
+    __slots__ = ('name', 'seconds', 'rewrites', 'nodes_removed')
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.rewrites = 0
+        self.nodes_removed = 0
+
+    def __repr__(self):
+        return (f"{self.name:<30} {self.seconds * 1000:9.3f} ms {self.rewrites:8} rewrites "
+                f"{self.nodes_removed:8} nodes removed")
+
+
+class OptimizationReport:
+    """
+    The result of PassManager.run: per-pass statistics in pass order, the rounds it took to reach
+    the fixpoint and the node counts before and after.
+    """
+
+    def __init__(self, passes, rounds, nodes_before, nodes_after):
+        self.passes = passes
+        self.rounds = rounds
+        self.nodes_before = nodes_before
+        self.nodes_after = nodes_after
+
+    @property
+    def seconds(self):
+        return sum(statistics.seconds for statistics in self.passes)
+
+    def __repr__(self):
+        lines = [repr(statistics) for statistics in self.passes]
+        lines.append(f"{self.rounds} rounds, {self.nodes_before} -> {self.nodes_after} nodes, "
+                     f"{self.seconds * 1000:.3f} ms")
+        return '\n'.join(lines)
+
+
+class PassManager:
+    """
+    Runs passes (OptimizationPass classes or instances, DEFAULT_PASSES if None) in order over a tree,
+    round after round, until a round changes nothing or max_rounds is reached. The tree is changed in
+    place; the root keeps its identity unless a pass replaces the root node itself.
+    """
+
+    def __init__(self, passes=None, max_rounds=16):
+        self.passes = [item() if isinstance(item, type) else item for item in (passes or DEFAULT_PASSES)]
+        self.max_rounds = max_rounds
+        self.root = None
+
+    def run(self, root, table=None):
+        """
+        Optimizes the tree under root and returns an OptimizationReport; the optimized root is
+        self.root. table is the ScopeTable of the tree, if it is already analyzed.
+        """
+        bindings = Bindings(root, table)
+        for optimization_pass in self.passes:
+            optimization_pass.bindings = bindings
+        nodes_before = _size(root)
+        statistics = [PassStatistics(optimization_pass.name) for optimization_pass in self.passes]
+        dirty = None  # nodes to descend into in this round, None for all
+        rounds = 0
+        while rounds < self.max_rounds:
+            rounds += 1
+            changed = set()
+            for optimization_pass, stats in zip(self.passes, statistics):
+                rewrites = optimization_pass.rewrites
+                removed = optimization_pass.nodes_removed
+                start = time.perf_counter()
+                root = self._sweep(optimization_pass, root, dirty, changed)
+                stats.seconds += time.perf_counter() - start
+                stats.rewrites += optimization_pass.rewrites - rewrites
+                stats.nodes_removed += optimization_pass.nodes_removed - removed
+            if not changed:
+                break
+            dirty = changed
+        self.root = root
+        return OptimizationReport(statistics, rounds, nodes_before, _size(root))
+
+    @staticmethod
+    def _sweep(optimization_pass, root, dirty, changed):
+        # Rewrites the nodes under root after their children, descending only into the nodes changed
+        # in the previous round (dirty, None for all) or earlier in this one, and adds every
+        # rewritten node and its ancestors to changed
+        rewrite = optimization_pass.rewrite
+        stack = [(root, None, iter(enumerate(root.children)))]  # (node, index in parent, children)
+        while stack:
+            node, position, children = stack[-1]
+            for index, child in children:
+                if child.children and (dirty is None or child in dirty or child in changed):
+                    stack.append((child, index, iter(enumerate(child.children))))
+                    break
+            else:
+                stack.pop()
+                replacement = None
+                result = rewrite(node)
+                while result is not None:
+                    replacement = result
+                    if result is node:
+                        break
+                    node = result
+                    result = rewrite(node)
+                if replacement is None:
+                    continue
+                changed.add(replacement)
+                for entry in reversed(stack):
+                    if entry[0] in changed:
+                        break
+                    changed.add(entry[0])
+                if stack:
+                    parent = stack[-1][0]
+                    if parent.children[position] is not replacement:
+                        parent.children = (parent.children[:position] + (replacement,)
+                                           + parent.children[position + 1:])
+                        replacement.parent = parent
+                else:
+                    replacement.parent = root.parent
+                    root = replacement
+        return root
+
+
+def optimize_ast(root, passes=None, max_rounds=16, table=None):
+    """
+    Optimizes the tree under root in place with a PassManager and returns (root, report).
+    """
+    manager = PassManager(passes, max_rounds)
+    report = manager.run(root, table)
+    return manager.root, report
@@ -0,0 +1,150 @@
+import os
+import re
+from bisect import bisect_left
+
+from ast_binary import ASTFile, dumps_ast
+from ast_nodes import ASTNode, NodeType
+from ast_parser import Parser
+from lexing_engine import MIN_PARALLEL_SEGMENT, compile_engine
+from token_table import TokenTable
+
+
+# **PARALLEL PARSING OF TOP-LEVEL DEFINITIONS**
+#
+# A top-level def or class (with its decorators) starts at column 0 and depends on nothing before it,
+# so the source can be cut in front of any of them and the pieces parsed independently. Pieces are
+# parsed in a process pool, each worker lexing its own range of the source it was started with, and
+# sent back in the compact binary AST format, then their statements are put under one 'Module' node
+# in source order. Node spans are absolute offsets, so the tree equals the serial parse.
+# A cut can be wrong in ways the token stream does not show cheaply (a line starting with 'def' or
+# '@' inside brackets or inside a multi-line token, a decorator spread over several lines): the piece
+# before it then cannot be lexed or parsed on its own, since it ends inside a token, inside brackets or
+# after a decorator, and the whole source is parsed serially, which
+# also reports real syntax errors with their line and column.
+
+# Lines that may start a top-level definition
+_DEFINITION_LINE = re.compile(r'^(?:def\b|class\b|@)', re.MULTILINE)
+
+_WORKER_STATE = {}
+
+
+def definition_starts(source, table=None):
+    """
+    Returns the offsets of the top-level definitions of source, decorators included. With the
+    TokenTable of the source, lines inside multi-line tokens are left out; without it they are left
+    to the worker that lexes the piece before the cut, which sees a token running past its end.
+    """
+    starts = table.starts if table is not None else None
+    offsets = []
+    decorated = False  # the previous definition line was a decorator, so this one is not a cut
+    previous_end = 0
+    for match in _DEFINITION_LINE.finditer(source):
+        offset = match.start()
+        if starts is not None:
+            index = bisect_left(starts, offset)
+            if index == len(starts) or starts[index] != offset:
+                continue
+        value = match.group()
+        if value == '@':
+            cut = not decorated or _has_statement(source, previous_end, offset)
+            decorated = True
+        elif value == 'def' or value == 'class':
+            cut = not decorated or _has_statement(source, previous_end, offset)
+            decorated = False
+        else:
+            continue
+        if cut and offset:
+            offsets.append(offset)
+        previous_end = source.find('\n', offset) + 1 or len(source)
+    return offsets
+
+
+def _has_statement(source, start, stop):
+    # Whether a line between a decorator and the next definition line starts a statement, in which
+    # case the decorator belonged to something else (the closing bracket of its arguments does not)
+    for line in source[start:stop].split('\n'):
+        if line and line[0] not in ' \t#)':
+            return True
+    return False
+
+
+def split_definitions(source, pieces, table=None):
+    """
+    Picks up to pieces - 1 cut points among the top-level definition starts, close to evenly spaced
+    offsets, and returns the piece boundaries including 0 and len(source).
+    """
+    candidates = definition_starts(source, table)
+    points = [0]
+    length = len(source)
+    for index in range(1, pieces):
+        position = bisect_left(candidates, max(length * index // pieces, points[-1] + 1))
+        if position == len(candidates):
+            break
+        if candidates[position] > points[-1]:
+            points.append(candidates[position])
+    points.append(length)
+    return points
+
+
+def _init_parse_worker(source, token_patterns):
+    _WORKER_STATE['source'] = source
+    _WORKER_STATE['engine'] = compile_engine(token_patterns, skip=())
+
+
+def _parse_worker(start, stop):
+    # The binary AST of source[start:stop] and its node count, or None if it does not parse on its own
+    source = _WORKER_STATE['source']
+    engine = _WORKER_STATE['engine']
+    kinds, token_starts, token_ends, reached = engine.lex_range(source, start, stop)
+    if reached != stop and not source[stop:reached].isspace():
+        return None
+    try:
+        parser = Parser(TokenTable(source, engine.type_names, kinds, token_starts, token_ends).located())
+        module = parser.parse_module()
+    except SyntaxError:
+        return None
+    return dumps_ast(module), parser.node_count
+
+
+def parallel_parse(source, token_patterns, workers=None, table=None, pieces_per_worker=4):
+    """
+    Parses source in a process pool and returns (module, node_count), the 'Module' node being
+    identical to what the serial parser builds. table is the TokenTable of the source if it is already
+    lexed (with or without whitespace), to find the definitions from its tokens. Small sources and
+    single workers are parsed serially.
+    """
+    workers = workers or os.cpu_count() or 1
+    pieces = min(workers * pieces_per_worker, len(source) // MIN_PARALLEL_SEGMENT)
+    points = [0, len(source)]
+    if workers >= 2 and pieces >= 2:
+        points = split_definitions(source, pieces, table)
+    if len(points) < 3:
+        return _serial_parse(source, token_patterns)
+
+    # Imported here, as in parallel_lex: the process pool machinery is an expensive import
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(min(workers, len(points) - 1), initializer=_init_parse_worker,
+                             initargs=(source, token_patterns)) as pool:
+        results = list(pool.map(_parse_worker, points[:-1], points[1:]))
+    if any(result is None for result in results):
+        return _serial_parse(source, token_patterns)
+
+    statements = []
+    node_count = 1
+    for data, count in results:
+        statements.extend(ASTFile(data).module().children)
+        node_count += count - 1
+    module = ASTNode(NodeType.MODULE, None, statements)
+    for statement in statements:
+        statement.parent = module
+    if statements:
+        module.start = statements[0].start
+        module.end = statements[-1].end
+    return module, node_count
+
+
+def _serial_parse(source, token_patterns):
+    table = compile_engine(token_patterns, skip=()).lex_table(source)
+    parser = Parser(table.located(), table.line_index().line_column)
+    return parser.parse_module(), parser.node_count
@@ -0,0 +1,873 @@
+import gc
+
+from ast_nodes import NODE_TYPES, ASTNode, NodeType
+
+
+# **LINEAR-TIME PRATT / RECURSIVE-DESCENT PARSER FOR THE PYTHON-LIKE DIALECT**
+#
+# The parser reads tokens from any iterator of (token_type, value) or (token_type, value, start)
+# tuples, one token of lookahead and no backtracking, so it runs in O(n) and can sit directly behind
+# TokenTable iteration or LexerEngine.stream. The token stream must keep its WHITESPACE tokens:
+# blocks are delimited by indentation, which the layout pass below turns into INDENT/DEDENT tokens.
+
+# Lexer token types mapped to the few kinds the grammar cares about
+TOKEN_KINDS = {
+    'IDENTIFIER': 'NAME',
+    'KEYWORDS': 'KEYWORD',
+    'NUMBER': 'NUMBER',
+    'FLOAT': 'NUMBER',
+    'HEX_NUMBER': 'NUMBER',
+    'BINARY_NUMBER': 'NUMBER',
+    'STRING': 'STRING',
+    'CHARACTER': 'STRING',
+    'COMMENT_MULTI': 'STRING',
+    'OPERATOR': 'OP',
+    'ASSIGNMENT': 'OP',
+    'PUNCTUATION': 'OP',
+    'BRACKETS': 'OP',
+    'SPECIAL': 'OP',
+}
+SKIPPED_TYPES = frozenset(('COMMENT_SINGLE',))
+
+# The lexers emit operators one character at a time; adjacent characters are merged by maximal munch
+COMPOUND_OPERATORS = frozenset((
+    '**', '//', '==', '!=', '<=', '>=', '<<', '>>', '->', ':=', '...',
+    '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '@=', '**=', '//=', '<<=', '>>=',
+))
+_OPERATOR_PREFIXES = frozenset(operator[:length] for operator in COMPOUND_OPERATORS
+                               for length in range(1, len(operator) + 1))
+_OPENING = frozenset('([{')
+_CLOSING = frozenset(')]}')
+
+# Words that act as keywords in statement position whether or not the dialect's table lists them
+SOFT_KEYWORDS = frozenset(('class', 'elif', 'finally', 'raise', 'in', 'as'))
+
+# Left binding powers of infix operators, loosest first
+TERNARY_POWER = 2
+NOT_POWER = 5  # prefix 'not', which only starts an operand of 'and' and 'or' or a whole expression
+COMPARISON_POWER = 6
+UNARY_POWER = 13
+POWER_POWER = 14
+POSTFIX_POWER = 15
+INFIX_POWERS = {
+    'or': 3,
+    'and': 4,
+    '==': COMPARISON_POWER, '!=': COMPARISON_POWER, '<': COMPARISON_POWER, '>': COMPARISON_POWER,
+    '<=': COMPARISON_POWER, '>=': COMPARISON_POWER, 'in': COMPARISON_POWER, 'not': COMPARISON_POWER,
+    'is': COMPARISON_POWER,
+    '|': 7,
+    '^': 8,
+    '&': 9,
+    '<<': 10, '>>': 10,
+    '+': 11, '-': 11,
+    '*': 12, '/': 12, '//': 12, '%': 12, '@': 12,
+    '**': POWER_POWER,
+    '(': POSTFIX_POWER, '[': POSTFIX_POWER, '.': POSTFIX_POWER,
+}
+ASSIGNMENT_OPERATORS = frozenset(('+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '@=', '**=', '//=', '<<=', '>>='))
+_EXPRESSION_STARTS = frozenset(('(', '[', '{', '-', '+', '~', '*', '**', '...'))
+_EXPRESSION_KEYWORDS = frozenset(('not', 'lambda', 'None', 'True', 'False', 'yield'))
+_LAYOUT_KINDS = frozenset(('NEWLINE', 'INDENT', 'DEDENT', 'END'))
+
+
+def layout(tokens, locate=None, indent=0):
+    """
+    Turns lexer tokens into (kind, value, start) parser tokens: drops whitespace and comments,
+    emits NEWLINE at the end of logical lines (newlines inside brackets do not count), INDENT and
+    DEDENT when the indentation changes and a final END, and merges adjacent operator characters
+    ('=' '=' into '==') and adjacent NUMBER '.' NUMBER into one number, since the lexers' FLOAT
+    pattern never wins over NUMBER.
+    indent is the indentation of the outermost lines, for the body of a block lexed on its own.
+    """
+    indents = [indent]
+    depth = 0
+    line_start = True
+    column = 0
+    adjacent = False  # no whitespace or comment between the previous token and this one
+    held = None  # last significant token, kept back until it is known not to merge with the next one
+    start = None
+
+    for token in tokens:
+        token_type = token[0]
+        value = token[1]
+        start = token[2] if len(token) > 2 else None
+        if token_type == 'WHITESPACE':
+            adjacent = False
+            newline = value.rfind('\n')
+            if newline >= 0:
+                if depth == 0:
+                    if held is not None:
+                        yield held
+                        held = None
+                    if not line_start:
+                        yield ('NEWLINE', '\n', start)
+                        line_start = True
+                    column = len(value[newline + 1:].expandtabs(8))
+            elif line_start:
+                column += len(value.expandtabs(8))
+            continue
+        if token_type in SKIPPED_TYPES:
+            adjacent = False
+            continue
+        kind = TOKEN_KINDS.get(token_type, token_type)
+        if kind == 'ERROR':
+            raise SyntaxError(f"Unexpected character {value!r}{_where(start, locate)}")
+
+        if line_start:
+            line_start = False
+            if column > indents[-1]:
+                indents.append(column)
+                yield ('INDENT', column, start)
+            elif column < indents[-1]:
+                while column < indents[-1]:
+                    if len(indents) == 1:
+                        raise SyntaxError(f"Unindent below the enclosing block{_where(start, locate)}")
+                    indents.pop()
+                    yield ('DEDENT', column, start)
+                if column != indents[-1]:
+                    raise SyntaxError(f"Inconsistent dedent{_where(start, locate)}")
+
+        if held is not None:
+            held_kind, held_value, held_start = held
+            if adjacent and kind == 'OP':
+                if held_kind == 'OP' and held_value + value in _OPERATOR_PREFIXES:
+                    held = ('OP', held_value + value, held_start)
+                    continue
+                if held_kind == 'NUMBER' and value == '.' and held_value.isdigit():
+                    held = ('NUMBER', held_value + '.', held_start)
+                    continue
+            elif adjacent and kind == 'NUMBER' and held_kind == 'NUMBER' and held_value.endswith('.'):
+                held = ('NUMBER', held_value + value, held_start)
+                continue
+            yield held
+
+        if kind == 'OP':
+            if value in _OPENING:
+                depth += 1
+            elif value in _CLOSING and depth:
+                depth -= 1
+        held = (kind, value, start)
+        adjacent = True
+
+    if held is not None:
+        yield held
+    if not line_start:
+        yield ('NEWLINE', '\n', start)
+    for _ in indents[1:]:
+        yield ('DEDENT', 0, start)
+    yield ('END', None, start)
+
+
+def _where(start, locate=None):
+    if start is None:
+        return ''
+    if locate is not None:
+        line, column = locate(start)
+        return f" at line {line}, column {column}"
+    return f" at position {start}"
+
+
+class Parser:
+    """
+    Parses a token iterator into an ASTNode tree rooted at a 'Module' node. Statements are parsed by
+    recursive descent and expressions by Pratt parsing (binding powers in INFIX_POWERS), each token
+    being looked at a bounded number of times. Every node records its parent in node.parent, and
+    its source span in node.start and node.end when the tokens carry their start offsets.
+    locate, if given, maps a token start offset to (line, column) for error messages, and indent is
+    the indentation of the outermost statements (see layout).
+    """
+
+    def __init__(self, tokens, locate=None, indent=0):
+        self._tokens = layout(tokens, locate, indent)
+        self.locate = locate
+        self.node_count = 0
+        self.kind = self.value = self.start = None
+        self._last_start = self._last_value = None  # last consumed token, for node spans
+        self._advance()
+
+    # Token handling
+
+    def _advance(self):
+        previous = self.value
+        if self.kind not in _LAYOUT_KINDS:
+            self._last_start = self.start
+            self._last_value = previous
+        self.kind, self.value, self.start = next(self._tokens)
+        return previous
+
+    def _error(self, message):
+        found = self.kind if self.value is None or self.kind in ('NEWLINE', 'INDENT', 'DEDENT') else repr(self.value)
+        raise SyntaxError(f"{message}, found {found}{_where(self.start, self.locate)}")
+
+    def _at(self, value):
+        return self.value == value and self.kind in ('OP', 'KEYWORD', 'NAME')
+
+    def _accept(self, value):
+        if self.value == value and self.kind in ('OP', 'KEYWORD', 'NAME'):
+            self._advance()
+            return True
+        return False
+
+    def _expect(self, value):
+        if self.value != value or self.kind not in ('OP', 'KEYWORD', 'NAME'):
+            self._error(f"Expected {value!r}")
+        self._advance()
+
+    def _expect_name(self):
+        if self.kind != 'NAME':
+            self._error("Expected a name")
+        return self._advance()
+
+    def _node(self, type_, value=None, children=None, start=None):
+        # A node ends with the last token consumed; it starts at start, which defaults to the start
+        # of its first child (or of the last token, for leaves)
+        node = ASTNode(type_, value, children)
+        for child in node.children:
+            child.parent = node
+        last = self._last_start
+        if last is not None:
+            node.start = start if start is not None else node.children[0].start if node.children else last
+            node.end = last + len(self._last_value)
+        self.node_count += 1
+        return node
+
+    def _bracketed(self, node, start):
+        # Widens a node to the brackets around it once the closing one is consumed
+        if self._last_start is not None:
+            node.start = start
+            node.end = self._last_start + len(self._last_value)
+        return node
+
+    def _starts_expression(self):
+        kind = self.kind
+        if kind == 'NAME':
+            return self.value not in SOFT_KEYWORDS
+        if kind == 'NUMBER' or kind == 'STRING':
+            return True
+        if kind == 'OP':
+            return self.value in _EXPRESSION_STARTS
+        return kind == 'KEYWORD' and self.value in _EXPRESSION_KEYWORDS
+
+    # Statements
+
+    def parse_module(self):
+        """
+        Parses the whole token stream and returns the 'Module' node.
+        """
+        # Every node allocated here stays reachable from the tree, so the cyclic garbage collector
+        # would only rescan the growing tree over and over (parent links make it cyclic)
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            statements = []
+            while self.kind != 'END':
+                if self.kind == 'NEWLINE':
+                    self._advance()
+                    continue
+                self._statement(statements)
+            return self._node(NodeType.MODULE, None, statements)
+        finally:
+            if collecting:
+                gc.enable()
+
+    def _statement(self, statements):
+        if self.kind in ('KEYWORD', 'NAME'):
+            compound = self._COMPOUND.get(self.value)
+            if compound is not None and (self.kind == 'KEYWORD' or self.value in SOFT_KEYWORDS):
+                statements.append(compound(self))
+                return
+        elif self.kind == 'OP' and self.value == '@':
+            statements.append(self._decorated())
+            return
+        elif self.kind == 'INDENT':
+            self._error("Unexpected indent")
+        self._simple_statements(statements)
+
+    def _simple_statements(self, statements):
+        statements.append(self._simple_statement())
+        while self._accept(';'):
+            if self.kind in ('NEWLINE', 'END'):
+                break
+            statements.append(self._simple_statement())
+        if self.kind == 'NEWLINE':
+            self._advance()
+        elif self.kind != 'END':
+            self._error("Expected the end of the statement")
+
+    def _simple_statement(self):
+        if self.kind in ('KEYWORD', 'NAME'):
+            simple = self._SIMPLE.get(self.value)
+            if simple is not None and (self.kind == 'KEYWORD' or self.value in SOFT_KEYWORDS):
+                return simple(self)
+
+        expression = self._expression_list()
+        if self.kind == 'OP':
+            if self.value == '=':
+                targets = [expression]
+                while self._accept('='):
+                    targets.append(self._yield_or_expression_list())
+                return self._node(NodeType.ASSIGNMENT, '=', targets)
+            if self.value in ASSIGNMENT_OPERATORS:
+                operator = self._advance()
+                value = self._yield_or_expression_list()
+                return self._node(NodeType.AUGMENTED_ASSIGNMENT, operator, [expression, value])
+            if self.value == ':':
+                self._advance()
+                children = [expression, self._expression()]
+                if self._accept('='):
+                    children.append(self._expression_list())
+                return self._node(NodeType.ANNOTATED_ASSIGNMENT, None, children)
+        return self._node(NodeType.EXPRESSION_STATEMENT, None, [expression])
+
+    def _block(self):
+        # ':' then either an indented block or simple statements on the same line
+        self._expect(':')
+        statements = []
+        if self.kind == 'NEWLINE':
+            self._advance()
+            if self.kind != 'INDENT':
+                self._error("Expected an indented block")
+            self._advance()
+            while self.kind != 'DEDENT':
+                if self.kind == 'END':
+                    break
+                self._statement(statements)
+            if self.kind == 'DEDENT':
+                self._advance()
+        else:
+            self._simple_statements(statements)
+        return self._node(NodeType.BLOCK, None, statements)
+
+    def _function_definition(self):
+        start = self.start
+        self._advance()
+        name = self._expect_name()
+        self._expect('(')
+        parameters = self._parameters(')')
+        self._expect(')')
+        children = [parameters]
+        if self._accept('->'):
+            children.append(self._node(NodeType.RETURNS, None, [self._expression()]))
+        children.append(self._block())
+        return self._node(NodeType.FUNCTION_DEFINITION, name, children, start)
+
+    def _parameters(self, closing):
+        parameters = []
+        while not self._at(closing):
+            prefix = ''
+            start = self.start
+            if self.kind == 'OP' and self.value in ('*', '**', '/'):
+                prefix = self._advance()
+                if prefix == '/' or (prefix == '*' and self._at(',')):
+                    parameters.append(self._node(NodeType.PARAMETER, prefix))
+                    if not self._accept(','):
+                        break
+                    continue
+            name = self._expect_name()
+            children = []
+            if closing == ')' and self._accept(':'):
+                children.append(self._node(NodeType.ANNOTATION, None, [self._expression()]))
+            if self._accept('='):
+                children.append(self._expression())
+            parameters.append(self._node(NodeType.PARAMETER, prefix + name, children, start))
+            if not self._accept(','):
+                break
+        return self._node(NodeType.PARAMETERS, None, parameters)
+
+    def _class_definition(self):
+        start = self.start
+        self._advance()
+        name = self._expect_name()
+        bases_start = self.start
+        bases = []
+        if self._accept('('):
+            bases = self._arguments()
+            self._expect(')')
+        bases = self._node(NodeType.BASES, None, bases, bases_start)
+        return self._node(NodeType.CLASS_DEFINITION, name, [bases, self._block()], start)
+
+    def _decorated(self):
+        start = self.start
+        decorators = []
+        while self._accept('@'):
+            decorators.append(self._expression())
+            if self.kind != 'NEWLINE':
+                self._error("Expected a newline after the decorator")
+            self._advance()
+        if not (self._at('def') or self._at('class')):
+            self._error("Expected a function or class definition after decorators")
+        definition = self._COMPOUND[self.value](self)
+        return self._node(NodeType.DECORATED, None, decorators + [definition], start)
+
+    def _if_statement(self):
+        start = self.start
+        self._advance()
+        children = [self._named_expression(), self._block()]
+        if self._at('elif'):
+            children.append(self._if_statement())
+        elif self._accept('else'):
+            children.append(self._block())
+        return self._node(NodeType.IF, None, children, start)
+
+    def _while_statement(self):
+        start = self.start
+        self._advance()
+        children = [self._named_expression(), self._block()]
+        if self._accept('else'):
+            children.append(self._block())
+        return self._node(NodeType.WHILE, None, children, start)
+
+    def _for_statement(self):
+        start = self.start
+        self._advance()
+        target = self._target_list()
+        self._expect('in')
+        children = [target, self._expression_list(), self._block()]
+        if self._accept('else'):
+            children.append(self._block())
+        return self._node(NodeType.FOR, None, children, start)
+
+    def _try_statement(self):
+        start = self.start
+        self._advance()
+        children = [self._block()]
+        while self._at('except'):
+            handler_start = self.start
+            self._advance()
+            handler = []
+            name = None
+            if not self._at(':'):
+                handler.append(self._expression())
+                if self._accept('as'):
+                    name = self._expect_name()
+            handler.append(self._block())
+            children.append(self._node(NodeType.EXCEPT_HANDLER, name, handler, handler_start))
+        clause_start = self.start
+        if self._accept('else'):
+            children.append(self._node(NodeType.ELSE, None, [self._block()], clause_start))
+        clause_start = self.start
+        if self._accept('finally'):
+            children.append(self._node(NodeType.FINALLY, None, [self._block()], clause_start))
+        if len(children) == 1:
+            self._error("Expected 'except' or 'finally'")
+        return self._node(NodeType.TRY, None, children, start)
+
+    def _with_statement(self):
+        start = self.start
+        self._advance()
+        items = []
+        while True:
+            item = [self._expression()]
+            if self._accept('as'):
+                item.append(self._target())
+            items.append(self._node(NodeType.WITH_ITEM, None, item))
+            if not self._accept(','):
+                break
+        return self._node(NodeType.WITH, None, items + [self._block()], start)
+
+    def _return_statement(self):
+        start = self.start
+        self._advance()
+        children = [self._expression_list()] if self._starts_expression() else []
+        return self._node(NodeType.RETURN, None, children, start)
+
+    def _raise_statement(self):
+        start = self.start
+        self._advance()
+        children = []
+        if self._starts_expression():
+            children.append(self._expression())
+            if self._accept('from'):
+                children.append(self._expression())
+        return self._node(NodeType.RAISE, None, children, start)
+
+    def _keyword_statement(self):
+        # pass, break and continue
+        return self._node(NODE_TYPES[self._advance().capitalize()])
+
+    def _global_statement(self):
+        start = self.start
+        self._advance()
+        names = [self._node(NodeType.IDENTIFIER, self._expect_name())]
+        while self._accept(','):
+            names.append(self._node(NodeType.IDENTIFIER, self._expect_name()))
+        return self._node(NodeType.GLOBAL, None, names, start)
+
+    def _del_statement(self):
+        start = self.start
+        self._advance()
+        return self._node(NodeType.DELETE, None, [self._expression_list()], start)
+
+    def _assert_statement(self):
+        start = self.start
+        self._advance()
+        children = [self._expression()]
+        if self._accept(','):
+            children.append(self._expression())
+        return self._node(NodeType.ASSERT, None, children, start)
+
+    def _import_statement(self):
+        start = self.start
+        self._advance()
+        aliases = [self._alias(self.start, self._dotted_name())]
+        while self._accept(','):
+            aliases.append(self._alias(self.start, self._dotted_name()))
+        return self._node(NodeType.IMPORT, None, aliases, start)
+
+    def _from_statement(self):
+        start = self.start
+        self._advance()
+        module = ''
+        while self.kind == 'OP' and self.value in ('.', '..', '...'):
+            module += self._advance()
+        if self.kind == 'NAME':
+            module += self._dotted_name()
+        self._expect('import')
+        if self._accept('*'):
+            return self._node(NodeType.IMPORT_FROM, module, [self._node(NodeType.ALIAS, '*')], start)
+        parenthesized = self._accept('(')
+        aliases = [self._alias(self.start, self._expect_name())]
+        while self._accept(','):
+            if parenthesized and self._at(')'):
+                break
+            aliases.append(self._alias(self.start, self._expect_name()))
+        if parenthesized:
+            self._expect(')')
+        return self._node(NodeType.IMPORT_FROM, module, aliases, start)
+
+    def _dotted_name(self):
+        name = self._expect_name()
+        while self._accept('.'):
+            name += '.' + self._expect_name()
+        return name
+
+    def _alias(self, start, name):
+        if self._accept('as'):
+            return self._node(NodeType.ALIAS, name, [self._node(NodeType.IDENTIFIER, self._expect_name())], start)
+        return self._node(NodeType.ALIAS, name, None, start)
+
+    _COMPOUND = {
+        'def': _function_definition,
+        'class': _class_definition,
+        'if': _if_statement,
+        'while': _while_statement,
+        'for': _for_statement,
+        'try': _try_statement,
+        'with': _with_statement,
+    }
+    _SIMPLE = {
+        'return': _return_statement,
+        'raise': _raise_statement,
+        'pass': _keyword_statement,
+        'break': _keyword_statement,
+        'continue': _keyword_statement,
+        'global': _global_statement,
+        'del': _del_statement,
+        'assert': _assert_statement,
+        'import': _import_statement,
+        'from': _from_statement,
+    }
+
+    # Expressions
+
+    def _expression_list(self):
+        # expression [, expression ...] [,]  -> a Tuple when there is a comma
+        first = self._expression()
+        if not self._at(','):
+            return first
+        elements = [first]
+        while self._accept(','):
+            if not self._starts_expression():
+                break
+            elements.append(self._expression())
+        return self._node(NodeType.TUPLE, None, elements)
+
+    def _yield_or_expression_list(self):
+        if self._at('yield'):
+            return self._expression()
+        return self._expression_list()
+
+    def _target(self):
+        # Binds tighter than comparisons so that 'in' ends a for target
+        return self._expression(COMPARISON_POWER)
+
+    def _target_list(self):
+        first = self._target()
+        if not self._at(','):
+            return first
+        elements = [first]
+        while self._accept(','):
+            if self._at('in') or self._at('='):
+                break
+            elements.append(self._target())
+        return self._node(NodeType.TUPLE, None, elements)
+
+    def _named_expression(self):
+        expression = self._expression()
+        if self.kind == 'OP' and self.value == ':=':
+            self._advance()
+            return self._node(NodeType.NAMED_EXPRESSION, None, [expression, self._expression()])
+        return expression
+
+    def _expression(self, right_power=0):
+        """
+        Pratt loop: parses a prefix expression, then keeps folding infix and postfix operators into
+        it while they bind tighter than right_power.
+        """
+        left = self._prefix(right_power)
+        while True:
+            kind = self.kind
+            if kind == 'OP' or kind == 'KEYWORD':
+                power = INFIX_POWERS.get(self.value, 0)
+                if kind == 'KEYWORD' and self.value == 'if':
+                    power = TERNARY_POWER
+            elif kind == 'NAME' and self.value == 'in':
+                power = COMPARISON_POWER
+            else:
+                break
+            if power <= right_power:
+                break
+            left = self._infix(left, power)
+        return left
+
+    def _prefix(self, right_power=0):
+        kind = self.kind
+        value = self.value
+        start = self.start
+        if kind == 'NAME':
+            if value in SOFT_KEYWORDS:
+                self._error("Expected an expression")
+            self._advance()
+            return self._node(NodeType.IDENTIFIER, value)
+        if kind == 'NUMBER':
+            self._advance()
+            if '.' in value:
+                return self._node(NodeType.FLOAT, value)
+            return self._node(NodeType.NUMBER, value)
+        if kind == 'STRING':
+            self._advance()
+            while self.kind == 'STRING':
+                value += self._advance()  # adjacent literals form one string
+            return self._node(NodeType.STRING, value, None, start)
+        if kind == 'OP':
+            if value == '(':
+                return self._parenthesized()
+            if value == '[':
+                return self._list_display()
+            if value == '{':
+                return self._dict_or_set_display()
+            if value in ('-', '+', '~'):
+                self._advance()
+                return self._node(NodeType.UNARY_OPERATION, value, [self._expression(UNARY_POWER)], start)
+            if value == '...':
+                self._advance()
+                return self._node(NodeType.CONSTANT, value)
+            if value == '*' or value == '**':
+                self._advance()
+                return self._node(NodeType.STARRED, value, [self._expression(INFIX_POWERS['|'])], start)
+        elif kind == 'KEYWORD':
+            if value in ('None', 'True', 'False'):
+                self._advance()
+                return self._node(NodeType.CONSTANT, value)
+            if value == 'not':
+                if right_power >= NOT_POWER:
+                    self._error("'not' needs parentheses as an operand here")
+                self._advance()
+                return self._node(NodeType.UNARY_OPERATION, 'not', [self._expression(NOT_POWER - 1)], start)
+            if value == 'lambda':
+                return self._lambda()
+            if value == 'yield':
+                self._advance()
+                if self._accept('from'):
+                    return self._node(NodeType.YIELD_FROM, None, [self._expression()], start)
+                children = [self._expression_list()] if self._starts_expression() else []
+                return self._node(NodeType.YIELD, None, children, start)
+        self._error("Expected an expression")
+
+    def _infix(self, left, power):
+        operator = self._advance()
+        if operator == '(':
+            arguments = self._arguments()
+            self._expect(')')
+            return self._node(NodeType.CALL, None, [left] + arguments)
+        if operator == '[':
+            index = self._subscript()
+            self._expect(']')
+            return self._node(NodeType.SUBSCRIPT, None, [left, index])
+        if operator == '.':
+            return self._node(NodeType.ATTRIBUTE, self._expect_name(), [left])
+        if operator == 'if':
+            condition = self._expression(TERNARY_POWER)
+            self._expect('else')
+            return self._node(NodeType.CONDITIONAL, None, [left, condition, self._expression(TERNARY_POWER - 1)])
+        if operator == 'and' or operator == 'or':
+            return self._node(NodeType.BOOLEAN_OPERATION, operator, [left, self._expression(power)])
+        if power == COMPARISON_POWER:
+            if operator == 'not':
+                self._expect('in')
+                operator = 'not in'
+            elif operator == 'is' and self._accept('not'):
+                operator = 'is not'
+            # a < b < c is one comparison chain, as in Python
+            operators = [operator]
+            operands = [left, self._expression(power)]
+            while self._comparison_follows():
+                operator = self._advance()
+                if operator == 'not':
+                    self._expect('in')
+                    operator = 'not in'
+                elif operator == 'is' and self._accept('not'):
+                    operator = 'is not'
+                operators.append(operator)
+                operands.append(self._expression(power))
+            return self._node(NodeType.COMPARISON, tuple(operators), operands)
+        if operator == '**':
+            # Right associative, and binds tighter than a unary minus on its left only
+            return self._node(NodeType.BINARY_OPERATION, operator, [left, self._expression(UNARY_POWER - 1)])
+        return self._node(NodeType.BINARY_OPERATION, operator, [left, self._expression(power)])
+
+    def _comparison_follows(self):
+        if self.kind == 'NAME':
+            return self.value == 'in'
+        return self.kind in ('OP', 'KEYWORD') and INFIX_POWERS.get(self.value) == COMPARISON_POWER
+
+    def _arguments(self):
+        # Call arguments up to (not including) the closing parenthesis
+        arguments = []
+        while not self._at(')'):
+            argument = self._expression()
+            if self._at('=') and argument.type is NodeType.IDENTIFIER:
+                self._advance()
+                self.node_count -= 1  # the name becomes the value of the keyword argument node
+                argument = self._node(NodeType.KEYWORD_ARGUMENT, argument.value, [self._expression()], argument.start)
+            elif self._at('for'):
+                argument = self._comprehension(NodeType.GENERATOR_EXPRESSION, [argument])
+            arguments.append(argument)
+            if not self._accept(','):
+                break
+        return arguments
+
+    def _subscript(self):
+        items = [self._slice()]
+        if not self._at(','):
+            return items[0]
+        while self._accept(','):
+            if self._at(']'):
+                break
+            items.append(self._slice())
+        return self._node(NodeType.TUPLE, None, items)
+
+    def _slice(self):
+        start = self.start
+        lower = None if self._at(':') else self._expression()
+        if not self._at(':'):
+            return lower
+        parts = [lower]
+        while len(parts) < 3 and self._accept(':'):
+            parts.append(None if self._at(':') or self._at(']') or self._at(',') else self._expression())
+        parts = [part if part is not None else self._node(NodeType.EMPTY, None, None, start) for part in parts]
+        return self._node(NodeType.SLICE, None, parts, start)
+
+    def _parenthesized(self):
+        start = self.start
+        self._advance()
+        if self._accept(')'):
+            return self._node(NodeType.TUPLE, None, [], start)
+        first = self._yield_or_expression_list() if self._at('yield') else self._named_expression()
+        if self._at('for'):
+            node = self._comprehension(NodeType.GENERATOR_EXPRESSION, [first])
+        elif self._at(','):
+            elements = [first]
+            while self._accept(','):
+                if self._at(')'):
+                    break
+                elements.append(self._expression())
+            node = self._node(NodeType.TUPLE, None, elements)
+        else:
+            self._expect(')')
+            return first  # spans the expression only, as in Python
+        self._expect(')')
+        return self._bracketed(node, start)
+
+    def _list_display(self):
+        start = self.start
+        self._advance()
+        elements = []
+        if not self._at(']'):
+            elements.append(self._named_expression())
+            if self._at('for'):
+                node = self._comprehension(NodeType.LIST_COMPREHENSION, elements)
+                self._expect(']')
+                return self._bracketed(node, start)
+            while self._accept(','):
+                if self._at(']'):
+                    break
+                elements.append(self._named_expression())
+        self._expect(']')
+        return self._node(NodeType.LIST, None, elements, start)
+
+    def _dict_or_set_display(self):
+        start = self.start
+        self._advance()
+        if self._accept('}'):
+            return self._node(NodeType.DICT, None, [], start)
+        unpack_start = self.start
+        if self._accept('**'):
+            first = self._node(NodeType.DICT_UNPACK, None, [self._expression(INFIX_POWERS['|'])], unpack_start)
+            is_dict = True
+        else:
+            first = self._expression()
+            is_dict = self._accept(':')
+            if is_dict:
+                first = self._node(NodeType.KEY_VALUE, None, [first, self._expression()])
+        if self._at('for'):
+            type_ = NodeType.DICT_COMPREHENSION if is_dict else NodeType.SET_COMPREHENSION
+            node = self._comprehension(type_, [first])
+            self._expect('}')
+            return self._bracketed(node, start)
+        elements = [first]
+        while self._accept(','):
+            if self._at('}'):
+                break
+            if is_dict:
+                unpack_start = self.start
+                if self._accept('**'):
+                    elements.append(self._node(NodeType.DICT_UNPACK, None, [self._expression(INFIX_POWERS['|'])],
+                                               unpack_start))
+                    continue
+                key = self._expression()
+                self._expect(':')
+                elements.append(self._node(NodeType.KEY_VALUE, None, [key, self._expression()]))
+            else:
+                elements.append(self._expression())
+        self._expect('}')
+        return self._node(NodeType.DICT if is_dict else NodeType.SET, None, elements, start)
+
+    def _comprehension(self, type_, elements):
+        clauses = []
+        while self._at('for'):
+            start = self.start
+            self._advance()
+            target = self._target_list()
+            self._expect('in')
+            clause = [target, self._expression(TERNARY_POWER)]
+            while self._at('if'):
+                condition_start = self.start
+                self._advance()
+                clause.append(self._node(NodeType.CONDITION, None, [self._expression(TERNARY_POWER)], condition_start))
+            clauses.append(self._node(NodeType.COMPREHENSION_CLAUSE, None, clause, start))
+        return self._node(type_, None, elements + clauses)
+
+    def _lambda(self):
+        start = self.start
+        self._advance()
+        parameters = self._parameters(':')
+        self._expect(':')
+        return self._node(NodeType.LAMBDA, None, [parameters, self._expression()], start)
+
+
+def parse(tokens, locate=None):
+    """
+    Parses a token iterator (with WHITESPACE tokens kept) and returns the 'Module' node.
+    """
+    return Parser(tokens, locate).parse_module()
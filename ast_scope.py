@@ -0,0 +1,360 @@
+import builtins
+import sys
+
+from ast_nodes import NodeType
+from ast_walk import SKIP_CHILDREN, NodeVisitor
+
+
+# **SYMBOL TABLE AND SCOPE ANALYSIS**
+#
+# analyze_scope(root) makes one pass over a tree and returns a ScopeTable: the scopes (module,
+# functions, lambdas, classes, comprehensions) with their symbols, and for every Identifier, Parameter,
+# definition and import node the Symbol it defines or refers to. Each scope keeps its own symbols in a
+# dict, and every name looked up from a scope is remembered in that scope, so each (scope, name) pair
+# walks the scope chain once and every later reference to it is a single dict lookup.
+# The def-use chains are per symbol and flow-insensitive: symbol.definitions are the nodes that bind
+# the name in its scope, symbol.uses the nodes that read it, both in source order.
+
+MODULE_SCOPE = 'module'
+FUNCTION_SCOPE = 'function'
+LAMBDA_SCOPE = 'lambda'
+CLASS_SCOPE = 'class'
+COMPREHENSION_SCOPE = 'comprehension'
+BUILTIN_SCOPE = 'builtins'
+
+# How a name is reached from the scope it is used in (Scope.kind_of)
+LOCAL = 'local'
+GLOBAL = 'global'
+FREE = 'free'
+BUILTIN = 'builtin'
+
+_FUNCTION_SCOPES = frozenset((FUNCTION_SCOPE, LAMBDA_SCOPE, COMPREHENSION_SCOPE))
+_UNPACKING = frozenset((NodeType.TUPLE, NodeType.LIST, NodeType.STARRED))
+_BUILTIN_NAMES = frozenset(dir(builtins))
+
+# How the visitor treats an Identifier marked as a target
+_STORE = 1  # binds the name
+_UPDATE = 2  # binds and reads it (augmented assignment)
+_NAMED = 3  # binds it in the nearest scope that is not a comprehension (walrus)
+
+
+class Symbol:
+    """
+    A name bound in one scope. index is its slot among the scope's own symbols, in order of first
+    binding, for code that allocates a variable per symbol.
+    """
+
+    __slots__ = ('name', 'scope', 'index', 'definitions', 'uses', 'parameter', 'captured')
+
+    def __init__(self, name, scope, index):
+        self.name = name
+        self.scope = scope
+        self.index = index
+        self.definitions = []
+        self.uses = []
+        self.parameter = False
+        self.captured = False  # read from a nested function, so a closure must share it
+
+    @property
+    def defined(self):
+        return bool(self.definitions)
+
+    def __repr__(self):
+        return f"Symbol({self.name!r}, {self.scope.kind}, {self.index})"
+
+
+class Scope:
+    """
+    A namespace: the module, the body of a function, lambda or class, or a comprehension. symbols
+    maps the names bound in it (or declared global) to their Symbol; locals lists the symbols it owns
+    in slot order.
+    """
+
+    __slots__ = ('kind', 'node', 'parent', 'children', 'symbols', 'locals', 'references', '_resolved')
+
+    def __init__(self, kind, node, parent=None):
+        self.kind = kind
+        self.node = node
+        self.parent = parent
+        self.children = []
+        self.symbols = {}
+        self.locals = []
+        self.references = []  # nodes read in this scope, resolved once the whole tree is seen
+        self._resolved = {}
+        if parent is not None:
+            parent.children.append(self)
+
+    def symbol(self, name):
+        """
+        Returns the symbol bound to name in this scope, creating it.
+        """
+        symbol = self.symbols.get(name)
+        if symbol is None:
+            name = sys.intern(name)
+            symbol = self.symbols[name] = Symbol(name, self, len(self.locals))
+            self.locals.append(symbol)
+        return symbol
+
+    def resolve(self, name):
+        """
+        Returns the symbol name refers to when read in this scope: its own, else the nearest enclosing
+        scope's that binds it (skipping class bodies, as nested functions do), else a builtin one.
+        Only valid once the whole tree has been analyzed, since a name may be bound after it is read.
+        """
+        symbol = self._resolved.get(name)
+        if symbol is None:
+            symbol = self.symbols.get(name)
+            if symbol is None:
+                parent = self.parent
+                while parent.kind == CLASS_SCOPE:
+                    parent = parent.parent
+                if parent.kind == BUILTIN_SCOPE:
+                    symbol = parent.symbol(name)
+                else:
+                    symbol = parent.resolve(name)
+                    if symbol.scope.kind in _FUNCTION_SCOPES and self.kind in _FUNCTION_SCOPES:
+                        symbol.captured = True
+            self._resolved[name] = symbol
+        return symbol
+
+    def kind_of(self, symbol):
+        """
+        LOCAL, GLOBAL, FREE (bound in an enclosing function) or BUILTIN, seen from this scope.
+        """
+        owner = symbol.scope
+        if owner is self:
+            return LOCAL
+        if owner.kind == MODULE_SCOPE:
+            return GLOBAL
+        if owner.kind == BUILTIN_SCOPE:
+            return BUILTIN
+        return FREE
+
+    def __repr__(self):
+        return f"Scope({self.kind}, {len(self.locals)} symbols)"
+
+
+class ScopeTable:
+    """
+    The result of analyze_scope: the scopes of a tree and the symbol of each naming node.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.builtins = Scope(BUILTIN_SCOPE, None)
+        self.module = Scope(MODULE_SCOPE, root, self.builtins)
+        self.scopes = [self.module]  # in source order, parents first
+        self._symbols = {}  # node -> Symbol
+        self._scopes = {root: self.module}  # node -> the Scope it opens
+
+    def symbol(self, node):
+        """
+        The symbol a node defines or reads (an Identifier, Parameter, Alias, definition or except
+        handler), or None.
+        """
+        return self._symbols.get(node)
+
+    def scope(self, node):
+        """
+        The scope opened by a Module, FunctionDefinition, Lambda, ClassDefinition or comprehension node.
+        """
+        return self._scopes.get(node)
+
+    def definitions(self, node):
+        """
+        The nodes that bind the symbol of node: the def side of its def-use chain.
+        """
+        symbol = self._symbols.get(node)
+        return symbol.definitions if symbol is not None else []
+
+    def uses(self, node):
+        """
+        The nodes that read the symbol of node: the use side of its def-use chain.
+        """
+        symbol = self._symbols.get(node)
+        return symbol.uses if symbol is not None else []
+
+    def undefined(self):
+        """
+        The symbols read somewhere but bound nowhere in the tree and not builtins.
+        """
+        return [symbol for symbol in self.builtins.locals if symbol.name not in _BUILTIN_NAMES] + [
+            symbol for scope in self.scopes for symbol in scope.locals if symbol.uses and not symbol.definitions]
+
+
+def analyze_scope(root):
+    """
+    Resolves every name in the tree under root (normally the 'Module' node) and returns a ScopeTable.
+    """
+    return _ScopeBuilder(root).table
+
+
+class _ScopeBuilder(NodeVisitor):
+    """
+    Collects bindings and references scope by scope in one walk, then resolves the references.
+    Parts of a definition that run in the enclosing scope (decorators, defaults, annotations, bases,
+    the first iterable of a comprehension) are visited there before the new scope is entered.
+    """
+
+    def __init__(self, root):
+        self.table = ScopeTable(root)
+        self.scope = self.table.module
+        self._targets = {}  # Identifier -> _STORE / _UPDATE / _NAMED, for targets not reached yet
+        self.visit(root)
+        symbols = self.table._symbols
+        for scope in self.table.scopes:
+            resolve = scope.resolve
+            for node in scope.references:
+                symbol = resolve(node.value)
+                symbol.uses.append(node)
+                symbols[node] = symbol
+            scope.references = []
+
+    def _enter(self, kind, node):
+        scope = self.scope = Scope(kind, node, self.scope)
+        self.table.scopes.append(scope)
+        self.table._scopes[node] = scope
+        return scope
+
+    def _leave(self):
+        self.scope = self.scope.parent
+
+    def _bind(self, scope, name, node):
+        symbol = scope.symbol(name)
+        symbol.definitions.append(node)
+        self.table._symbols[node] = symbol
+        return symbol
+
+    def _mark(self, target, mode=_STORE):
+        # Tags the Identifiers a target binds; attributes and subscripts are reads of their parts
+        stack = [target]
+        while stack:
+            node = stack.pop()
+            if node.type is NodeType.IDENTIFIER:
+                self._targets[node] = mode
+            elif node.type in _UNPACKING:
+                stack.extend(node.children)
+
+    # Names
+
+    def visit_Identifier(self, node):
+        mode = self._targets.pop(node, None)
+        if mode is None:
+            self.scope.references.append(node)
+        elif mode == _NAMED:
+            scope = self.scope
+            while scope.kind == COMPREHENSION_SCOPE:
+                scope = scope.parent
+            self._bind(scope, node.value, node)
+        else:
+            self._bind(self.scope, node.value, node)
+            if mode == _UPDATE:
+                self.scope.references.append(node)
+
+    def visit_Global(self, node):
+        module = self.table.module
+        for name in node.children:
+            symbol = self.scope.symbols[name.value] = module.symbol(name.value)
+            self.table._symbols[name] = symbol
+        return SKIP_CHILDREN
+
+    # Targets
+
+    def visit_Assignment(self, node):
+        for target in node.children[:-1]:
+            self._mark(target)
+
+    def visit_AugmentedAssignment(self, node):
+        self._mark(node.children[0], _UPDATE)
+
+    def visit_AnnotatedAssignment(self, node):
+        self._mark(node.children[0])
+
+    def visit_For(self, node):
+        self._mark(node.children[0])
+
+    def visit_WithItem(self, node):
+        if len(node.children) > 1:
+            self._mark(node.children[1])
+
+    def visit_NamedExpression(self, node):
+        self._mark(node.children[0], _NAMED)
+
+    def visit_Delete(self, node):
+        self._mark(node.children[0])
+
+    def visit_ExceptHandler(self, node):
+        if node.value is not None:
+            self._bind(self.scope, node.value, node)
+
+    def visit_Alias(self, node):
+        if node.children:
+            self._mark(node.children[0])
+        elif node.value != '*':
+            self._bind(self.scope, node.value.lstrip('.').split('.')[0], node)
+
+    # Scopes
+
+    def visit_FunctionDefinition(self, node):
+        self._bind(self.scope, node.value, node)
+        parameters = node.children[0]
+        self._visit_defaults(parameters)
+        for child in node.children[1:-1]:  # Returns
+            self.visit(child)
+        self._enter(FUNCTION_SCOPE, node)
+        self._bind_parameters(parameters)
+        self.visit(node.children[-1])
+        self._leave()
+        return SKIP_CHILDREN
+
+    def visit_Lambda(self, node):
+        parameters, body = node.children
+        self._visit_defaults(parameters)
+        self._enter(LAMBDA_SCOPE, node)
+        self._bind_parameters(parameters)
+        self.visit(body)
+        self._leave()
+        return SKIP_CHILDREN
+
+    def visit_ClassDefinition(self, node):
+        self._bind(self.scope, node.value, node)
+        bases, block = node.children
+        self.visit(bases)
+        self._enter(CLASS_SCOPE, node)
+        self.visit(block)
+        self._leave()
+        return SKIP_CHILDREN
+
+    def _visit_defaults(self, parameters):
+        for parameter in parameters.children:
+            for child in parameter.children:
+                self.visit(child)
+
+    def _bind_parameters(self, parameters):
+        for parameter in parameters.children:
+            name = parameter.value.lstrip('*')
+            if name and name != '/':
+                self._bind(self.scope, name, parameter).parameter = True
+
+    def _visit_comprehension(self, node):
+        children = node.children
+        clauses = [child for child in children if child.type is NodeType.COMPREHENSION_CLAUSE]
+        self.visit(clauses[0].children[1])  # the outermost iterable is evaluated outside
+        self._enter(COMPREHENSION_SCOPE, node)
+        for index, clause in enumerate(clauses):
+            target, iterable = clause.children[:2]
+            self._mark(target)
+            self.visit(target)
+            if index:
+                self.visit(iterable)
+            for condition in clause.children[2:]:
+                self.visit(condition)
+        for child in children[:len(children) - len(clauses)]:
+            self.visit(child)
+        self._leave()
+        return SKIP_CHILDREN
+
+    visit_ListComprehension = _visit_comprehension
+    visit_SetComprehension = _visit_comprehension
+    visit_DictComprehension = _visit_comprehension
+    visit_GeneratorExpression = _visit_comprehension
@@ -0,0 +1,357 @@
+from ast_nodes import NodeType
+
+
+# **SOURCE FROM A TREE**
+#
+# unparse(root) writes a tree back as Python source that parses to the same tree, up to layout:
+# statements one per line with four-space indentation, and parentheses wherever the precedence of an
+# operand calls for them (tuples, yields and assignment expressions are always parenthesized).
+# Literals are written as their node text. It covers every node the parser builds, so code the
+# tree was changed into (by the optimizer, say) can be handed to Python's own compiler.
+
+INDENT = '    '
+
+# Precedence of the expressions that bind looser than an atom, loosest first (the parser's powers)
+_LAMBDA = 1
+_CONDITIONAL = 2
+_NOT = 5
+_COMPARISON = 6
+_UNARY = 13
+_POWER = 14
+_ATOM = 15
+_BINARY_PRECEDENCE = {
+    'or': 3, 'and': 4,
+    '|': 7, '^': 8, '&': 9, '<<': 10, '>>': 10, '+': 11, '-': 11,
+    '*': 12, '/': 12, '//': 12, '%': 12, '@': 12, '**': _POWER,
+}
+
+
+def unparse(root):
+    """
+    Returns Python source for the tree under root: a 'Module' node or any statement or expression.
+    """
+    writer = _SourceWriter()
+    if root.type is NodeType.MODULE:
+        writer.statements(root.children, 0)
+    elif hasattr(writer, f'_statement_{root.type}') or hasattr(writer, f'_text_{root.type}'):
+        writer.statement(root, 0)
+    else:
+        return writer.expression(root)
+    return ''.join(writer.lines)
+
+
+class _SourceWriter:
+
+    def __init__(self):
+        self.lines = []
+
+    # Statements
+
+    def statements(self, statements, depth):
+        for statement in statements:
+            self.statement(statement, depth)
+
+    def statement(self, node, depth):
+        text = getattr(self, f'_text_{node.type}', None)
+        if text is not None:
+            self._line(depth, text(node))  # a simple statement
+        else:
+            getattr(self, f'_statement_{node.type}')(node, depth)
+
+    def _line(self, depth, text):
+        self.lines.append(f"{INDENT * depth}{text}\n")
+
+    def _block(self, block, depth):
+        if block.children:
+            self.statements(block.children, depth + 1)
+        else:
+            self._line(depth + 1, 'pass')
+
+    def _statement_FunctionDefinition(self, node, depth):
+        parameters = self._parameters(node.children[0])
+        returns = ''
+        if node.children[1].type is NodeType.RETURNS:
+            returns = f" -> {self.expression(node.children[1].children[0])}"
+        self._line(depth, f"def {node.value}({parameters}){returns}:")
+        self._block(node.children[-1], depth)
+
+    def _statement_ClassDefinition(self, node, depth):
+        bases, block = node.children
+        arguments = f"({self._arguments(bases.children)})" if bases.children else ''
+        self._line(depth, f"class {node.value}{arguments}:")
+        self._block(block, depth)
+
+    def _statement_Decorated(self, node, depth):
+        for decorator in node.children[:-1]:
+            self._line(depth, f"@{self.expression(decorator)}")
+        self.statement(node.children[-1], depth)
+
+    def _statement_If(self, node, depth, keyword='if'):
+        self._line(depth, f"{keyword} {self.expression(node.children[0])}:")
+        self._block(node.children[1], depth)
+        if len(node.children) > 2:
+            orelse = node.children[2]
+            if orelse.type is NodeType.IF:
+                self._statement_If(orelse, depth, 'elif')
+            else:
+                self._line(depth, 'else:')
+                self._block(orelse, depth)
+
+    def _statement_While(self, node, depth):
+        self._line(depth, f"while {self.expression(node.children[0])}:")
+        self._block(node.children[1], depth)
+        if len(node.children) > 2:
+            self._line(depth, 'else:')
+            self._block(node.children[2], depth)
+
+    def _statement_For(self, node, depth):
+        target, iterable = node.children[:2]
+        self._line(depth, f"for {self._target(target)} in {self._expression_list(iterable)}:")
+        self._block(node.children[2], depth)
+        if len(node.children) > 3:
+            self._line(depth, 'else:')
+            self._block(node.children[3], depth)
+
+    def _statement_Try(self, node, depth):
+        self._line(depth, 'try:')
+        self._block(node.children[0], depth)
+        for clause in node.children[1:]:
+            if clause.type is NodeType.EXCEPT_HANDLER:
+                header = 'except'
+                if len(clause.children) > 1:
+                    header += f" {self.expression(clause.children[0])}"
+                    if clause.value is not None:
+                        header += f" as {clause.value}"
+                self._line(depth, header + ':')
+            else:
+                self._line(depth, 'else:' if clause.type is NodeType.ELSE else 'finally:')
+            self._block(clause.children[-1], depth)
+
+    def _statement_With(self, node, depth):
+        items = []
+        for item in node.children[:-1]:
+            text = self.expression(item.children[0])
+            if len(item.children) > 1:
+                text += f" as {self.expression(item.children[1])}"
+            items.append(text)
+        self._line(depth, f"with {', '.join(items)}:")
+        self._block(node.children[-1], depth)
+
+    def _text_ExpressionStatement(self, node):
+        return self._expression_list(node.children[0])
+
+    def _text_Assignment(self, node):
+        targets = ''.join(f"{self._target(target)} = " for target in node.children[:-1])
+        return targets + self._expression_list(node.children[-1])
+
+    def _text_AugmentedAssignment(self, node):
+        target, value = node.children
+        return f"{self._target(target)} {node.value} {self._expression_list(value)}"
+
+    def _text_AnnotatedAssignment(self, node):
+        text = f"{self._target(node.children[0])}: {self.expression(node.children[1])}"
+        if len(node.children) > 2:
+            text += f" = {self._expression_list(node.children[2])}"
+        return text
+
+    def _text_Return(self, node):
+        return f"return {self._expression_list(node.children[0])}" if node.children else 'return'
+
+    def _text_Raise(self, node):
+        if not node.children:
+            return 'raise'
+        text = f"raise {self.expression(node.children[0])}"
+        if len(node.children) > 1:
+            text += f" from {self.expression(node.children[1])}"
+        return text
+
+    def _text_Pass(self, node):
+        return 'pass'
+
+    def _text_Break(self, node):
+        return 'break'
+
+    def _text_Continue(self, node):
+        return 'continue'
+
+    def _text_Global(self, node):
+        return f"global {', '.join(name.value for name in node.children)}"
+
+    def _text_Delete(self, node):
+        return f"del {self._target(node.children[0])}"
+
+    def _text_Assert(self, node):
+        text = f"assert {self.expression(node.children[0])}"
+        if len(node.children) > 1:
+            text += f", {self.expression(node.children[1])}"
+        return text
+
+    def _text_Import(self, node):
+        return f"import {', '.join(self._alias(alias) for alias in node.children)}"
+
+    def _text_ImportFrom(self, node):
+        return f"from {node.value} import {', '.join(self._alias(alias) for alias in node.children)}"
+
+    def _alias(self, alias):
+        return f"{alias.value} as {alias.children[0].value}" if alias.children else alias.value
+
+    # Expressions
+
+    def expression(self, node, precedence=0):
+        """
+        The source of an expression, parenthesized if it binds looser than precedence.
+        """
+        text, own = getattr(self, f'_expression_{node.type}')(node)
+        return f"({text})" if own < precedence else text
+
+    def _expression_list(self, node):
+        # Where Python takes a bare tuple (statement values, for targets), a tuple needs no parentheses
+        if node.type is NodeType.TUPLE and node.children:
+            return self._elements(node.children, trailing=True)
+        return self.expression(node)
+
+    _target = _expression_list
+
+    def _elements(self, nodes, trailing=False):
+        text = ', '.join(self.expression(node) for node in nodes)
+        return text + ',' if trailing and len(nodes) == 1 else text
+
+    def _expression_Identifier(self, node):
+        return node.value, _ATOM
+
+    def _literal(self, node):
+        # A folded negative number is written with its sign, which binds like a unary minus
+        text = node.value
+        return text, _UNARY if text.startswith('-') else _ATOM
+
+    _expression_Number = _literal
+    _expression_Float = _literal
+    _expression_String = _literal
+    _expression_Constant = _literal
+
+    def _expression_BinaryOperation(self, node):
+        left, right = node.children
+        precedence = _BINARY_PRECEDENCE[node.value]
+        if node.value == '**':
+            # Right associative, and its right operand may be a unary operation
+            return f"{self.expression(left, _POWER + 1)} ** {self.expression(right, _UNARY)}", _POWER
+        return f"{self.expression(left, precedence)} {node.value} {self.expression(right, precedence + 1)}", precedence
+
+    _expression_BooleanOperation = _expression_BinaryOperation
+
+    def _expression_UnaryOperation(self, node):
+        if node.value == 'not':
+            return f"not {self.expression(node.children[0], _NOT)}", _NOT
+        return f"{node.value}{self.expression(node.children[0], _UNARY)}", _UNARY
+
+    def _expression_Comparison(self, node):
+        operands = [self.expression(operand, _COMPARISON + 1) for operand in node.children]
+        parts = [operands[0]]
+        for operator_, operand in zip(node.value, operands[1:]):
+            parts.append(f" {operator_} {operand}")
+        return ''.join(parts), _COMPARISON
+
+    def _expression_Conditional(self, node):
+        body, test, orelse = node.children
+        text = (f"{self.expression(body, _CONDITIONAL + 1)} if {self.expression(test, _CONDITIONAL + 1)} "
+                f"else {self.expression(orelse, _LAMBDA)}")
+        return text, _CONDITIONAL
+
+    def _expression_Lambda(self, node):
+        parameters, body = node.children
+        parameters = self._parameters(parameters)
+        return f"lambda {parameters}: {self.expression(body)}" if parameters else f"lambda: {self.expression(body)}", _LAMBDA
+
+    def _expression_NamedExpression(self, node):
+        target, value = node.children
+        return f"({target.value} := {self.expression(value)})", _ATOM
+
+    def _expression_Yield(self, node):
+        if not node.children:
+            return '(yield)', _ATOM
+        return f"(yield {self._expression_list(node.children[0])})", _ATOM
+
+    def _expression_YieldFrom(self, node):
+        return f"(yield from {self.expression(node.children[0])})", _ATOM
+
+    def _expression_Starred(self, node):
+        return f"{node.value}{self.expression(node.children[0], _BINARY_PRECEDENCE['|'])}", _ATOM
+
+    def _expression_Attribute(self, node):
+        owner = node.children[0]
+        # '1.real' would read as a float: a number owner is always parenthesized
+        text = self.expression(owner, _ATOM + 1 if owner.type is NodeType.NUMBER else _ATOM)
+        return f"{text}.{node.value}", _ATOM
+
+    def _expression_Subscript(self, node):
+        container, index = node.children
+        if index.type is NodeType.TUPLE and index.children:
+            index = self._elements(index.children, trailing=True)
+        else:
+            index = self.expression(index)
+        return f"{self.expression(container, _ATOM)}[{index}]", _ATOM
+
+    def _expression_Slice(self, node):
+        return ':'.join('' if part.type is NodeType.EMPTY else self.expression(part) for part in node.children), _ATOM
+
+    def _expression_Call(self, node):
+        function = node.children[0]
+        return f"{self.expression(function, _ATOM)}({self._arguments(node.children[1:])})", _ATOM
+
+    def _arguments(self, arguments):
+        return ', '.join(f"{argument.value}={self.expression(argument.children[0])}"
+                         if argument.type is NodeType.KEYWORD_ARGUMENT else self.expression(argument)
+                         for argument in arguments)
+
+    def _parameters(self, parameters):
+        texts = []
+        for parameter in parameters.children:
+            text = parameter.value
+            for child in parameter.children:
+                if child.type is NodeType.ANNOTATION:
+                    text += f": {self.expression(child.children[0])}"
+                else:
+                    text += f"={self.expression(child)}"
+            texts.append(text)
+        return ', '.join(texts)
+
+    def _expression_Tuple(self, node):
+        return f"({self._elements(node.children, trailing=True)})", _ATOM
+
+    def _expression_List(self, node):
+        return f"[{self._elements(node.children)}]", _ATOM
+
+    def _expression_Set(self, node):
+        return f"{{{self._elements(node.children)}}}", _ATOM
+
+    def _expression_Dict(self, node):
+        return f"{{{self._elements(node.children)}}}", _ATOM
+
+    def _expression_KeyValue(self, node):
+        key, value = node.children
+        return f"{self.expression(key, _LAMBDA + 1)}: {self.expression(value)}", _ATOM
+
+    def _expression_DictUnpack(self, node):
+        return f"**{self.expression(node.children[0], _BINARY_PRECEDENCE['|'])}", _ATOM
+
+    def _comprehension(self, node, opening, closing):
+        children = node.children
+        clauses = [child for child in children if child.type is NodeType.COMPREHENSION_CLAUSE]
+        parts = [self.expression(children[0])]
+        for clause in clauses:
+            target, iterable = clause.children[:2]
+            parts.append(f"for {self._target(target)} in {self.expression(iterable, _CONDITIONAL + 1)}")
+            for condition in clause.children[2:]:
+                parts.append(f"if {self.expression(condition.children[0], _CONDITIONAL + 1)}")
+        return f"{opening}{' '.join(parts)}{closing}", _ATOM
+
+    def _expression_ListComprehension(self, node):
+        return self._comprehension(node, '[', ']')
+
+    def _expression_SetComprehension(self, node):
+        return self._comprehension(node, '{', '}')
+
+    _expression_DictComprehension = _expression_SetComprehension
+
+    def _expression_GeneratorExpression(self, node):
+        return self._comprehension(node, '(', ')')
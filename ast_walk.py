@@ -0,0 +1,183 @@
+import sys
+
+
+# **ITERATIVE AST WALKERS**
+#
+# Everything here keeps its own stack of child iterators instead of recursing, so trees of any depth
+# and size are walked in linear time without touching the interpreter's recursion limit. The walkers
+# only use node.type, node.value and node.children, so they work on ASTNode trees and arena views alike.
+
+PRE_ORDER = 'pre'
+POST_ORDER = 'post'
+ENTER = 'enter'
+LEAVE = 'leave'
+SKIP_CHILDREN = object()  # returned by a visit_ method to skip the node's children
+
+PRINT_INDENT = 2
+_WRITE_BATCH = 4096  # lines per write when printing
+
+
+def walk(root, order=PRE_ORDER):
+    """
+    Yields every node of the tree under root (root included), parents before their children
+    (PRE_ORDER) or after them (POST_ORDER), children in order.
+    """
+    if order == PRE_ORDER:
+        return _pre_order(root)
+    if order == POST_ORDER:
+        return _post_order(root)
+    raise ValueError(f"Unknown walk order: {order!r}")
+
+
+def _pre_order(root):
+    yield root
+    stack = [iter(root.children)]
+    while stack:
+        for node in stack[-1]:
+            yield node
+            if node.children:
+                stack.append(iter(node.children))
+                break
+        else:
+            stack.pop()
+
+
+def _post_order(root):
+    stack = [(root, iter(root.children))]
+    while stack:
+        for node in stack[-1][1]:
+            if node.children:
+                stack.append((node, iter(node.children)))
+                break
+            yield node
+        else:
+            yield stack.pop()[0]
+
+
+def walk_depth(root):
+    """
+    Yields (node, depth) pairs in pre-order, the root at depth 0.
+    """
+    yield root, 0
+    stack = [iter(root.children)]
+    while stack:
+        for node in stack[-1]:
+            yield node, len(stack)
+            if node.children:
+                stack.append(iter(node.children))
+                break
+        else:
+            stack.pop()
+
+
+def walk_events(root):
+    """
+    Yields (ENTER, node) when a node is reached and (LEAVE, node) once all its children are done.
+    """
+    yield ENTER, root
+    stack = [(root, iter(root.children))]
+    while stack:
+        for node in stack[-1][1]:
+            yield ENTER, node
+            stack.append((node, iter(node.children)))
+            break
+        else:
+            yield LEAVE, stack.pop()[0]
+
+
+# **VISITOR WITH PER-CLASS DISPATCH CACHE**
+
+class NodeVisitor:
+    """
+    Base class for tree passes. visit(root) walks the tree iteratively and calls, for every node,
+    visit_<Type>(node) when the node is entered and leave_<Type>(node) when its subtree is done,
+    with <Type> the node type name ('visit_FunctionDefinition'). Types without a method of their own
+    go to generic_visit / generic_leave, which do nothing. A visit_ method returning SKIP_CHILDREN
+    prunes the node's subtree (its leave_ method is not called either).
+    The method lookups are resolved once per visitor class and node type, and then cached.
+    """
+
+    _visit_handlers = {}
+    _leave_handlers = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._visit_handlers = {}
+        cls._leave_handlers = {}
+
+    @classmethod
+    def _handlers(cls, type_):
+        handlers = cls._visit_handlers.get(type_)
+        if handlers is None:
+            visit = getattr(cls, f'visit_{type_}', cls.generic_visit)
+            leave = getattr(cls, f'leave_{type_}', None)
+            if leave is None and cls.generic_leave is not NodeVisitor.generic_leave:
+                leave = cls.generic_leave
+            handlers = cls._visit_handlers[type_] = visit
+            cls._leave_handlers[type_] = leave
+        return handlers, cls._leave_handlers[type_]
+
+    def visit(self, root):
+        """
+        Walks the tree under root, calling the visit_ and leave_ methods of every node.
+        """
+        visit_handlers = self._visit_handlers
+        leave_handlers = self._leave_handlers
+        lookup = self._handlers
+        stack = [(None, iter((root,)))]
+        while stack:
+            for node in stack[-1][1]:
+                type_ = node.type
+                visit = visit_handlers.get(type_)
+                if visit is None:
+                    visit, leave = lookup(type_)
+                else:
+                    leave = leave_handlers[type_]
+                if visit(self, node) is SKIP_CHILDREN:
+                    continue
+                if node.children or leave is not None:
+                    stack.append((node if leave is not None else None, iter(node.children)))
+                    break
+            else:
+                node = stack.pop()[0]
+                if node is not None:
+                    leave_handlers[node.type](self, node)
+
+    def generic_visit(self, node):
+        pass
+
+    def generic_leave(self, node):
+        pass
+
+
+# **STREAMING PRINTER**
+
+def format_lines(root, depth=0):
+    """
+    Yields the lines of the indented "Type: value" dump of a tree, one per node.
+    """
+    for node, level in walk_depth(root):
+        yield f"{' ' * (depth + level * PRINT_INDENT)}{node.type}: {node.value}\n"
+
+
+def format_ast(root, depth=0):
+    """
+    Returns the indented dump of a tree as one string, the format of ASTNode.__repr__.
+    """
+    return ''.join(format_lines(root, depth))
+
+
+def write_ast(root, output=None, depth=0):
+    """
+    Writes the indented dump of a tree to a text file object (stdout by default) while walking it,
+    so the whole dump is never held in memory.
+    """
+    if output is None:
+        output = sys.stdout
+    batch = []
+    for line in format_lines(root, depth):
+        batch.append(line)
+        if len(batch) >= _WRITE_BATCH:
+            output.writelines(batch)
+            batch.clear()
+    output.writelines(batch)
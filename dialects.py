@@ -0,0 +1,173 @@
+import os
+import re
+
+from Huge_Lexer import TOKEN_PATTERNS as PYTHON_TOKEN_PATTERNS
+from lexing_engine import compile_engine, map_source
+from token_list import TOKEN_PATTERNS as C_TOKEN_PATTERNS
+
+
+# A dialect pragma in a comment on the first or second line, like Python's coding cookie:
+#     # dialect: python        // dialect: c        /* dialect: c */
+PRAGMA = re.compile(r'^[ \t\f]*(?:#|//|/\*).*?\bdialect[:=][ \t]*([-\w.]+)', re.MULTILINE)
+DEFAULT_DIALECT = 'python'
+
+
+# **DIALECT REGISTRY WITH SHARED COMPILED LEXERS**
+
+class Dialect:
+    """
+    A named token vocabulary. Its lexing engines are compiled on first use and then kept, so every
+    source of the dialect is lexed by the same engine, without copying the pattern table or even
+    looking it up in the engine cache again.
+    """
+
+    def __init__(self, name, token_patterns, extensions=(), skip=('WHITESPACE',)):
+        self.name = name
+        self.token_patterns = token_patterns
+        self.extensions = tuple(extensions)
+        self.skip = tuple(skip)
+        self._engines = [None, None]  # str engine, bytes engine
+
+    def engine(self, binary=False):
+        """
+        Returns the compiled LexerEngine of the dialect for str (or bytes) sources.
+        """
+        engine = self._engines[binary]
+        if engine is None:
+            engine = self._engines[binary] = compile_engine(self.token_patterns, self.skip, binary)
+        return engine
+
+    def lexer(self, source):
+        """
+        Returns a lexer for one source, sharing the dialect's compiled engine.
+        """
+        return SourceLexer(self, source)
+
+    def __repr__(self):
+        return f"Dialect({self.name!r})"
+
+
+class SourceLexer:
+    """
+    Lightweight per-source lexer handed out by a Dialect: it only holds the source and its tokens.
+    """
+
+    __slots__ = ('dialect', 'source', 'path', 'tokens')
+
+    def __init__(self, dialect, source, path=None):
+        self.dialect = dialect
+        self.source = source
+        self.path = path
+        self.tokens = None
+
+    def tokenize(self, cache=None):
+        """
+        Tokenizes the source into a TokenTable (unexpected characters become ERROR tokens).
+        With a TokenCache, an unchanged source is loaded from the cache instead of being lexed.
+        """
+        if cache is not None:
+            self.tokens = cache.lex_table(self.source, self.dialect.token_patterns, self.dialect.skip)
+        else:
+            self.tokens = self.dialect.engine(not isinstance(self.source, str)).lex_table(self.source)
+        return self.tokens
+
+    def update(self, edit_offset, removed_len, inserted_text):
+        """
+        Applies an edit to the source and re-lexes only the tokens around it.
+        For a memory-mapped or bytes source (open_source(..., binary=True)), offsets are in bytes and
+        inserted_text is encoded as UTF-8; the edited source is then a bytes copy, the file itself is
+        left alone.
+        """
+        binary = not isinstance(self.source, str)
+        if binary and isinstance(inserted_text, str):
+            inserted_text = inserted_text.encode('utf-8')
+        self.source = self.source[:edit_offset] + inserted_text + self.source[edit_offset + removed_len:]
+        if self.tokens is None:
+            return self.tokenize()
+        self.dialect.engine(binary).relex(self.tokens, self.source, edit_offset, removed_len, len(inserted_text))
+        return self.tokens
+
+    def token_location(self, index):
+        """
+        Returns the (line, column) where the token at index starts.
+        """
+        return self.tokens.line_column(index)
+
+    def __repr__(self):
+        return f"SourceLexer({self.dialect.name!r}, {self.path or len(self.source)!r})"
+
+
+DIALECTS = {}
+_EXTENSIONS = {}
+
+
+def register_dialect(name, token_patterns, extensions=(), skip=('WHITESPACE',)):
+    """
+    Registers a dialect under a name and its file extensions, replacing any dialect of that name.
+    """
+    dialect = Dialect(name, token_patterns, extensions, skip)
+    DIALECTS[name] = dialect
+    for extension in dialect.extensions:
+        _EXTENSIONS[extension.lower()] = dialect
+    return dialect
+
+
+def get_dialect(name):
+    """
+    Returns a registered dialect, raising ValueError for unknown names.
+    """
+    try:
+        return DIALECTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown dialect: {name} (known: {', '.join(sorted(DIALECTS))})") from None
+
+
+def detect_dialect(path=None, source=None, default=DEFAULT_DIALECT):
+    """
+    Picks the dialect of a source: a dialect pragma in a comment on its first two lines wins,
+    then the file extension, then the default dialect.
+    """
+    if source is not None:
+        head = source[:512]
+        if not isinstance(head, str):
+            head = bytes(head).decode('utf-8', 'replace')
+        pragma = PRAGMA.search('\n'.join(head.split('\n', 2)[:2]))
+        if pragma is not None:
+            return get_dialect(pragma.group(1).lower())
+    if path is not None:
+        dialect = _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if dialect is not None:
+            return dialect
+    return get_dialect(default)
+
+
+def open_source(path, dialect=None, binary=False):
+    """
+    Returns a SourceLexer for a file, detecting its dialect unless one is given. Binary mode lexes
+    the memory-mapped file in place instead of reading and decoding it.
+    """
+    if binary:
+        source = map_source(path)
+    else:
+        with open(path, encoding='utf-8') as source_file:
+            source = source_file.read()
+    if dialect is None:
+        dialect = detect_dialect(path, source)
+    elif isinstance(dialect, str):
+        dialect = get_dialect(dialect)
+    return SourceLexer(dialect, source, path)
+
+
+def lex_files(paths, dialect=None, binary=False, cache=None):
+    """
+    Lexes a batch of files, possibly of mixed dialects, and yields (path, SourceLexer) pairs with
+    the tokens filled in. Each dialect is compiled at most once for the whole batch.
+    """
+    for path in paths:
+        lexer = open_source(path, dialect, binary)
+        lexer.tokenize(cache)
+        yield path, lexer
+
+
+register_dialect('python', PYTHON_TOKEN_PATTERNS, ('.py', '.pyw', '.pyi'))
+register_dialect('c', C_TOKEN_PATTERNS, ('.c', '.h', '.cc', '.cpp', '.cxx', '.hh', '.hpp', '.java'))
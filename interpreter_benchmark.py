@@ -0,0 +1,316 @@
+import argparse
+import builtins
+import json
+import operator
+import sys
+import time
+
+from AST import AstronomicalAST
+from ast_compiler import compile_ast
+from ast_scope import analyze_scope
+
+
+# **EXECUTION ENGINE BENCHMARK**
+#
+# Runs loop-heavy programs with the closure compiler behind execute_ast and with a plain tree-walking
+# interpreter that dispatches on the node type at every visit and keeps variables in dicts, checks
+# that both compute the same module variables, and reports the speedup. Compilation is timed apart.
+
+PROGRAMS = {
+    'nested_loops': """
+total = 0
+for i in range(300):
+    for j in range(300):
+        if (i + j) % 3 == 0:
+            total += i * j
+""",
+    'while_fibonacci': """
+def fibonacci(n):
+    a, b = 0, 1
+    i = 0
+    while i < n:
+        a, b = b, a + b
+        i += 1
+    return a
+
+result = 0
+for k in range(3000):
+    result = (result + fibonacci(30)) % 1000003
+""",
+    'sieve': """
+limit = 60000
+flags = [True] * (limit + 1)
+flags[0] = False
+flags[1] = False
+p = 2
+while p * p <= limit:
+    if flags[p]:
+        m = p * p
+        while m <= limit:
+            flags[m] = False
+            m += p
+    p += 1
+count = 0
+for flag in flags:
+    if flag:
+        count += 1
+""",
+    'calls': """
+def add(a, b):
+    return a + b
+
+def scale(value, factor):
+    if value > 1000000:
+        return value // factor
+    return value * factor
+
+acc = 0
+for i in range(60000):
+    acc = scale(add(acc, i), 1)
+""",
+    'recursion': """
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+answer = fib(20)
+""",
+}
+
+
+# A naive interpreter, the baseline: recursive evaluation with getattr dispatch on every node
+
+class _Return(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class _Break(Exception):
+    pass
+
+
+class _Continue(Exception):
+    pass
+
+
+class TreeWalkingInterpreter:
+    """
+    Interprets the subset of the language the benchmark programs use by walking the tree on every
+    execution, with variables in dicts (the function's locals, then the module's, then builtins).
+    """
+
+    BINARY = {
+        '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv,
+        '//': operator.floordiv, '%': operator.mod, '**': operator.pow, '<': operator.lt, '<=': operator.le,
+        '>': operator.gt, '>=': operator.ge, '==': operator.eq, '!=': operator.ne,
+        '+=': operator.iadd, '-=': operator.isub, '*=': operator.imul, '%=': operator.imod,
+    }
+
+    def __init__(self, root):
+        self.root = root
+        self.globals = {}
+
+    def run(self):
+        self.globals = {}
+        self.execute_block(self.root.children, self.globals)
+        return {name: value for name, value in self.globals.items() if not callable(value)}
+
+    def execute_block(self, statements, env):
+        for statement in statements:
+            getattr(self, f'exec_{statement.type}')(statement, env)
+
+    def evaluate(self, node, env):
+        return getattr(self, f'eval_{node.type}')(node, env)
+
+    def lookup(self, name, env):
+        if name in env:
+            return env[name]
+        if name in self.globals:
+            return self.globals[name]
+        return getattr(builtins, name)
+
+    def assign(self, target, value, env):
+        if target.type == 'Identifier':
+            env[target.value] = value
+        elif target.type == 'Subscript':
+            self.evaluate(target.children[0], env)[self.evaluate(target.children[1], env)] = value
+        else:
+            for element, item in zip(target.children, value):
+                self.assign(element, item, env)
+
+    def exec_ExpressionStatement(self, node, env):
+        self.evaluate(node.children[0], env)
+
+    def exec_Assignment(self, node, env):
+        value = self.evaluate(node.children[-1], env)
+        for target in node.children[:-1]:
+            self.assign(target, value, env)
+
+    def exec_AugmentedAssignment(self, node, env):
+        target, value = node.children
+        current = self.evaluate(target, env)
+        self.assign(target, self.BINARY[node.value](current, self.evaluate(value, env)), env)
+
+    def exec_If(self, node, env):
+        if self.evaluate(node.children[0], env):
+            self.execute_block(node.children[1].children, env)
+        elif len(node.children) > 2:
+            orelse = node.children[2]
+            if orelse.type == 'If':
+                self.exec_If(orelse, env)
+            else:
+                self.execute_block(orelse.children, env)
+
+    def exec_While(self, node, env):
+        while self.evaluate(node.children[0], env):
+            try:
+                self.execute_block(node.children[1].children, env)
+            except _Break:
+                break
+            except _Continue:
+                continue
+
+    def exec_For(self, node, env):
+        target, iterable, block = node.children[:3]
+        for item in self.evaluate(iterable, env):
+            self.assign(target, item, env)
+            try:
+                self.execute_block(block.children, env)
+            except _Break:
+                break
+            except _Continue:
+                continue
+
+    def exec_Break(self, node, env):
+        raise _Break()
+
+    def exec_Continue(self, node, env):
+        raise _Continue()
+
+    def exec_Pass(self, node, env):
+        pass
+
+    def exec_Return(self, node, env):
+        raise _Return(self.evaluate(node.children[0], env) if node.children else None)
+
+    def exec_FunctionDefinition(self, node, env):
+        names = [parameter.value for parameter in node.children[0].children]
+        body = node.children[-1].children
+
+        def function(*args):
+            local = dict(zip(names, args))
+            try:
+                self.execute_block(body, local)
+            except _Return as signal:
+                return signal.value
+        env[node.value] = function
+
+    def eval_Identifier(self, node, env):
+        return self.lookup(node.value, env)
+
+    def eval_Number(self, node, env):
+        return int(node.value, 0)
+
+    def eval_Float(self, node, env):
+        return float(node.value)
+
+    def eval_String(self, node, env):
+        return node.value[1:-1]
+
+    def eval_Constant(self, node, env):
+        return {'None': None, 'True': True, 'False': False}[node.value]
+
+    def eval_BinaryOperation(self, node, env):
+        left, right = node.children
+        return self.BINARY[node.value](self.evaluate(left, env), self.evaluate(right, env))
+
+    def eval_Comparison(self, node, env):
+        operands = [self.evaluate(operand, env) for operand in node.children]
+        return all(self.BINARY[operator_](left, right)
+                   for operator_, left, right in zip(node.value, operands, operands[1:]))
+
+    def eval_BooleanOperation(self, node, env):
+        left = self.evaluate(node.children[0], env)
+        if node.value == 'and':
+            return left and self.evaluate(node.children[1], env)
+        return left or self.evaluate(node.children[1], env)
+
+    def eval_UnaryOperation(self, node, env):
+        operand = self.evaluate(node.children[0], env)
+        return not operand if node.value == 'not' else -operand if node.value == '-' else operand
+
+    def eval_Call(self, node, env):
+        function = self.evaluate(node.children[0], env)
+        return function(*[self.evaluate(argument, env) for argument in node.children[1:]])
+
+    def eval_Subscript(self, node, env):
+        return self.evaluate(node.children[0], env)[self.evaluate(node.children[1], env)]
+
+    def eval_List(self, node, env):
+        return [self.evaluate(element, env) for element in node.children]
+
+    def eval_Tuple(self, node, env):
+        return tuple(self.evaluate(element, env) for element in node.children)
+
+
+def run_case(name, repeat):
+    """
+    Runs one program with both engines and returns the best times.
+    """
+    ast = AstronomicalAST(PROGRAMS[name])
+    root = ast.parse()
+
+    start = time.perf_counter()
+    program = compile_ast(root, analyze_scope(root))
+    compile_time = time.perf_counter() - start
+
+    compiled_best = naive_best = None
+    compiled_result = naive_result = None
+    interpreter = TreeWalkingInterpreter(root)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compiled_result = program.run()
+        elapsed = time.perf_counter() - start
+        compiled_best = elapsed if compiled_best is None else min(compiled_best, elapsed)
+
+        start = time.perf_counter()
+        naive_result = interpreter.run()
+        elapsed = time.perf_counter() - start
+        naive_best = elapsed if naive_best is None else min(naive_best, elapsed)
+
+    compiled_values = {key: value for key, value in compiled_result.items() if not callable(value)}
+    if compiled_values != naive_result:
+        raise AssertionError(f"{name}: the engines disagree: {compiled_values} != {naive_result}")
+    return {
+        'program': name,
+        'compile_seconds': compile_time,
+        'compiled_seconds': compiled_best,
+        'tree_walking_seconds': naive_best,
+        'speedup': naive_best / compiled_best,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the closure compiler against a tree-walking interpreter.")
+    parser.add_argument('--programs', nargs='+', choices=sorted(PROGRAMS), help="programs to run")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per program, the best one counts")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.programs or PROGRAMS:
+        result = run_case(name, args.repeat)
+        results.append(result)
+        print(f"{name:>16}  compile {result['compile_seconds'] * 1000:7.2f} ms  "
+              f"closures {result['compiled_seconds']:7.3f} s  tree walking {result['tree_walking_seconds']:7.3f} s  "
+              f"{result['speedup']:5.1f}x")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'python': sys.version.split()[0], 'results': results}, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
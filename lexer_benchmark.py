@@ -0,0 +1,237 @@
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# **LEXER THROUGHPUT BENCHMARK SUITE**
+#
+# Runs every lexer implementation over deterministic generated corpora and reports tokens/sec,
+# MB/sec, peak RSS and retained allocations per token. Each case runs in a fresh process so that
+# peak RSS belongs to that case alone. Results are written as JSON and can be compared with a stored
+# baseline; any throughput regression beyond the tolerance makes the run fail.
+
+SIZES = [1 << 10, 10 << 10, 100 << 10, 1 << 20]
+FULL_SIZES = SIZES + [10 << 20, 100 << 20]
+DEFAULT_TOLERANCE = 0.10
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load_module(filename, name):
+    # Some lexers live in files whose names are not valid module names
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+    return sys.modules[name]
+
+
+def python_corpus(size, seed=0):
+    """
+    Generates about size characters of Python-like source that every Python-dialect lexer accepts.
+    """
+    rng = random.Random(seed)
+    names = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz_') for _ in range(rng.randint(1, 10)))
+             for _ in range(200)]
+    templates = [
+        "def {0}({1}, {2}):\n    # compute {0}\n    return {1} + {2} * {3}\n\n",
+        "{0} = {3}\n{1} = {4}\n{2} = '{0} and {1}'\n",
+        "while {0} > {1}:\n    {0} -= {3}\n",
+        "if {0} == {1}:\n    {2} = {0}({1}, [{3}, {4}])\nelse:\n    {2} = \"{1}\"\n",
+        "for {0} in {1}:\n    {2}.{0}({3})\n",
+    ]
+    parts = []
+    length = 0
+    while length < size:
+        part = rng.choice(templates).format(rng.choice(names), rng.choice(names), rng.choice(names),
+                                            rng.randint(0, 10 ** 6), f"{rng.random() * 100:.3f}")
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)[:size]
+
+
+def c_corpus(size, seed=0):
+    """
+    Generates about size characters of C-like source within the Matching_Rules vocabulary.
+    """
+    rng = random.Random(seed)
+    names = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz_') for _ in range(rng.randint(1, 10)))
+             for _ in range(200)]
+    templates = [
+        "int {0} = {3};\n",
+        "{0} = {1} * ({2} + {3}) / {4};\n",
+        "void {0}(int {1}, float {2}) {{\n    {1} = {1} - {3};\n}}\n",
+        "{0}({1}, {2}, {3});\n",
+    ]
+    parts = []
+    length = 0
+    while length < size:
+        part = rng.choice(templates).format(rng.choice(names), rng.choice(names), rng.choice(names),
+                                            rng.randint(0, 10 ** 6), rng.randint(1, 99))
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)[:size].rsplit('\n', 1)[0] + '\n'
+
+
+def _run_overpowered(source):
+    from Huge_Lexer import OverpoweredLexer
+    lexer = OverpoweredLexer(source)
+    lexer.tokenize()
+    return lexer.tokens
+
+
+def _run_enormous(source):
+    lexer = _load_module('Excessively Enormous Lexer.py', 'enormous_lexer').EnormousLexer(source)
+    lexer.tokenize()
+    return lexer.tokens
+
+
+def _run_astronomical(source):
+    from AST import AstronomicalAST
+    ast = AstronomicalAST(source)
+    ast.tokenize()
+    return ast.tokens
+
+
+def _run_lexer_implementation(source):
+    from lexer_implementation import Lexer
+    return Lexer(source).tokenize()
+
+
+def _run_regex_for_token_matching(source):
+    from regex_for_token_matching import tokenize
+    return tokenize(source)
+
+
+LEXERS = {
+    'OverpoweredLexer': (_run_overpowered, python_corpus),
+    'EnormousLexer': (_run_enormous, python_corpus),
+    'AstronomicalAST.tokenize': (_run_astronomical, python_corpus),
+    'lexer_implementation.Lexer': (_run_lexer_implementation, c_corpus),
+    'regex_for_token_matching.tokenize': (_run_regex_for_token_matching, c_corpus),
+}
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # kilobytes on Linux
+
+
+def run_case(lexer_name, size, repeat):
+    """
+    Benchmarks one lexer on one corpus size (meant to run in its own process).
+    """
+    run, corpus = LEXERS[lexer_name]
+    source = corpus(size)
+    run(source[:1024])  # imports and pattern compilation are not part of the measurement
+
+    best = None
+    for _ in range(repeat):
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        tokens = run(source)
+        elapsed = time.perf_counter() - start
+        retained = sys.getallocatedblocks() - blocks
+        count = len(tokens)
+        del tokens
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {
+        'lexer': lexer_name,
+        'size': size,
+        'tokens': count,
+        'seconds': best,
+        'tokens_per_sec': count / best if best else 0.0,
+        'mb_per_sec': size / (1 << 20) / best if best else 0.0,
+        'peak_rss': _peak_rss(),
+        'allocations_per_token': retained / count if count else 0.0,
+    }
+
+
+def run_suite(lexers=None, sizes=None, repeat=3):
+    """
+    Runs every (lexer, size) case in a fresh process and returns the list of results.
+    """
+    results = []
+    context = get_context('spawn')
+    for lexer_name in lexers or LEXERS:
+        for size in sizes or SIZES:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                result = pool.submit(run_case, lexer_name, size, repeat if size <= (1 << 20) else 1).result()
+            results.append(result)
+            print(f"{lexer_name:36} {size:>10} B  {result['tokens_per_sec']:>12,.0f} tokens/s  "
+                  f"{result['mb_per_sec']:>8.2f} MB/s  {_format_rss(result['peak_rss']):>10}  "
+                  f"{result['allocations_per_token']:>6.2f} allocs/token")
+    return results
+
+
+def _format_rss(peak_rss):
+    return 'n/a' if peak_rss is None else f"{peak_rss / (1 << 20):.1f} MB"
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares results with baseline results and returns a list of regression messages.
+    """
+    reference = {(entry['lexer'], entry['size']): entry for entry in baseline['results']}
+    regressions = []
+    for result in results:
+        expected = reference.get((result['lexer'], result['size']))
+        if expected is None:
+            continue
+        case = f"{result['lexer']} @ {result['size']} B"
+        if result['tokens'] != expected['tokens']:
+            regressions.append(f"{case}: {result['tokens']} tokens, baseline has {expected['tokens']}")
+        if result['tokens_per_sec'] < expected['tokens_per_sec'] * (1 - tolerance):
+            regressions.append(f"{case}: {result['tokens_per_sec']:,.0f} tokens/s, "
+                               f"baseline {expected['tokens_per_sec']:,.0f} tokens/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every lexer implementation.")
+    parser.add_argument('--lexer', action='append', choices=list(LEXERS), help="lexer to run (repeatable)")
+    parser.add_argument('--sizes', type=int, nargs='+', help="corpus sizes in bytes")
+    parser.add_argument('--full', action='store_true', help="run corpora up to 100 MB")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case, the best one counts")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare with a results file and fail on regressions")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed throughput drop against the baseline (fraction)")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (FULL_SIZES if args.full else SIZES)
+    results = run_suite(args.lexer, sizes, args.repeat)
+    report = {'python': sys.version.split()[0], 'platform': sys.platform, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import heapq
+from contextlib import contextmanager
+
+
+# Profiles currently recording, innermost last. The lexing engine only checks whether this list is
+# empty, once per call, so lexing outside a profile runs the usual single-regex path at full speed.
+ACTIVE_PROFILES = []
+
+DEFAULT_SLOWEST = 10
+
+
+# **PER-PATTERN LEXER PROFILING**
+
+class PatternStats:
+    """
+    Counters for one pattern of a token table.
+    """
+
+    def __init__(self, token_type):
+        self.token_type = token_type
+        self.attempts = 0
+        self.failures = 0
+        self.matches = 0
+        self.nanoseconds = 0
+
+    @property
+    def seconds(self):
+        return self.nanoseconds / 1e9
+
+    def as_dict(self):
+        return {
+            'token_type': self.token_type,
+            'attempts': self.attempts,
+            'failures': self.failures,
+            'matches': self.matches,
+            'seconds': self.seconds,
+        }
+
+
+class LexerProfile:
+    """
+    Structured report of where lexing time goes. While a profile is active, the lexing engine tries
+    the patterns of its table one at a time, in table order, exactly like the master regex would,
+    and records for every pattern the time spent and the failed attempts, the bytes consumed per token
+    type (skipped types such as WHITESPACE included), and the positions of the slowest attempts.
+    The tokens produced are the same as without profiling; only slower to get.
+    """
+
+    def __init__(self, slowest=DEFAULT_SLOWEST):
+        self.patterns = {}
+        self.bytes_by_type = {}
+        self.errors = 0
+        self.keep_slowest = slowest
+        self._slowest = []  # min-heap of (nanoseconds, position, token_type, matched)
+
+    def record_attempt(self, token_type, nanoseconds, position, matched):
+        """
+        Records one attempt of a pattern at a position.
+        """
+        stats = self.patterns.get(token_type)
+        if stats is None:
+            stats = self.patterns[token_type] = PatternStats(token_type)
+        stats.attempts += 1
+        stats.nanoseconds += nanoseconds
+        if matched:
+            stats.matches += 1
+        else:
+            stats.failures += 1
+        entry = (nanoseconds, position, token_type, matched)
+        if len(self._slowest) < self.keep_slowest:
+            heapq.heappush(self._slowest, entry)
+        elif entry > self._slowest[0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def record_token(self, token_type, length):
+        """
+        Records the bytes (characters for str sources) consumed by a token.
+        """
+        self.bytes_by_type[token_type] = self.bytes_by_type.get(token_type, 0) + length
+        if token_type == 'ERROR':
+            self.errors += 1
+
+    @property
+    def slowest(self):
+        """
+        The slowest attempts, slowest first, as (seconds, position, token_type, matched) tuples.
+        """
+        return [(nanoseconds / 1e9, position, token_type, matched)
+                for nanoseconds, position, token_type, matched in sorted(self._slowest, reverse=True)]
+
+    def hot_patterns(self):
+        """
+        Returns the pattern counters ordered by time spent, most expensive first.
+        """
+        return sorted(self.patterns.values(), key=lambda stats: stats.nanoseconds, reverse=True)
+
+    def total_seconds(self):
+        return sum(stats.nanoseconds for stats in self.patterns.values()) / 1e9
+
+    def as_dict(self):
+        """
+        Returns the whole report as plain data (e.g. for JSON output).
+        """
+        return {
+            'patterns': [stats.as_dict() for stats in self.hot_patterns()],
+            'bytes_by_type': dict(self.bytes_by_type),
+            'errors': self.errors,
+            'slowest': [
+                {'seconds': seconds, 'position': position, 'token_type': token_type, 'matched': matched}
+                for seconds, position, token_type, matched in self.slowest
+            ],
+        }
+
+    def report(self):
+        """
+        Formats the report as text.
+        """
+        total = self.total_seconds() or 1.0
+        lines = ["Pattern Profile Report:",
+                 f"{'pattern':20} {'time (ms)':>10} {'share':>7} {'attempts':>10} {'failures':>10} {'matches':>10}"]
+        for stats in self.hot_patterns():
+            lines.append(f"{stats.token_type:20} {stats.seconds * 1e3:>10.3f} {stats.seconds / total:>7.1%} "
+                         f"{stats.attempts:>10} {stats.failures:>10} {stats.matches:>10}")
+        lines.append("\nBytes consumed per token type:")
+        for token_type, length in sorted(self.bytes_by_type.items(), key=lambda item: -item[1]):
+            lines.append(f"{token_type:20} {length:>10}")
+        lines.append("\nSlowest attempts:")
+        for seconds, position, token_type, matched in self.slowest:
+            outcome = 'match' if matched else 'fail'
+            lines.append(f"{token_type:20} at position {position:<10} {seconds * 1e6:>10.1f} us  {outcome}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def profile_lexing(slowest=DEFAULT_SLOWEST):
+    """
+    Profiles every lexer run inside the block:
+
+        with profile_lexing() as profile:
+            lexer.tokenize()
+        print(profile.report())
+
+    Lexing done in other processes (parallel_tokenize workers) and token cache hits are not profiled.
+    """
+    profile = LexerProfile(slowest)
+    ACTIVE_PROFILES.append(profile)
+    try:
+        yield profile
+    finally:
+        ACTIVE_PROFILES.remove(profile)
@@ -0,0 +1,553 @@
+import mmap
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_left
+from time import perf_counter_ns
+
+from identifiers import IDENTIFIER
+from lexer_profiler import ACTIVE_PROFILES
+from token_spec import compile_master
+from token_table import TokenTable, error_message
+
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+MIN_PARALLEL_SEGMENT = 1 << 18
+
+# Keyword patterns of the form \b(word|word|...)\b, which can be folded into the identifier match
+_WORD_ALTERNATION = re.compile(r'\\b\((?:\?:)?([A-Za-z_]\w*(?:\|[A-Za-z_]\w*)*)\)\\b')
+_ASCII_WORD_BYTES = frozenset(b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+
+
+# **SINGLE-PASS MASTER-REGEX LEXING ENGINE SHARED BY EVERY LEXER**
+
+class LexerEngine:
+    """
+    Compiles an ordered token pattern table once into a single alternation of named groups.
+    Python's regex alternation tries its branches left to right, so the first pattern in the
+    table that matches at a position wins, exactly like looping over the table one pattern at a time.
+    A binary engine compiles the same table as bytes patterns; it lexes bytes, bytearrays and mmaps
+    directly (with byte offsets, and ASCII word and space classes).
+    Keyword patterns listing literal words right before the identifier pattern are not tried as
+    regexes: identifiers are matched once and looked up in a frozenset of each keyword class,
+    with the same word-boundary checks the keyword regex made.
+    """
+
+    def __init__(self, token_patterns, skip=('WHITESPACE',), binary=False):
+        self.binary = binary
+        self.token_types = tuple(token_patterns)
+        self.skip = frozenset(skip)
+        # Compact type ids used by the columnar APIs; unmatched characters get the last id
+        self.type_names = self.token_types + ('ERROR',)
+        self.type_ids = {token_type: index for index, token_type in enumerate(self.type_names)}
+        patterns = {token_type: _pattern_source(pattern) for token_type, pattern in token_patterns.items()}
+        self.patterns = patterns
+        self._pattern_regexes = None
+        self.word_type, self.word_classes = _fold_keywords(patterns, binary)
+        folded = {token_type for token_type, _ in self.word_classes}
+        self._is_word = _ASCII_WORD_BYTES.__contains__ if binary else _is_word_character
+        master = '|'.join(
+            f"(?P<{token_type}>{pattern})"
+            for token_type, pattern in patterns.items() if token_type not in folded
+        )
+        self.regex = compile_master(master.encode('utf-8') if binary else master, patterns)
+
+    def classify_word(self, text, start, end, limit):
+        """
+        Returns the token type of an identifier match: the first keyword class listing the word,
+        provided the word stands on word boundaries, or the identifier type otherwise.
+        """
+        word = text[start:end]
+        for token_type, words in self.word_classes:
+            if word in words:
+                is_word = self._is_word
+                if (start == 0 or not is_word(text[start - 1])) and (end >= limit or not is_word(text[end])):
+                    return token_type
+                break
+        return self.word_type
+
+    def match(self, text, position=0):
+        """
+        Matches a single token at the given position. Returns (token_type, value) or None.
+        """
+        if ACTIVE_PROFILES:
+            for token_type, start, end in self.profiled_spans(text, position, position + 1, len(text)):
+                return None if token_type == 'ERROR' else (token_type, text[start:end])
+        match = self.regex.match(text, position)
+        if match is None or match.end() == position:
+            return None
+        token_type = match.lastgroup
+        if token_type == self.word_type:
+            token_type = self.classify_word(text, position, match.end(), len(text))
+        return (token_type, match.group())
+
+    def spans(self, text, position=0, end=None):
+        """
+        Yields (token_type, start, end) for every non-skipped token. Characters that no pattern
+        matches are yielded as one-character 'ERROR' spans.
+        """
+        match = self.regex.match
+        skip = self.skip
+        word_type = self.word_type
+        end = len(text) if end is None else end
+
+        while position < end:
+            found = match(text, position, end)
+            if found is None or found.end() == position:
+                yield ('ERROR', position, position + 1)
+                position += 1
+                continue
+            token_end = found.end()
+            token_type = found.lastgroup
+            if token_type == word_type:
+                token_type = self.classify_word(text, position, token_end, end)
+            if token_type not in skip:
+                yield (token_type, position, token_end)
+            position = token_end
+
+    def tokenize(self, text, on_error=None):
+        """
+        Tokenizes the whole text and returns a list of (token_type, value) tuples.
+        on_error(text, position) is called for unmatched characters; it may return a token to
+        record or raise. By default an 'ERROR' token describing the character is recorded.
+        """
+        if ACTIVE_PROFILES:
+            return self._profiled_tokenize(text, on_error)
+        tokens = []
+        append = tokens.append
+        match = self.regex.match
+        skip = self.skip
+        word_type = self.word_type
+        classify_word = self.classify_word
+        intern = sys.intern if isinstance(text, str) else _same
+        on_error = on_error or unexpected_character
+        position = 0
+        code_length = len(text)
+
+        while position < code_length:
+            found = match(text, position)
+            if found is None or found.end() == position:
+                token = on_error(text, position)
+                if token is not None:
+                    append(token)
+                position += 1
+                continue
+            token_type = found.lastgroup
+            token_end = found.end()
+            if token_type == word_type:
+                # Identifiers and keywords repeat a lot: share one string object per spelling
+                token_type = classify_word(text, position, token_end, code_length)
+                append((token_type, intern(found.group())))
+            elif token_type not in skip:
+                append((token_type, found.group()))
+            position = token_end
+        return tokens
+
+    def lex_range(self, text, start, stop):
+        """
+        Lexes text from start until the first token boundary at or past stop, looking at the whole
+        text so that every match sees exactly what the serial lexer sees.
+        Returns (type_ids, starts, ends, reached) with the token columns as compact arrays and
+        reached being the position where lexing stopped.
+        """
+        if ACTIVE_PROFILES:
+            return self._profiled_range(text, start, stop)
+        match = self.regex.match
+        type_ids = self.type_ids
+        error_id = type_ids['ERROR']
+        skip = self.skip
+        word_type = self.word_type
+        classify_word = self.classify_word
+        code_length = len(text)
+        kinds = array('B')
+        starts = array('I')
+        ends = array('I')
+        position = start
+
+        while position < stop:
+            found = match(text, position)
+            if found is None or found.end() == position:
+                kinds.append(error_id)
+                starts.append(position)
+                ends.append(position + 1)
+                position += 1
+                continue
+            token_end = found.end()
+            token_type = found.lastgroup
+            if token_type == word_type:
+                token_type = classify_word(text, position, token_end, code_length)
+            if token_type not in skip:
+                kinds.append(type_ids[token_type])
+                starts.append(position)
+                ends.append(token_end)
+            position = token_end
+        return kinds, starts, ends, position
+
+    def profiled_spans(self, text, position, stop, limit):
+        """
+        Yields (token_type, start, end) for every token from position until the first token boundary
+        at or past stop, skipped types and ERROR spans included, while recording into the innermost
+        active LexerProfile. Each pattern is tried on its own in table order, so the time and failed
+        attempts of every pattern can be told apart; the first one matching wins, as in the master regex.
+        """
+        profile = ACTIVE_PROFILES[-1]
+        if self._pattern_regexes is None:
+            encode = (lambda pattern: pattern.encode('utf-8')) if self.binary else _same
+            self._pattern_regexes = [(token_type, re.compile(encode(pattern)))
+                                     for token_type, pattern in self.patterns.items()]
+        regexes = self._pattern_regexes
+        record_attempt = profile.record_attempt
+        record_token = profile.record_token
+        clock = perf_counter_ns
+
+        while position < stop:
+            token_end = position
+            for token_type, regex in regexes:
+                started = clock()
+                found = regex.match(text, position, limit)
+                record_attempt(token_type, clock() - started, position, found is not None)
+                if found is not None:
+                    token_end = found.end()
+                    break
+            if token_end == position:
+                record_token('ERROR', 1)
+                yield ('ERROR', position, position + 1)
+                position += 1
+                continue
+            record_token(token_type, token_end - position)
+            yield (token_type, position, token_end)
+            position = token_end
+
+    def _profiled_tokenize(self, text, on_error):
+        tokens = []
+        skip = self.skip
+        intern = sys.intern if isinstance(text, str) else _same
+        on_error = on_error or unexpected_character
+        word_types = {self.word_type}.union(token_type for token_type, _ in self.word_classes)
+        for token_type, start, end in self.profiled_spans(text, 0, len(text), len(text)):
+            if token_type == 'ERROR':
+                token = on_error(text, start)
+                if token is not None:
+                    tokens.append(token)
+            elif token_type in skip:
+                continue
+            elif token_type in word_types:
+                tokens.append((token_type, intern(text[start:end])))
+            else:
+                tokens.append((token_type, text[start:end]))
+        return tokens
+
+    def _profiled_range(self, text, start, stop):
+        type_ids = self.type_ids
+        skip = self.skip
+        kinds = array('B')
+        starts = array('I')
+        ends = array('I')
+        position = start
+        for token_type, token_start, token_end in self.profiled_spans(text, start, stop, len(text)):
+            if token_type not in skip:
+                kinds.append(type_ids[token_type])
+                starts.append(token_start)
+                ends.append(token_end)
+            position = token_end
+        return kinds, starts, ends, position
+
+    def lex_table(self, text):
+        """
+        Tokenizes the whole text into a TokenTable (unmatched characters become ERROR tokens).
+        """
+        kinds, starts, ends, _ = self.lex_range(text, 0, len(text))
+        return TokenTable(text, self.type_names, kinds, starts, ends)
+
+    def relex(self, table, text, edit_offset, removed_len, inserted_len):
+        """
+        Updates a TokenTable of the previous source in place for the edited text, where removed_len
+        characters at edit_offset were replaced by inserted_len characters.
+        Lexing restarts at the first token of the edited line (one token earlier for lookbehind,
+        or at an earlier ERROR token that the edited text now lets match) and stops as soon as it reaches the start
+        of an old token past the edit: the lexer is stateless, so from there on the old tokens are
+        still valid and are only shifted.
+        """
+        match = self.regex.match
+        type_ids = self.type_ids
+        error_id = type_ids['ERROR']
+        skip = self.skip
+        delta = inserted_len - removed_len
+        old_edit_end = edit_offset + removed_len
+
+        line_start = text.rfind(b'\n' if self.binary else '\n', 0, edit_offset) + 1
+        first = max(table.index_at(line_start) - 1, 0)
+        # An earlier unmatched character (typically an unterminated quote) may be completed by the edit
+        error_index = -1
+        while True:
+            error_index = table.find_kind(error_id, error_index + 1, first)
+            if error_index < 0:
+                break
+            error_start = table.start(error_index)
+            found = match(text, error_start)
+            if found is not None and found.end() > error_start:
+                first = error_index
+                break
+        position = table.start(first) if first else 0
+
+        kinds = array('B')
+        starts = array('I')
+        ends = array('I')
+        last = first
+        count = len(table)
+        code_length = len(text)
+
+        while position < code_length:
+            old_position = position - delta
+            if old_position > old_edit_end:
+                # Resynchronize once an old token starts exactly where we are
+                while last < count and table.start(last) < old_position:
+                    last += 1
+                if last < count and table.start(last) == old_position:
+                    break
+            found = match(text, position)
+            if found is None or found.end() == position:
+                kinds.append(error_id)
+                starts.append(position)
+                ends.append(position + 1)
+                position += 1
+                continue
+            token_end = found.end()
+            token_type = found.lastgroup
+            if token_type == self.word_type:
+                token_type = self.classify_word(text, position, token_end, code_length)
+            if token_type not in skip:
+                kinds.append(type_ids[token_type])
+                starts.append(position)
+                ends.append(token_end)
+            position = token_end
+        else:
+            last = count
+
+        table.splice(first, last, kinds, starts, ends, delta)
+        table.source = text
+        return table
+
+    def stream(self, fileobj, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Reads a text file object in chunks and lazily yields (token_type, value, start) for every
+        non-skipped token, start being the offset in the whole stream. Unmatched characters are
+        yielded as ('ERROR', character, start).
+        Only the unconsumed tail of the input is buffered, so memory stays bounded by the chunk
+        size plus the longest token instead of the file size.
+        """
+        match = self.regex.match
+        skip = self.skip
+        buffer = ''
+        base = 0  # stream offset of buffer[0]
+        position = 0
+        at_eof = False
+
+        while True:
+            if not at_eof:
+                chunk = fileobj.read(chunk_size)
+                if chunk:
+                    # Keep one consumed character so \b sees the same left context as in the whole text
+                    keep = position - 1 if position > 0 else 0
+                    buffer = buffer[keep:] + chunk
+                    base += keep
+                    position -= keep
+                else:
+                    at_eof = True
+
+            # Before EOF tokens may only start on complete lines, so patterns that stop at a newline
+            # have seen all the input they can depend on
+            buffer_end = len(buffer)
+            limit = buffer_end if at_eof else buffer.rfind('\n') + 1
+
+            while position < limit:
+                found = match(buffer, position)
+                if found is None or found.end() == position:
+                    if not at_eof and self._may_continue(buffer, position):
+                        break  # e.g. a string whose closing quote is in the next chunk
+                    yield ('ERROR', buffer[position], base + position)
+                    position += 1
+                    continue
+                token_end = found.end()
+                if token_end == buffer_end and not at_eof:
+                    break  # the token may continue in the next chunk
+                token_type = found.lastgroup
+                if token_type == self.word_type:
+                    token_type = self.classify_word(buffer, position, token_end, buffer_end)
+                if token_type not in skip:
+                    yield (token_type, found.group(), base + position)
+                position = token_end
+
+            if at_eof and position >= buffer_end:
+                return
+
+    def _may_continue(self, buffer, position):
+        # A failed match may only be due to missing input if some pattern succeeds once the
+        # construct is closed with its own opening character (quotes, brackets of the same kind),
+        # optionally after a space in case the buffer ends in the middle of an escape sequence
+        tail = buffer[position:]
+        for closing in (tail[0], ' ' + tail[0]):
+            found = self.regex.match(tail + closing)
+            if found is not None and found.end() > len(tail):
+                return True
+        return False
+
+
+def _fold_keywords(patterns, binary):
+    # Finds the run of literal keyword alternations directly preceding the identifier pattern.
+    # Anything between them would change which pattern wins, so only an adjacent run is folded.
+    token_types = list(patterns)
+    for index, token_type in enumerate(token_types):
+        if patterns[token_type] != IDENTIFIER:
+            continue
+        word_classes = []
+        for keyword_type in reversed(token_types[:index]):
+            words = _WORD_ALTERNATION.fullmatch(patterns[keyword_type])
+            if words is None:
+                break
+            words = words.group(1).split('|')
+            if binary:
+                words = [word.encode('ascii') for word in words]
+            word_classes.insert(0, (keyword_type, frozenset(words)))
+        if word_classes:
+            return token_type, tuple(word_classes)
+    return None, ()
+
+
+def _same(value):
+    return value
+
+
+def _is_word_character(character):
+    # Same definition of a word character as \w / \b in str patterns
+    return character.isalnum() or character == '_'
+
+
+def unexpected_character(text, position):
+    """
+    Default error handler: records an 'ERROR' token for the unexpected character.
+    """
+    return ('ERROR', error_message(text, position))
+
+
+def _pattern_source(pattern):
+    # Pattern tables may hold raw strings or already compiled regexes (see OverpoweredLexer.optimize)
+    return getattr(pattern, 'pattern', pattern)
+
+
+_ENGINE_CACHE = {}
+
+
+def compile_engine(token_patterns, skip=('WHITESPACE',), binary=False):
+    """
+    Returns the LexerEngine for a pattern table, compiling it only the first time the table is seen.
+    """
+    key = (tuple((token_type, _pattern_source(pattern)) for token_type, pattern in token_patterns.items()),
+           tuple(skip), binary)
+    engine = _ENGINE_CACHE.get(key)
+    if engine is None:
+        engine = _ENGINE_CACHE[key] = LexerEngine(token_patterns, skip, binary)
+    return engine
+
+
+def map_source(path):
+    """
+    Memory-maps a source file read-only, for lexing it with a binary engine without reading it into
+    memory or decoding it.
+    """
+    with open(path, 'rb') as source_file:
+        if os.fstat(source_file.fileno()).st_size == 0:
+            return b''  # empty files cannot be mapped
+        return mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def split_points(text, segments):
+    """
+    Picks segment boundaries at line starts close to evenly spaced offsets. A cheap prescan
+    prefers newlines that end a line without quote characters, so that in practice no string
+    or comment is open across the split; parallel_lex still verifies every split.
+    """
+    newline_char, quotes = ('\n', '"\'') if isinstance(text, str) else (b'\n', b'"\'')
+    points = [0]
+    code_length = len(text)
+    for index in range(1, segments):
+        target = max(code_length * index // segments, points[-1])
+        newline = text.find(newline_char, target)
+        if newline < 0:
+            break
+        candidate = newline
+        # Look a few lines ahead for a line free of quotes
+        for _ in range(8):
+            line_start = text.rfind(newline_char, 0, candidate) + 1
+            line = text[line_start:candidate]
+            if not any(quote in line for quote in quotes):
+                newline = candidate
+                break
+            candidate = text.find(newline_char, candidate + 1)
+            if candidate < 0:
+                break
+        if newline + 1 > points[-1]:
+            points.append(newline + 1)
+    if points[-1] != code_length:
+        points.append(code_length)
+    return points
+
+
+_WORKER_STATE = {}
+
+
+def _init_lex_worker(text, token_patterns, skip):
+    _WORKER_STATE['text'] = text
+    _WORKER_STATE['engine'] = compile_engine(token_patterns, skip, not isinstance(text, str))
+
+
+def _lex_worker(start, stop):
+    return _WORKER_STATE['engine'].lex_range(_WORKER_STATE['text'], start, stop)
+
+
+def parallel_lex(text, token_patterns, workers=None, skip=('WHITESPACE',), chunks_per_worker=4):
+    """
+    Lexes text in a process pool and returns a TokenTable covering the whole text, identical to
+    what the serial engine produces.
+    Segments are lexed independently and concatenated in source order without sorting. When the
+    previous segment's last token runs past a split point, the serial engine re-lexes from there
+    until it lands on a token start of the next segment; being stateless, both lexers agree from
+    that point on, so the rest of the segment is reused as is.
+    """
+    engine = compile_engine(token_patterns, skip, not isinstance(text, str))
+    workers = workers or os.cpu_count() or 1
+    segments = min(workers * chunks_per_worker, len(text) // MIN_PARALLEL_SEGMENT)
+    if workers < 2 or segments < 2:
+        return engine.lex_table(text)
+
+    # Imported here: the process pool machinery is the most expensive import of the lexers
+    from concurrent.futures import ProcessPoolExecutor
+
+    points = split_points(text, segments)
+    with ProcessPoolExecutor(workers, initializer=_init_lex_worker,
+                             initargs=(text, token_patterns, skip)) as pool:
+        results = list(pool.map(_lex_worker, points[:-1], points[1:]))
+
+    kinds = array('B')
+    starts = array('I')
+    ends = array('I')
+    position = 0
+    for seg_start, seg_stop, (seg_kinds, seg_starts, seg_ends, reached) in zip(points, points[1:], results):
+        first = 0
+        if position != seg_start:
+            # Re-lex serially until both lexers stand on the same position
+            first = bisect_left(seg_starts, position)
+            while position < seg_stop and (first == len(seg_starts) or seg_starts[first] != position):
+                fix_kinds, fix_starts, fix_ends, position = engine.lex_range(text, position, position + 1)
+                kinds.extend(fix_kinds)
+                starts.extend(fix_starts)
+                ends.extend(fix_ends)
+                first = bisect_left(seg_starts, position, first)
+            if first == len(seg_starts) or seg_starts[first] != position:
+                continue
+        kinds.extend(seg_kinds[first:])
+        starts.extend(seg_starts[first:])
+        ends.extend(seg_ends[first:])
+        position = reached
+    return TokenTable(text, engine.type_names, kinds, starts, ends)
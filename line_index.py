@@ -0,0 +1,58 @@
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+
+# **NEWLINE OFFSET INDEX FOR LAZY LINE/COLUMN LOOKUPS**
+
+class LineIndex:
+    """
+    Start offsets of every line of a source, built once with a single scan that runs at C speed
+    (split, map and accumulate chained without a Python-level loop per line). Tokens only carry
+    their start offsets; the line and column of an offset are resolved on demand with a binary
+    search, in O(log n) per lookup, so lexing pays nothing for positions nobody asks about.
+    Lines are numbered from 1 and columns from 0, as in Python's own tracebacks and AST nodes.
+    Offsets and columns count characters in str sources and bytes in byte sources.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        newline = '\n' if isinstance(source, str) else b'\n'
+        if hasattr(source, 'split'):
+            # Each line starts one past the end of the previous one
+            starts = array('I', accumulate(map((1).__add__, map(len, source.split(newline))), initial=0))
+            starts.pop()
+        else:
+            # Memory-mapped sources have no split(); walk their newlines with find() instead of copying them
+            starts = array('I', [0])
+            find = source.find
+            position = find(newline)
+            while position >= 0:
+                starts.append(position + 1)
+                position = find(newline, position + 1)
+        self.line_starts = starts
+
+    def __len__(self):
+        return len(self.line_starts)
+
+    def line_column(self, offset):
+        """
+        Returns the (line, column) of a source offset.
+        """
+        line = bisect_right(self.line_starts, offset)
+        return (line, offset - self.line_starts[line - 1])
+
+    def offset(self, line, column=0):
+        """
+        Returns the source offset of a (line, column) position.
+        """
+        return self.line_starts[line - 1] + column
+
+    def line(self, line):
+        """
+        Returns the text of a line, without its newline.
+        """
+        start = self.line_starts[line - 1]
+        if line < len(self.line_starts):
+            return self.source[start:self.line_starts[line] - 1]
+        return self.source[start:]
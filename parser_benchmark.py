@@ -0,0 +1,158 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+from AST import AstronomicalAST
+from lexing_engine import compile_engine
+
+
+# **PARSER THROUGHPUT BENCHMARK**
+#
+# Parses deterministic generated programs of growing size and reports nodes/sec for the parser
+# alone (tokens lexed beforehand) and for lexing plus parsing. Throughput should stay flat as the
+# input grows: the parser is linear. Results can be stored as JSON and compared with a baseline.
+
+SIZES = [10 << 10, 100 << 10, 1 << 20]
+FULL_SIZES = SIZES + [10 << 20]
+DEFAULT_TOLERANCE = 0.10
+
+
+def program_corpus(size, seed=0):
+    """
+    Generates a syntactically complete program of about size characters with nested blocks,
+    calls and expressions of mixed precedence.
+    """
+    rng = random.Random(seed)
+    names = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz_') for _ in range(rng.randint(1, 8)))
+             for _ in range(100)]
+    operators = ['+', '-', '*', '/', '%', '**', '<<', '|', '&', '==', '<', '>=', 'and', 'or']
+
+    def expression(depth):
+        roll = rng.random()
+        if depth <= 0 or roll < 0.3:
+            return rng.choice([rng.choice(names), str(rng.randint(0, 999)), f"{rng.random() * 10:.2f}",
+                               f"'{rng.choice(names)}'", 'None', 'True'])
+        if roll < 0.7:
+            return f"{expression(depth - 1)} {rng.choice(operators)} {expression(depth - 1)}"
+        if roll < 0.8:
+            return f"{rng.choice(names)}({expression(depth - 1)}, {expression(depth - 1)})"
+        if roll < 0.9:
+            return f"({expression(depth - 1)})"
+        return f"[{expression(depth - 1)}, {rng.choice(names)}.{rng.choice(names)}[{expression(depth - 1)}]]"
+
+    def block(indent, depth):
+        lines = []
+        for _ in range(rng.randint(1, 4)):
+            roll = rng.random()
+            pad = ' ' * indent
+            if depth > 0 and roll < 0.15:
+                lines.append(f"{pad}if {expression(2)}:\n{block(indent + 4, depth - 1)}{pad}else:\n"
+                             f"{block(indent + 4, depth - 1)}")
+            elif depth > 0 and roll < 0.25:
+                lines.append(f"{pad}for {rng.choice(names)} in range({expression(1)}):\n{block(indent + 4, depth - 1)}")
+            elif depth > 0 and roll < 0.3:
+                lines.append(f"{pad}while {expression(2)}:\n{block(indent + 4, depth - 1)}")
+            elif roll < 0.45:
+                lines.append(f"{pad}{rng.choice(names)}({expression(2)})\n")
+            else:
+                lines.append(f"{pad}{rng.choice(names)} = {expression(3)}\n")
+        return ''.join(lines)
+
+    parts = []
+    length = 0
+    while length < size:
+        name = rng.choice(names)
+        part = f"def {name}({', '.join(rng.sample(names, 2))}):\n{block(4, 3)}    return {expression(2)}\n\n"
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def run_case(size, repeat):
+    """
+    Benchmarks the parser on one generated program.
+    """
+    source = program_corpus(size)
+    ast = AstronomicalAST(source)
+    table = compile_engine(ast.token_patterns, skip=()).lex_table(source)
+
+    parse_best = total_best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ast.parse(table.located())
+        parse_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ast.parse()
+        total_time = time.perf_counter() - start
+
+        parse_best = parse_time if parse_best is None else min(parse_best, parse_time)
+        total_best = total_time if total_best is None else min(total_best, total_time)
+
+    return {
+        'size': size,
+        'tokens': len(table),
+        'nodes': ast.node_count,
+        'parse_seconds': parse_best,
+        'nodes_per_sec': ast.node_count / parse_best,
+        'lex_and_parse_seconds': total_best,
+        'lex_and_parse_nodes_per_sec': ast.node_count / total_best,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares results with baseline results and returns a list of regression messages.
+    """
+    reference = {entry['size']: entry for entry in baseline['results']}
+    regressions = []
+    for result in results:
+        expected = reference.get(result['size'])
+        if expected is None:
+            continue
+        if result['nodes'] != expected['nodes']:
+            regressions.append(f"{result['size']} B: {result['nodes']} nodes, baseline has {expected['nodes']}")
+        if result['nodes_per_sec'] < expected['nodes_per_sec'] * (1 - tolerance):
+            regressions.append(f"{result['size']} B: {result['nodes_per_sec']:,.0f} nodes/s, "
+                               f"baseline {expected['nodes_per_sec']:,.0f} nodes/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AstronomicalAST parser.")
+    parser.add_argument('--sizes', type=int, nargs='+', help="program sizes in bytes")
+    parser.add_argument('--full', action='store_true', help="include a 10 MB program")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case, the best one counts")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare with a results file and fail on regressions")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed throughput drop against the baseline (fraction)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes or (FULL_SIZES if args.full else SIZES):
+        result = run_case(size, args.repeat)
+        results.append(result)
+        print(f"{size:>10} B  {result['tokens']:>9} tokens  {result['nodes']:>9} nodes  "
+              f"{result['nodes_per_sec']:>12,.0f} nodes/s  "
+              f"{result['lex_and_parse_nodes_per_sec']:>12,.0f} nodes/s with lexing")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'python': sys.version.split()[0], 'results': results}, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
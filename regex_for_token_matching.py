@@ -1,24 +1,12 @@
-import re
+from lexing_engine import compile_engine
+from token_list import TOKEN_PATTERNS
+
+
+def _raise_unexpected_character(source_code, position):
+    raise SyntaxError(f"Unexpected character at position {position}")
+
 
 def tokenize(source_code):
-    position = 0
-    tokens = []
-    
-    while position < len(source_code):
-        match = None
-        
-        for token_type, pattern in TOKEN_PATTERNS.items():
-            regex = re.compile(pattern)
-            match = regex.match(source_code, position)
-            
-            if match:
-                value = match.group(0)
-                if token_type != 'WHITESPACE':  # Skip whitespace
-                    tokens.append((token_type, value))
-                position += len(value)
-                break
-        
-        if not match:
-            raise SyntaxError(f"Unexpected character at position {position}")
-    
-    return tokens
+    # All patterns are tried in one master-regex match per token; whitespace is skipped
+    engine = compile_engine(TOKEN_PATTERNS)
+    return engine.tokenize(source_code, on_error=_raise_unexpected_character)
@@ -0,0 +1,102 @@
+import pytest
+
+from AST import AstronomicalAST
+from ast_compiler import CompiledModule, SourceModule, compile_ast
+
+
+# Each program is run by execute_ast and by exec, and both must end the same way: the same module
+# variables (functions, classes and modules left out), or the same exception type
+PROGRAMS = [
+"x = 1 + 2 * 3\ny = x ** 2 - x // 2 % 5\nz = -x if x > 3 else x\n",
+"def f(a, b=2, *args, k=3, **kw):\n    return (a, b, args, k, kw)\nr1 = f(1)\nr2 = f(1, 5, 6, 7, k=9, q=1)\nr3 = f(b=4, a=0)\n",
+"def fib(n):\n    if n < 2:\n        return n\n    return fib(n - 1) + fib(n - 2)\nr = fib(15)\n",
+"total = 0\nfor i in range(10):\n    if i % 2 == 0:\n        continue\n    if i > 7:\n        break\n    total += i\nelse:\n    total = -1\n",
+"i = 0\nwhile i < 10:\n    i += 1\nelse:\n    done = True\n",
+"def outer():\n    x = 1\n    def inner():\n        return x + 1\n    x = 5\n    return inner()\nr = outer()\n",
+"def counter():\n    c = [0]\n    def inc():\n        c[0] += 1\n        return c[0]\n    return inc\ninc = counter()\ninc()\nr = inc()\n",
+"sq = [i * i for i in range(5) if i % 2]\nd = {k: v for k, v in zip('abc', range(3))}\ns = {x % 3 for x in range(10)}\ng = sum(x for x in range(4))\nn = [(i, j) for i in range(3) for j in range(i)]\n",
+"a, (b, *c) = 1, (2, 3, 4)\nl = [1, 2, 3, 4, 5]\nl[1:3] = [9]\nm = l[::2]\nl[0] += 10\n",
+"class A:\n    k = 2\n    def __init__(self, v):\n        self.v = v\n    def get(self):\n        return self.v * A.k\nclass B(A):\n    def get(self):\n        return A.get(self) + 1\nr = B(3).get()\nname = B.__name__\n",
+"try:\n    1 / 0\nexcept ZeroDivisionError as e:\n    r = 'zero'\nelse:\n    r = 'no'\nfinally:\n    f = 1\n",
+"def g():\n    try:\n        return 1\n    finally:\n        x = 2\nr = g()\n",
+"import math\nfrom os import path as p, sep\nr = math.floor(2.5)\nj = p.join('a', 'b')\n",
+"f = lambda x, y=2: x * y\nr = f(3)\nr2 = (lambda: 7)()\n",
+"def deco(fn):\n    return lambda *a: fn(*a) * 2\n@deco\ndef h(x):\n    return x + 1\nr = h(3)\n",
+"x = 5\ndef setg():\n    global x\n    x = 7\nsetg()\nc = 1 < x < 10 != 3\nb = x is not None and not False\n",
+"r = [y := 3, y + 1]\nt = 'a' 'b'\nq = {**{'a': 1}, 'b': 2}\nw = [*range(3), 4]\ndel q['a']\n",
+"def k(*, a):\n    return a\nr = k(a=1)\n",
+"with open('/dev/null') as fh:\n    closed = fh.closed\n",
+"assert 1 == 1, 'x'\nv = 0\nfor a, b in [(1, 2), (3, 4)]:\n    v += a * b\n",
+"def t():\n    a, a = 1, 2\n    b, c, d = 1, 2, 3\n    b, c = c, b\n    return a, b, c, d\nr = t()\n",
+"a = 1\nb = [1, 2]\nc = 3\ndel (a, [c]), b[0]\nr = b\n",
+"def f():\n    return y\ny = 1\ndel y\nf()\n",
+"def f():\n    x\n    x = 1\nf()\n",
+"def f(a):\n    pass\nf(1, 2)\n",
+"zz\n",
+]
+
+# Programs the closures do not cover, written back as source and run by Python
+FALLBACK_PROGRAMS = [
+"def g(n):\n    for i in range(n):\n        yield i * 2\nr = list(g(4))\n",
+"def g():\n    x = yield 1\n    yield from [x, 3]\nit = g()\na = next(it)\nb = it.send(5)\n",
+"from math import *\nr = floor(2.5) + pi\n",
+"from . import x\n",
+"class A:\n    def f(self):\n        return 'A'\nclass B(A):\n    def f(self):\n        return super().f() + 'B'\n    def c(self):\n        return __class__.__name__\nr = B().f()\nc = B().c()\n",
+"n = __name__\nd = __doc__\ng = sorted(name for name in globals() if not name.startswith('__'))\n",
+"def f(a):\n    b = 2\n    return sorted(locals()), eval('a + b'), sorted(vars())\nr = f(1)\nx = 4\nexec('x += 1')\n",
+]
+
+
+def _visible(namespace):
+    return {name: repr(value) for name, value in namespace.items()
+            if not callable(value) and not hasattr(value, '__file__') and not hasattr(value, '__next__')
+            and name not in ('__builtins__', '__name__', 'fh')}
+
+
+def _outcome(run):
+    try:
+        return _visible(run())
+    except Exception as error:
+        return type(error).__name__
+
+
+def _exec(source):
+    namespace = {'__name__': '__main__'}
+    exec(source, namespace)
+    return namespace
+
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_compiled_module_behaves_like_exec(source):
+    assert isinstance(compile_ast(AstronomicalAST(source).parse()), CompiledModule)
+    assert _outcome(AstronomicalAST(source).execute_ast) == _outcome(lambda: _exec(source))
+
+
+@pytest.mark.parametrize('source', FALLBACK_PROGRAMS)
+def test_unsupported_constructs_run_as_python(source):
+    ast = AstronomicalAST(source)
+    assert _outcome(ast.execute_ast) == _outcome(lambda: _exec(source))
+    assert isinstance(ast.get_ast().metadata['program'], SourceModule)
+
+
+def test_fallback_runs_the_tree_not_the_source():
+    ast = AstronomicalAST("def g():\n    yield 1\nr = list(g())\nx = 1\n")
+    root = ast.parse()
+    root.children[-1].children[-1].value = '2'  # x = 2
+    program = compile_ast(root)
+    assert isinstance(program, SourceModule)
+    assert _visible(program.run()) == {'r': '[1]', 'x': '2'}
+
+    ast = AstronomicalAST("def f():\n    if 1 + 1 == 3:\n        return 0\n    yield 1\nr = list(f())\n")
+    ast.optimize()
+    assert _visible(ast.execute_ast()) == {'r': '[1]'}
+    assert 'if' not in ast.get_ast().metadata['program'].source
+
+
+def test_runs_are_independent_and_follow_edits():
+    ast = AstronomicalAST("x = 1\ny = [x]\n")
+    first = ast.execute_ast()
+    first['y'].append(2)
+    assert ast.execute_ast() == {'x': 1, 'y': [1]}
+    ast.update(4, 1, "2")
+    assert ast.execute_ast() == {'x': 2, 'y': [2]}
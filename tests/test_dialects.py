@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+from dialects import get_dialect, open_source
+
+
+SOURCE = "# dialect: python\ndef f(x):\n    return x * 2  # twice\n\nname = 'café'\ny = f(3) + 0x1F\n"
+EDITS = ['', 'z', ' = 1\n', "'q'", '\n', '# note\n', 'é', '0.5', '(']
+
+
+def _tokens(lexer):
+    return list(lexer.tokens), [lexer.tokens.span(index) for index in range(len(lexer.tokens))]
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_update_matches_a_full_tokenize(tmp_path, binary):
+    path = tmp_path / 'example.py'
+    path.write_text(SOURCE, encoding='utf-8')
+    lexer = open_source(str(path), binary=binary)
+    lexer.tokenize()
+    rng = random.Random(5)
+    for _ in range(40):
+        source = lexer.source
+        offset = rng.randint(0, len(source))
+        removed = rng.randint(0, min(3, len(source) - offset))
+        inserted = rng.choice(EDITS)
+        if binary:
+            # Edits at character boundaries, so UTF-8 sequences stay whole
+            while offset < len(source) and source[offset] & 0xC0 == 0x80:
+                offset += 1
+            removed = min(removed, len(source) - offset)
+            while offset + removed < len(source) and source[offset + removed] & 0xC0 == 0x80:
+                removed += 1
+        lexer.update(offset, removed, inserted)
+        assert isinstance(lexer.source, bytes if binary else str)
+        fresh = get_dialect('python').lexer(lexer.source)
+        fresh.tokenize()
+        assert _tokens(lexer) == _tokens(fresh)
+    assert path.read_text(encoding='utf-8') == SOURCE
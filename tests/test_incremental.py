@@ -0,0 +1,128 @@
+import random
+
+import pytest
+
+from AST import TOKEN_PATTERNS, AstronomicalAST
+from ast_incremental import IncrementalParser
+from ast_walk import walk
+
+
+SOURCE = '''\
+import os
+x = 1
+
+
+def f(a, b=2):
+    if a:
+        y = a + b
+        for i in range(b):
+            y += i
+    elif b:
+        y = -b
+    else:
+        y = 0
+    return y
+
+
+class C:
+    def m(self):
+        while self:
+            try:
+                return f(1)
+            except ValueError as error:
+                pass
+        return None
+
+
+z = [f(n) for n in range(3)]
+'''
+
+# Text inserted at random offsets: whole statements, expressions, and fragments that break the code
+SNIPPETS = [
+    'q = 3\n', '        w = 4\n', '    v = 5\n', 'def g():\n    return 1\n', '1 + ', ' * 2', 'abc', '(',
+    ')', ':', '\n', '    ', 'if x:\n', '\n\n', '# note\n', '"""s"""', 'lambda: 0', ', 9', '\t',
+]
+
+# Edits that always leave valid code: (old text, new text), applied at the first occurrence
+REPLACEMENTS = [
+    ('y = a + b', 'y = a * b - 1'), ('x = 1\n', 'x = 1\nx2 = 2\n'),
+    ('            y += i\n', '            y += i\n            y -= 1\n'),
+    ('        return None\n', '        return None\n\n    def n(self):\n        return 2\n'),
+    ('pass', 'raise'), ('import os\n', ''), ('range(3)', 'range(30)'), ('y = 0', 'y = 0; k = 1'),
+]
+
+
+def _shape(root):
+    # Every node with its span, in pre-order, and the parent links checked along the way
+    shape = []
+    for node in walk(root):
+        for child in node.children:
+            assert child.parent is node
+        shape.append((node.type, node.value, node.start, node.end, len(node.children)))
+    return shape
+
+
+def _full_parse(source):
+    try:
+        ast = AstronomicalAST(source)
+        ast.parse()
+    except SyntaxError:
+        return None, None
+    return _shape(ast.get_ast()), ast.node_count
+
+
+def _check(parser):
+    shape, count = _full_parse(parser.source)
+    assert shape is not None
+    assert _shape(parser.tree) == shape
+    assert parser.node_count == count
+
+
+@pytest.mark.parametrize('old, new', REPLACEMENTS)
+def test_valid_edits_match_a_full_parse(old, new):
+    parser = IncrementalParser(SOURCE, TOKEN_PATTERNS)
+    offset = parser.source.index(old)
+    parser.update(offset, len(old), new)
+    _check(parser)
+    parser.update(offset, len(new), old)
+    assert parser.source == SOURCE
+    _check(parser)
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_random_edits_match_a_full_parse(seed):
+    rng = random.Random(seed)
+    parser = IncrementalParser(SOURCE, TOKEN_PATTERNS)
+    for _ in range(60):
+        source = parser.source
+        if rng.random() < 0.3:
+            old, new = rng.choice(REPLACEMENTS)
+            offset = source.find(old)
+            if offset < 0:
+                continue
+            removed = len(old)
+        else:
+            offset = rng.randint(0, len(source))
+            removed = rng.randint(0, min(4, len(source) - offset))
+            new = rng.choice(SNIPPETS) if rng.random() < 0.7 else ''
+        edited = source[:offset] + new + source[offset + removed:]
+        if _full_parse(edited)[0] is None:
+            with pytest.raises(SyntaxError):
+                parser.update(offset, removed, new)
+            continue
+        parser.update(offset, removed, new)
+        assert parser.source == edited
+        _check(parser)
+
+
+def test_update_reuses_untouched_statements():
+    parser = IncrementalParser(SOURCE, TOKEN_PATTERNS)
+    before = parser.tree.children
+    body = before[2].children[-1].children
+    offset = parser.source.index('y = -b')
+    parser.update(offset, len('y = -b'), 'y = -b * 2')
+    after = parser.tree.children
+    assert all(old is new for old, new in zip(before, after))
+    assert all(old is new for old, new in zip(body, after[2].children[-1].children))
+    assert parser.reparsed_nodes == 6  # only the statement in the elif block is parsed again
+    _check(parser)
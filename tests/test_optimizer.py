@@ -0,0 +1,92 @@
+import pytest
+
+from AST import AstronomicalAST
+from ast_optimizer import optimize_ast
+from ast_walk import walk
+
+
+# Each program is run unoptimized and optimized, and both must end the same way: the same module
+# variables, or the same exception type
+PROGRAMS = [
+    "x = -3 + 2 * 4\ns = 'ab' * 3 + 'c'\nk = 1 < 2 < 3\nq = 0 and print()\nw = 1 and 5\n",
+    "r = 1 / 0 if False else 2 ** 10\nt = (2 ** 5000) * 1 - 2 ** 5000\nu = -(-(2 ** 5000)) == 2 ** 5000\n",
+    "a = [1]\nb = a * 1\nb.append(2)\nr = len(a)\n",
+    "s = {1}\nr = s - 0\n",
+    "a = 1.5\nr = (a + 0, a * 1, -(-a), -0.0 + 0)\n",
+    "def f(v):\n    return (v + 0, v - 0, v * 1, v ** 1, v | 0, 0 + v)\nr = f(3)\nq = f(True)\n",
+    "x = 'g'\ndef f():\n    if False:\n        x = 1\n    return x\nr = f()\n",
+    "x = 'g'\ndef f():\n    return x\n    x = 1\nr = f()\n",
+    "x = 'g'\ndef f():\n    return x\n    y = 2\nr = f()\n",
+    "x = 'g'\ndef f():\n    y = 0 and (x := 5)\n    return x\nr = f()\n",
+    "x = 'g'\ndef f():\n    y = (x := 5) if False else 1\n    return x\nr = f()\n",
+    "x = 'g'\ndef f():\n    if 0:\n        pass\n    elif False:\n        x = 2\n    return x\nr = f()\n",
+    "x = 'g'\ndef f():\n    while False:\n        x = 2\n    return x\nr = f()\n",
+    "def f():\n    if False:\n        def g():\n            q = 1\n            return q\n    return 1\nr = f()\n",
+    "def f():\n    if False:\n        yield 1\n    return 5\nr = type(f()).__name__\n",
+    "def f():\n    return 5\n    yield 1\nr = type(f()).__name__\n",
+    "def f():\n    while 0:\n        yield 1\n    return 5\nr = type(f()).__name__\n",
+    "def f():\n    x = 0 and (yield)\n    if False:\n        g = lambda: (yield)\n    return 5\nr = type(f()).__name__\n",
+    """
+if False:
+    y = 1
+elif 2 > 1:
+    y = 2
+else:
+    y = 3
+while 0:
+    pass
+else:
+    z = 7
+def g(n):
+    for i in range(n):
+        if True:
+            continue
+        n = 99
+    return n if 1 else 0
+r = g(4)
+""",
+]
+
+
+def _outcome(source, optimize):
+    ast = AstronomicalAST(source)
+    ast.parse()
+    if optimize:
+        ast.optimize()
+    try:
+        namespace = ast.execute_ast()
+    except Exception as error:
+        return type(error).__name__
+    return {name: repr(value) for name, value in namespace.items() if not callable(value)}
+
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_optimized_tree_behaves_like_the_original(source):
+    assert _outcome(source, True) == _outcome(source, False)
+
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_optimized_tree_is_consistent(source):
+    root = AstronomicalAST(source).parse()
+    before = sum(1 for _ in walk(root))
+    root, report = optimize_ast(root)
+    after = sum(1 for _ in walk(root))
+    for node in walk(root):
+        for child in node.children:
+            assert child.parent is node
+    assert report.nodes_before == before
+    assert report.nodes_after == after
+    assert sum(statistics.nodes_removed for statistics in report.passes) == before - after
+
+
+def test_simplifies_what_it_can():
+    root = AstronomicalAST("x = 2 * 3 + 1\nif False:\n    y = 1\ndef f():\n    return 1\n    z = 2\n").parse()
+    root, report = optimize_ast(root)
+    assert [node.value for node in walk(root) if node.type == 'Number'] == ['7', '1']
+    assert not any(node.type == 'If' for node in walk(root))
+
+
+def test_keeps_only_the_yields_that_make_generators():
+    source = "def f():\n    if False:\n        def g():\n            yield 1\n    if False:\n        yield 2\n    return 3\n"
+    root, report = optimize_ast(AstronomicalAST(source).parse())
+    assert [node.value for node in walk(root) if node.type == 'Number'] == ['2', '3']
@@ -0,0 +1,28 @@
+import pytest
+
+from AST import AstronomicalAST
+from ast_unparse import unparse
+
+
+# 'not' starts an operand of 'and' and 'or' or a whole expression, never the operand of a tighter
+# operator, as in Python
+@pytest.mark.parametrize('source', [
+    "a + not b\n", "-not 0\n", "x ** not y\n", "a == not b\n", "[*not a]\n", "{**not a}\n",
+    "for not x in y:\n    pass\n",
+])
+def test_rejects_not_as_an_operand(source):
+    with pytest.raises(SyntaxError):
+        compile(source, '<test>', 'exec')
+    with pytest.raises(SyntaxError):
+        AstronomicalAST(source).parse()
+
+
+@pytest.mark.parametrize('source, expected', [
+    ("not not x\n", "not not x\n"),
+    ("not a == b and not c or d\n", "not a == b and not c or d\n"),
+    ("x = y if not z else not w\n", "x = y if not z else not w\n"),
+    ("f(not x, a[not b], lambda: not c)\n", "f(not x, a[not b], lambda: not c)\n"),
+    ("a + (not b)\n", "a + (not b)\n"),
+])
+def test_accepts_not_where_python_does(source, expected):
+    assert unparse(AstronomicalAST(source).parse()) == expected
@@ -0,0 +1,100 @@
+import pytest
+
+from AST import AstronomicalAST
+from ast_unparse import unparse
+from ast_walk import walk
+
+
+# Written back and parsed again, each program must give the same tree, and Python must accept it
+PROGRAMS = [
+    """
+@d(1)
+@e.f
+class K(A, metaclass=M, *bs, **kw):
+    x: int = 5
+    y: 'str'
+    def m(self, a: int = 1, /, b=2, *, c, **k) -> None:
+        global g
+        lst[1:2, ::3] = a[...]
+        del a.b, c[0], (d, [e])
+        with a() as (b, c), d as e.f:
+            pass
+        while not x:
+            break
+        else:
+            pass
+        return
+def gen():
+    w = (yield), (yield 1, 2), (yield from x)
+    a += yield
+    yield
+""",
+    """
+x = lambda a, *b, c=1, **d: (a, b)
+y = [i for i, in z if i if not i]
+z = {**a, 'b': -1, (lambda: 1): 2, **{k: v for k, v in p}}
+v = a if b else c if d else lambda: e
+u = (a if b else c) if d else e
+t = -(-2) ** -3 ** 4, (-2) ** 2, not a == b, (not a) == b, a < b < c, (a < b) < c, a not in b is not c
+s = a - (b - c) - d, a ** b ** c, (a ** b) ** c, a.b.c(d)[e], (1).real, 1.5.real, (a + b).c
+r = 'a' 'b', 0x1F, ..., (), (1,), [], {}, {1}
+q = f(*a, *b, k=1, **c), f(x for x in y), [*a, *b], {*a, 1}, {x for x in y}
+p = (x := 5) + 1, a and (b or c) or d and not e, ~a | b ^ c & d << e >> f
+a = b = c, d
+a, *b = c
+""",
+    """
+from . import x as y
+from ..m.n import (a, b)
+import a.b.c as d, e
+try:
+    raise E from F
+except (A, B) as e:
+    assert x, 'm'
+except:
+    raise
+else:
+    pass
+finally:
+    pass
+if a:
+    pass
+elif b:
+    pass
+else:
+    if c: pass
+for a, *b in c, d:
+    continue
+else:
+    pass
+""",
+]
+
+
+def _shape(root):
+    return [(node.type, node.value, len(node.children)) for node in walk(root)]
+
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_unparsed_source_parses_to_the_same_tree(source):
+    tree = AstronomicalAST(source).parse()
+    written = unparse(tree)
+    compile(written, '<unparse>', 'exec')
+    assert _shape(AstronomicalAST(written).parse()) == _shape(tree)
+    assert unparse(AstronomicalAST(written).parse()) == written
+
+
+def test_precedence_is_kept():
+    source = "r = [-2 ** 2, (-2) ** 2, 2 ** -1, (1 + 2) * 3, 1 - (2 - 3), not 1 == 2, (lambda: 4)(), 5 if 0 else 6]\n"
+    expected, written = {}, {}
+    exec(source, expected)
+    exec(unparse(AstronomicalAST(source).parse()), written)
+    assert written['r'] == expected['r']
+
+
+def test_folded_negative_literals_keep_their_sign():
+    tree = AstronomicalAST("r = 1 ** 2\n").parse()
+    tree.children[0].children[1].children[0].value = '-3'  # as constant folding writes -3
+    namespace = {}
+    exec(unparse(tree), namespace)
+    assert namespace['r'] == 9
@@ -0,0 +1,117 @@
+import io
+import sys
+
+import pytest
+
+from AST import AstronomicalAST
+from ast_nodes import ASTNode, NodeType
+from ast_walk import (ENTER, LEAVE, POST_ORDER, PRINT_INDENT, SKIP_CHILDREN, NodeVisitor, format_ast, walk,
+                      walk_depth, walk_events, write_ast)
+
+
+SOURCE = '''\
+def f(a, b=2):
+    if a:
+        return [a + i for i in range(b)]
+    return lambda c: (c, -b)
+
+
+class C:
+    def m(self):
+        return f(1)
+
+
+x = f(C().m(), b=3)
+'''
+
+
+# The iterative walkers are compared with straightforward recursive versions of the same traversal
+
+def _events(node, depth=0):
+    yield ENTER, node, depth
+    for child in node.children:
+        yield from _events(child, depth + 1)
+    yield LEAVE, node, depth
+
+
+def _parsed():
+    ast = AstronomicalAST(SOURCE)
+    return ast.parse()
+
+
+def _chain(length):
+    root = node = ASTNode(NodeType.BLOCK)
+    for _ in range(length):
+        child = ASTNode(NodeType.BLOCK)
+        node.add_child(child)
+        node = child
+    return root
+
+
+class _Recorder(NodeVisitor):
+    def __init__(self, skip=()):
+        self.events = []
+        self.skip = skip
+
+    def generic_visit(self, node):
+        self.events.append((ENTER, node))
+        if node.type in self.skip:
+            return SKIP_CHILDREN
+
+    def generic_leave(self, node):
+        self.events.append((LEAVE, node))
+
+
+def test_walks_match_recursive_traversal():
+    root = _parsed()
+    events = list(_events(root))
+    assert list(walk(root)) == [node for event, node, _ in events if event == ENTER]
+    assert list(walk(root, POST_ORDER)) == [node for event, node, _ in events if event == LEAVE]
+    assert list(walk_depth(root)) == [(node, depth) for event, node, depth in events if event == ENTER]
+    assert list(walk_events(root)) == [(event, node) for event, node, _ in events]
+    with pytest.raises(ValueError):
+        walk(root, 'sideways')
+
+
+def test_visitor_matches_recursive_traversal():
+    root = _parsed()
+    recorder = _Recorder()
+    recorder.visit(root)
+    assert recorder.events == [(event, node) for event, node, _ in _events(root)]
+
+    skipped = _Recorder(skip={NodeType.FUNCTION_DEFINITION})
+    skipped.visit(root)
+    expected = []
+    for event, node, _ in _events(root):
+        inside = any(ancestor.type is NodeType.FUNCTION_DEFINITION for ancestor in _ancestors(node))
+        if not inside and not (event == LEAVE and node.type is NodeType.FUNCTION_DEFINITION):
+            expected.append((event, node))
+    assert skipped.events == expected
+
+
+def _ancestors(node):
+    node = node.parent
+    while node is not None:
+        yield node
+        node = node.parent
+
+
+def test_printers_match_recursive_dump():
+    root = _parsed()
+    expected = ''.join(f"{' ' * (depth * PRINT_INDENT)}{node.type}: {node.value}\n"
+                       for event, node, depth in _events(root) if event == ENTER)
+    assert format_ast(root) == expected == repr(root)
+    output = io.StringIO()
+    write_ast(root, output)
+    assert output.getvalue() == expected
+
+
+def test_deep_trees_do_not_recurse():
+    depth = sys.getrecursionlimit() * 3
+    root = _chain(depth)
+    assert sum(1 for _ in walk(root, POST_ORDER)) == depth + 1
+    assert max(level for _, level in walk_depth(root)) == depth
+    recorder = _Recorder()
+    recorder.visit(root)
+    assert len(recorder.events) == 2 * (depth + 1)
+    assert format_ast(root).count('\n') == depth + 1
@@ -0,0 +1,180 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+
+from lexing_engine import compile_engine
+from token_table import TokenTable
+
+
+# **CONTENT-ADDRESSED PERSISTENT TOKEN CACHE**
+
+CACHE_MAGIC = b'PYSYSTOK'
+CACHE_VERSION = 1
+DEFAULT_CACHE_SIZE = 256 << 20
+
+# magic, version, number of type names, size of the type name block, number of tokens
+_HEADER = struct.Struct('<8sHHII')
+
+
+class TokenCache:
+    """
+    Caches token streams on disk, keyed by a hash of the source plus a hash of the pattern table.
+    Each entry is one compact binary file: a small header, the type names, then the type, start and
+    end columns. Hits are memory-mapped and the columns are used in place, so an unchanged source is
+    neither lexed nor rebuilt token by token. The cache is bounded in size and evicts the least
+    recently used entries.
+    """
+
+    SUFFIX = '.tok'
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+        # Least recently used entries first, using modification times from previous runs
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith(self.SUFFIX):
+                stat = os.stat(os.path.join(directory, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        self.entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.total_bytes = sum(self.entries.values())
+
+    def key(self, source, token_patterns, skip=('WHITESPACE',)):
+        """
+        Returns the cache key of a source lexed with a pattern table.
+        """
+        binary = not isinstance(source, str)
+        data = bytes(source) if binary else source.encode('utf-8', 'surrogatepass')
+        table = repr((tuple((token_type, getattr(pattern, 'pattern', pattern))
+                            for token_type, pattern in token_patterns.items()), tuple(skip), binary))
+        source_digest = hashlib.sha256(data).hexdigest()
+        patterns_digest = hashlib.sha256(table.encode('utf-8')).hexdigest()
+        return f"{source_digest[:32]}-{patterns_digest[:16]}"
+
+    def get(self, source, token_patterns, skip=('WHITESPACE',)):
+        """
+        Returns the cached TokenTable for the source, or None.
+        """
+        return self._lookup(self.key(source, token_patterns, skip), lambda path: _load_table(path, source))
+
+    def put(self, source, token_patterns, table, skip=('WHITESPACE',)):
+        """
+        Stores a TokenTable for the source, evicting old entries if the cache grows too large.
+        """
+        self._store(self.key(source, token_patterns, skip), lambda output: _write_table(output, table))
+
+    def lex_table(self, source, token_patterns, skip=('WHITESPACE',)):
+        """
+        Returns the TokenTable for the source, lexing and storing it only on a cache miss.
+        """
+        table = self.get(source, token_patterns, skip)
+        if table is None:
+            binary = not isinstance(source, str)
+            table = compile_engine(token_patterns, skip, binary).lex_table(source)
+            self.put(source, token_patterns, table, skip)
+        return table
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and the current size of the cache.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+        }
+
+    def _lookup(self, key, load):
+        # Loads an entry with load(path), counting a miss and dropping the entry if that fails
+        name = key + self.SUFFIX
+        if name not in self.entries:
+            self.misses += 1
+            return None
+        path = os.path.join(self.directory, name)
+        try:
+            entry = load(path)
+        except (OSError, ValueError, struct.error):
+            self._remove(name)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(name)
+        os.utime(path)
+        self.hits += 1
+        return entry
+
+    def _store(self, key, write):
+        # Writes an entry with write(output), then evicts old entries while the cache is too large
+        name = key + self.SUFFIX
+        path = os.path.join(self.directory, name)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as output:
+            write(output)
+        os.replace(temporary, path)
+
+        self.total_bytes += os.path.getsize(path) - self.entries.pop(name, 0)
+        self.entries[name] = os.path.getsize(path)
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, name):
+        self.total_bytes -= self.entries.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass  # still mapped by a live table on platforms that forbid it, or already gone
+
+
+def _padding(size):
+    return b'\0' * (-size % 4)
+
+
+def _write_table(output, table):
+    names = '\0'.join(table.type_names).encode('utf-8')
+    starts, ends = table.starts, table.ends
+    if sys.byteorder == 'big':
+        starts, ends = array('I', starts), array('I', ends)
+        starts.byteswap()
+        ends.byteswap()
+    count = len(table)
+    output.write(_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(table.type_names), len(names), count))
+    output.write(names + _padding(_HEADER.size + len(names)))
+    output.write(bytes(table.kinds) + _padding(count))
+    output.write(bytes(starts))
+    output.write(bytes(ends))
+
+
+def _load_table(path, source):
+    with open(path, 'rb') as cached:
+        mapping = mmap.mmap(cached.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, type_count, names_size, count = _HEADER.unpack_from(mapping)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        raise ValueError(f"Not a token cache file: {path}")
+    offset = _HEADER.size
+    type_names = tuple(bytes(mapping[offset:offset + names_size]).decode('utf-8').split('\0'))
+    if len(type_names) != type_count:
+        raise ValueError(f"Corrupt token cache file: {path}")
+    offset += names_size + len(_padding(offset + names_size))
+
+    view = memoryview(mapping)
+    kinds = view[offset:offset + count]
+    offset += count + len(_padding(count))
+    starts = view[offset:offset + 4 * count].cast('I')
+    ends = view[offset + 4 * count:offset + 8 * count].cast('I')
+    table = TokenTable(source, type_names, kinds, starts, ends)
+    if sys.byteorder == 'big':
+        table.materialize()
+        table.starts.byteswap()
+        table.ends.byteswap()
+    return table
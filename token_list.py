@@ -1,3 +1,14 @@
+from comments import COMMENTS
+from data_types import TYPES
+from delimiters import DELIMITERS
+from identifiers import IDENTIFIER
+from literals import LITERALS
+from operators import OPERATORS
+from punctuation import PUNCTUATION
+from special_tokens import SPECIAL
+from tokens import KEYWORDS
+from white_space import WHITESPACE
+
 TOKEN_PATTERNS = {
     'KEYWORD': r'\b(?:' + '|'.join(KEYWORDS) + r')\b',  # Match any keyword
     'IDENTIFIER': IDENTIFIER,                           # Match identifiers
@@ -0,0 +1,293 @@
+import hashlib
+import marshal
+import os
+import re
+import sys
+
+try:
+    from re import _compiler as sre_compile, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_compile
+    import sre_parse
+
+
+# Compiled master regexes are cached next to the bytecode of this module, like the bytecode itself
+SPEC_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+MAX_WITNESSES = 64
+MAX_TOKEN_TYPES = 255  # type ids are stored in one byte, and the last id is kept for ERROR
+
+# The cache writes out the program of the private regex compiler (sre_compile._code) and loads it
+# with _sre.compile, whose arguments and opcodes are not a stable API: it is only used on the CPython
+# versions it was written for, and only when the compiler and the engine agree on the opcode table
+_CACHE_VERSIONS = ((3, 8), (3, 13))
+_CACHE_SUPPORTED = (
+    sys.implementation.name == 'cpython'
+    and _CACHE_VERSIONS[0] <= sys.version_info[:2] <= _CACHE_VERSIONS[1]
+    and callable(getattr(sre_compile, '_code', None))
+    and callable(getattr(getattr(sre_compile, '_sre', None), 'compile', None))
+    and getattr(sre_compile, 'MAGIC', None) == getattr(getattr(sre_compile, '_sre', None), 'MAGIC', -1)
+)
+
+# Representative characters for character classes and categories
+_CATEGORY_SAMPLES = {
+    'CATEGORY_DIGIT': '09',
+    'CATEGORY_NOT_DIGIT': 'a ',
+    'CATEGORY_SPACE': ' \n',
+    'CATEGORY_NOT_SPACE': 'a0',
+    'CATEGORY_WORD': 'a_Z0',
+    'CATEGORY_NOT_WORD': ' +',
+}
+_SAMPLE_POOL = 'aZ_09 \t\n+-*/%=<>!&|^~.,;:()[]{}@$#?\'"\\x'
+
+
+# **TOKEN-SPEC COMPILER: VALIDATION, SHADOWING ANALYSIS AND PRECOMPILED MASTER REGEXES**
+
+def validate_token_patterns(token_patterns):
+    """
+    Checks that a pattern table can be lexed at all and raises ValueError naming the offending
+    token type otherwise: every type must be a valid group name other than ERROR, every pattern must
+    compile on its own and must not match the empty string.
+    """
+    if len(token_patterns) > MAX_TOKEN_TYPES:
+        raise ValueError(f"Too many token types ({len(token_patterns)}), at most {MAX_TOKEN_TYPES} are supported")
+    for token_type, pattern in token_patterns.items():
+        if not token_type.isidentifier():
+            raise ValueError(f"Invalid token type name: {token_type!r}")
+        if token_type == 'ERROR':
+            raise ValueError("ERROR is reserved for unexpected characters")
+        pattern = getattr(pattern, 'pattern', pattern)
+        try:
+            regex = re.compile(pattern)
+        except re.error as error:
+            raise ValueError(f"Invalid pattern for {token_type}: {error}") from error
+        if regex.groupindex:
+            raise ValueError(f"Pattern for {token_type} uses named groups, which clash with the token types")
+        if regex.fullmatch('' if isinstance(pattern, str) else b''):
+            raise ValueError(f"Pattern for {token_type} matches the empty string")
+
+
+def check_token_patterns(token_patterns):
+    """
+    Looks for patterns that can never win, or only sometimes, because the first matching pattern of
+    a table wins. For every pattern, sample strings it matches are generated from its parsed regex and
+    tried against the patterns before it, and against the pattern itself: an alternative matching a
+    prefix of another one (as in '<|<=') hides the longer one.
+    Returns a list of (token_type, message) tuples. Samples are checked on their own, without
+    surrounding text, and sampling may miss cases, so the report is a guide rather than a proof.
+    """
+    validate_token_patterns(token_patterns)
+    compiled = [(token_type, re.compile(getattr(pattern, 'pattern', pattern)))
+                for token_type, pattern in token_patterns.items()]
+    issues = []
+    for index, (token_type, regex) in enumerate(compiled):
+        witnesses = [witness for witness in _witnesses(sre_parse.parse(regex.pattern), MAX_WITNESSES)
+                     if witness and regex.fullmatch(witness)]
+        shadowed = {}  # earlier token type -> first sample it takes
+        truncated = []
+        reached = 0
+        for witness in witnesses:
+            for earlier_type, earlier in compiled[:index]:
+                if earlier.match(witness) is not None:
+                    shadowed.setdefault(earlier_type, witness)
+                    break
+            else:
+                reached += 1
+                if regex.match(witness).end() < len(witness):
+                    truncated.append(witness)
+        shadowers = ', '.join(shadowed)
+        if shadowed and not reached:
+            issues.append((token_type, f"unreachable: always shadowed by {shadowers}"))
+        elif shadowed:
+            examples = ', '.join(repr(witness) for witness in shadowed.values())
+            issues.append((token_type, f"partially shadowed by {shadowers} (e.g. {examples})"))
+        for witness in truncated:
+            prefix = regex.match(witness).group()
+            issues.append((token_type, f"alternative {witness!r} never matches in full: {prefix!r} matches first"))
+    return issues
+
+
+def _witnesses(items, limit):
+    # Strings matched by a parsed (sub)pattern, at most limit of them; assertions are ignored here and
+    # the caller keeps only the strings the whole pattern really matches
+    results = ['']
+    for op, argument in items:
+        options = _node_witnesses(str(op), argument, limit)
+        if not options:
+            return []
+        results = [result + option for result in results for option in options][:limit]
+    return results
+
+
+def _node_witnesses(op, argument, limit):
+    if op == 'LITERAL':
+        return [chr(argument)]
+    if op == 'NOT_LITERAL':
+        return [character for character in _SAMPLE_POOL if ord(character) != argument][:1]
+    if op == 'ANY':
+        return ['a']
+    if op == 'IN':
+        return _class_witnesses(argument)
+    if op == 'BRANCH':
+        return [witness for branch in argument[1] for witness in _witnesses(branch, limit)][:limit]
+    if op == 'SUBPATTERN':
+        return _witnesses(argument[-1], limit)
+    if op == 'ATOMIC_GROUP':
+        return _witnesses(argument, limit)
+    if op in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+        low, high, item = argument
+        options = _witnesses(item, limit)
+        counts = sorted({low, min(max(low, 1), high), min(max(low, 2), high)})
+        return [option * count for count in counts for option in options][:limit]
+    if op in ('AT', 'ASSERT', 'ASSERT_NOT'):
+        return ['']
+    return []  # back references and conditionals are not sampled
+
+
+def _class_witnesses(items):
+    members = []
+    negated = False
+    for op, argument in items:
+        op = str(op)
+        if op == 'NEGATE':
+            negated = True
+        elif op == 'LITERAL':
+            members.append(chr(argument))
+        elif op == 'RANGE':
+            members.extend((chr(argument[0]), chr(argument[1])))
+        elif op == 'CATEGORY':
+            members.extend(_CATEGORY_SAMPLES.get(str(argument), ''))
+    if negated:
+        # Only the samples are known not to be members, so check candidates with the real class later
+        return [character for character in _SAMPLE_POOL if character not in members][:2]
+    return list(dict.fromkeys(members))[:4]
+
+
+def _cache_path(master):
+    data = master.encode('utf-8') if isinstance(master, str) else b'b' + master
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    tag = sys.implementation.cache_tag or 'nocache'
+    return os.path.join(SPEC_CACHE_DIR, f"token_spec.{digest}.{tag}-{sre_compile.MAGIC}.bin")
+
+
+def compile_master(master, token_patterns=None):
+    """
+    Returns the compiled master regex of a lexer table. The compiled program of the regex engine is
+    cached on disk, so later processes load it instead of parsing and compiling the regex again.
+    The pattern table is validated when the regex is first compiled, and only then.
+    Falls back to re.compile wherever the cache cannot be used (other Python implementations and
+    versions, unwritable directories, sys.dont_write_bytecode). An entry that cannot be loaded
+    (truncated, corrupted, or written by an incompatible engine) is deleted and written again.
+    """
+    if not _CACHE_SUPPORTED:
+        return re.compile(master)
+    path = _cache_path(master)
+    try:
+        with open(path, 'rb') as cached:
+            flags, code, groups, groupindex, indexgroup = marshal.load(cached)
+        regex = sre_compile._sre.compile(master, flags, code, groups, groupindex, indexgroup)
+        if regex.pattern == master:
+            return regex
+    except FileNotFoundError:
+        pass
+    except Exception:  # _sre.compile raises RuntimeError on an invalid program
+        _discard(path)
+
+    if token_patterns is not None:
+        validate_token_patterns(token_patterns)
+    regex = re.compile(master)
+    if not sys.dont_write_bytecode:
+        try:
+            _store_master(path, master)
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass  # the cache is only an optimization
+    return regex
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _store_master(path, master):
+    # Same steps as re.compile, keeping the program to write it out
+    parsed = sre_parse.parse(master, 0)
+    code = [int(word) for word in sre_compile._code(parsed, 0)]
+    indexgroup = [None] * parsed.state.groups
+    for name, index in parsed.state.groupdict.items():
+        indexgroup[index] = name
+    entry = (parsed.state.flags, code, parsed.state.groups - 1, dict(parsed.state.groupdict), tuple(indexgroup))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as output:
+        marshal.dump(entry, output)
+    os.replace(temporary, path)
+
+
+def precompile(token_patterns, skip=('WHITESPACE',)):
+    """
+    Validates a pattern table and writes the cached master regexes of its str and bytes lexers,
+    whatever sys.dont_write_bytecode says. Returns the paths written (none where the cache is not
+    supported).
+    """
+    from lexing_engine import compile_engine
+
+    paths = []
+    if not _CACHE_SUPPORTED:
+        validate_token_patterns(token_patterns)
+        return paths
+    for binary in (False, True):
+        master = compile_engine(token_patterns, skip, binary).regex.pattern
+        path = _cache_path(master)
+        _store_master(path, master)
+        paths.append(path)
+    return paths
+
+
+def _known_tables():
+    import importlib.util
+    import AST
+    import Huge_Lexer
+    import Matching_Rules
+    import token_list
+
+    spec = importlib.util.spec_from_file_location(
+        'enormous_lexer', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Excessively Enormous Lexer.py'))
+    enormous = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(enormous)
+    return {
+        'OverpoweredLexer': Huge_Lexer.TOKEN_PATTERNS,
+        'AstronomicalAST': AST.TOKEN_PATTERNS,
+        'EnormousLexer': enormous.TOKEN_PATTERNS,
+        'token_list': token_list.TOKEN_PATTERNS,
+        'Matching_Rules': Matching_Rules.token_patterns,
+    }
+
+
+def main():
+    """
+    Validates and analyses every pattern table of the project and precompiles their lexers.
+    """
+    status = 0
+    for name, token_patterns in _known_tables().items():
+        print(f"{name}:")
+        try:
+            issues = check_token_patterns(token_patterns)
+        except ValueError as error:
+            print(f"  invalid: {error}")
+            status = 1
+            continue
+        try:
+            precompile(token_patterns)
+        except OSError as error:
+            print(f"  not precompiled: {error}")
+        for token_type, message in issues:
+            print(f"  {token_type}: {message}")
+        if not issues:
+            print("  no issues")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+from array import array
+
+from line_index import LineIndex
+
+
+# Pending tail shifts are folded into the offset columns once there are more than this many
+MAX_PENDING_SHIFTS = 64
+
+
+# **COMPACT COLUMNAR TOKEN STORAGE**
+
+class TokenTable:
+    """
+    Array-backed token storage. Each token costs one byte of type id and two 32-bit offsets into
+    the source instead of a (token_type, value) tuple plus a fresh substring. Values are sliced out of
+    the source only when asked for (as memoryviews for byte sources).
+    The columns may also be read-only memoryviews over a memory-mapped cache file; they are copied
+    into private arrays the first time the table is edited.
+    Indexing and iteration yield (token_type, value) tuples, so code written against the old token
+    lists keeps working.
+    """
+
+    def __init__(self, source, type_names, kinds=None, starts=None, ends=None):
+        self.source = source
+        self.type_names = type_names
+        self.kinds = kinds if kinds is not None else array('B')
+        self._starts = starts if starts is not None else array('I')
+        self._ends = ends if ends is not None else array('I')
+        # Lazy offset shifts: (index, delta) adds delta to every token from index on
+        self._pending = []
+        self.error_id = type_names.index('ERROR') if 'ERROR' in type_names else -1
+        self._line_index = None
+
+    @property
+    def source(self):
+        return self._source
+
+    @source.setter
+    def source(self, source):
+        # Byte sources are sliced through a memoryview, which must follow the source when relex
+        # replaces it
+        self._source = source
+        self._view = None if source is None or isinstance(source, str) else memoryview(source)
+
+    @property
+    def starts(self):
+        self.compact()
+        return self._starts
+
+    @property
+    def ends(self):
+        self.compact()
+        return self._ends
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self.compact()
+            return TokenTable(self.source, self.type_names,
+                              self.kinds[index], self._starts[index], self._ends[index])
+        if index < 0:
+            index += len(self.kinds)
+        return (self.type_names[self.kinds[index]], self.value(index))
+
+    def __iter__(self):
+        self.compact()
+        type_names = self.type_names
+        value = self._slice
+        error_id = self.error_id
+        for index, (kind, start, end) in enumerate(zip(self.kinds, self._starts, self._ends)):
+            if kind == error_id:
+                yield (type_names[kind], self.value(index))
+            else:
+                yield (type_names[kind], value(start, end))
+
+    def located(self):
+        """
+        Yields (token_type, value, start) for every token, like LexerEngine.stream: the value of an
+        ERROR token is the unexpected character itself.
+        """
+        self.compact()
+        type_names = self.type_names
+        value = self._slice
+        for kind, start, end in zip(self.kinds, self._starts, self._ends):
+            yield (type_names[kind], value(start, end), start)
+
+    def __eq__(self, other):
+        if isinstance(other, TokenTable):
+            return list(self) == list(other)
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"TokenTable({list(self)!r})"
+
+    def _slice(self, start, end):
+        if self._view is not None:
+            return self._view[start:end]
+        return self.source[start:end]
+
+    def _shift(self, index):
+        return sum(delta for first, delta in self._pending if first <= index)
+
+    def token_type(self, index):
+        """
+        Returns the token type of the token at index.
+        """
+        return self.type_names[self.kinds[index]]
+
+    def start(self, index):
+        """
+        Returns the source offset where the token at index starts.
+        """
+        if self._pending:
+            return self._starts[index] + self._shift(index)
+        return self._starts[index]
+
+    def end(self, index):
+        """
+        Returns the source offset where the token at index ends.
+        """
+        if self._pending:
+            return self._ends[index] + self._shift(index)
+        return self._ends[index]
+
+    def value(self, index):
+        """
+        Materializes the value of the token at index. ERROR tokens describe the offending character.
+        """
+        start = self.start(index)
+        if self.kinds[index] == self.error_id:
+            return error_message(self.source, start)
+        return self._slice(start, self.end(index))
+
+    def text(self, index):
+        """
+        Returns the value of the token at index as a str, decoding it if the source is bytes.
+        """
+        value = self.value(index)
+        if isinstance(value, memoryview):
+            return str(value, 'utf-8', 'replace')
+        return value
+
+    def span(self, index):
+        """
+        Returns the (start, end) source offsets of the token at index.
+        """
+        return (self.start(index), self.end(index))
+
+    def line_index(self):
+        """
+        Returns the LineIndex of the source, built on first use and again after the source changed.
+        """
+        if self._line_index is None or self._line_index.source is not self.source:
+            self._line_index = LineIndex(self.source)
+        return self._line_index
+
+    def line_column(self, index):
+        """
+        Returns the (line, column) where the token at index starts (lines from 1, columns from 0).
+        """
+        return self.line_index().line_column(self.start(index))
+
+    def index_at(self, offset):
+        """
+        Returns the index of the first token ending at or after offset (len(self) if there is none).
+        """
+        low, high = 0, len(self.kinds)
+        while low < high:
+            middle = (low + high) // 2
+            if self.end(middle) < offset:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def materialize(self):
+        """
+        Copies memory-mapped columns into private arrays so that the table can be edited.
+        """
+        if isinstance(self.kinds, memoryview):
+            self.kinds = _copy_column('B', self.kinds)
+            self._starts = _copy_column('I', self._starts)
+            self._ends = _copy_column('I', self._ends)
+
+    def find_kind(self, kind, start=0, stop=None):
+        """
+        Returns the index of the first token with the given type id in [start, stop), or -1.
+        """
+        self.materialize()
+        stop = len(self.kinds) if stop is None else stop
+        try:
+            return self.kinds.index(kind, start, stop)
+        except ValueError:
+            return -1
+
+    def append(self, kind, start, end):
+        """
+        Appends a token given its type id and source offsets.
+        """
+        self.materialize()
+        self.compact()
+        self.kinds.append(kind)
+        self._starts.append(start)
+        self._ends.append(end)
+
+    def extend(self, other):
+        """
+        Appends the tokens of another table over the same source and type names.
+        """
+        if other.source is not self.source or other.type_names != self.type_names:
+            raise ValueError("Can only extend a TokenTable with tokens of the same source and types")
+        self.materialize()
+        self.compact()
+        self.kinds.extend(other.kinds)
+        self._starts.extend(other.starts)
+        self._ends.extend(other.ends)
+
+    def splice(self, first, last, kinds, starts, ends, shift=0):
+        """
+        Replaces the tokens in [first, last) by the given columns and moves every following token by
+        shift characters. The following tokens are not touched: the shift is recorded and applied
+        when their offsets are read, so the cost depends on the replaced range only.
+        """
+        self.materialize()
+        base = self._shift(first)
+        if base and min(starts, default=base) < base:
+            self.compact()
+            base = 0
+        added = len(kinds)
+        pending = []
+        for index, delta in self._pending:
+            if index <= first:
+                pending.append((index, delta))
+            elif index <= last:
+                pending.append((first + added, delta))
+            else:
+                pending.append((index + added - (last - first), delta))
+        if shift:
+            pending.append((first + added, shift))
+
+        self.kinds[first:last] = kinds
+        if base:
+            starts = array('I', [start - base for start in starts])
+            ends = array('I', [end - base for end in ends])
+        self._starts[first:last] = starts
+        self._ends[first:last] = ends
+
+        merged = {}
+        for index, delta in pending:
+            merged[index] = merged.get(index, 0) + delta
+        self._pending = sorted((index, delta) for index, delta in merged.items() if delta)
+        if len(self._pending) > MAX_PENDING_SHIFTS:
+            self.compact()
+
+    def compact(self):
+        """
+        Folds pending offset shifts into the offset columns.
+        """
+        if not self._pending:
+            return
+        bounds = [index for index, _ in self._pending] + [len(self.kinds)]
+        total = 0
+        for (index, delta), stop in zip(self._pending, bounds[1:]):
+            total += delta
+            if index < stop:
+                self._starts[index:stop] = array('I', map(total.__add__, self._starts[index:stop]))
+                self._ends[index:stop] = array('I', map(total.__add__, self._ends[index:stop]))
+        self._pending = []
+
+    def summary(self):
+        """
+        Counts tokens by type with one C-level count over the type column per type, in order of
+        first appearance.
+        """
+        column = self.kinds.tobytes()
+        present = sorted((column.find(bytes((kind,))), kind)
+                         for kind in range(len(self.type_names)) if bytes((kind,)) in column)
+        return {self.type_names[kind]: column.count(bytes((kind,))) for _, kind in present}
+
+    def nbytes(self):
+        """
+        Returns the memory taken by the token columns, in bytes.
+        """
+        return sum(column.itemsize * len(column) for column in (self.kinds, self._starts, self._ends))
+
+
+def _copy_column(typecode, view):
+    column = array(typecode)
+    column.frombytes(view.cast('B'))
+    return column
+
+
+def error_message(source, position):
+    """
+    Describes an unexpected character the way the lexers report it.
+    """
+    character = source[position]
+    if not isinstance(character, str):
+        character = bytes(source[position:position + 1]).decode('utf-8', 'replace')
+    return f"Unexpected character at position {position}: {character}"